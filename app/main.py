@@ -1,8 +1,12 @@
 import sys
 import os
-from PyQt5.QtWidgets import QApplication
+import multiprocessing
+from PyQt5.QtWidgets import QApplication, QDialog
 from PyQt5.QtGui import QIcon
 from app.views.dialogs.welcome_window import WelcomeWindow
+from app.models.database import GestorConexiones, migraciones_pendientes
+from app.views.dialogs.migration_dialog import MigracionDialog
+from app.models.respaldo import ProgramadorRespaldos
 
 def resource_path(relative_path):
     """ Obtener la ruta absoluta al recurso icono,para desarrollo como para ejecutables 
@@ -24,6 +28,24 @@ def main():
     # Establecer el ícono global para toda la aplicación
     app.setWindowIcon(QIcon(icon_path))
 
+    # Una base de una versión anterior se actualiza en segundo plano con un
+    # diálogo de avance, en lugar de congelar el arranque
+    if migraciones_pendientes() and MigracionDialog().exec_() != QDialog.Accepted:
+        sys.exit(1)
+
+    # Devolver al disco, en segundo plano, el espacio de los datos borrados
+    gestor = GestorConexiones.obtener()
+    gestor.iniciar_vacuum_periodico()
+
+    # Respaldo comprimido diario de la base; se conservan los últimos 7
+    directorio_respaldos = os.path.join(os.path.dirname(os.path.abspath(gestor.db_name)), 'respaldos')
+    respaldos = ProgramadorRespaldos(gestor.db_name, directorio_respaldos)
+    respaldos.iniciar()
+    app.aboutToQuit.connect(respaldos.detener)
+
+    # Cerrar las conexiones compartidas a la base de datos al salir
+    app.aboutToQuit.connect(GestorConexiones.cerrar_todos)
+
     # Crear y mostrar la ventana principal
     win = WelcomeWindow()
     win.show()
@@ -31,4 +53,6 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    # Necesario para el pool de procesos de la extracción de PDF en el ejecutable de Windows
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Conciliación de un corte de GESLib contra una factura.
+
+Ambos lados se normalizan una sola vez (ISBN-13, cantidades y PNT
+como números redondeados a 4 decimales) y se cruzan con un merge externo por ISBN; las banderas de
+congruencia y las notas se calculan por columnas completas, sin recorrer
+los ISBN uno por uno.
+"""
+import pandas as pd
+from app.models.isbn import normalizar as normalizar_isbn
+
+COLUMNAS_ANALISIS = [
+    "ISBN",
+    "Congruencia del ISBN",
+    "Aparición en Reporte",
+    "Aparición en Factura",
+    "Congruencia de cantidad",
+    "Congruencia de PNT",
+    "Notas"
+]
+
+
+def limpiar_isbn(serie):
+    """
+    ISBN-13 de cada valor, para que un ISBN-10 y su ISBN-13 crucen entre sí.
+    Los que no son un ISBN válido se conservan limpios y cruzan tal cual.
+    """
+    return normalizar_isbn(serie, conservar_invalidos=True)
+
+
+def a_numeros(serie):
+    """
+    Versión por columnas de limpiar_y_formatear_numero: quita todo salvo
+    dígitos y punto y redondea a 4 decimales (0.0 si no es un número).
+    Solo los valores que no son ya números pasan por la expresión regular.
+    """
+    numeros = pd.to_numeric(serie, errors='coerce')
+    pendientes = numeros.isna() & serie.notna()
+    if pendientes.any():
+        limpios = serie[pendientes].astype(str).str.replace(r'[^0-9.]', '', regex=True)
+        numeros[pendientes] = pd.to_numeric(limpios, errors='coerce')
+    # El signo también se descartaba al limpiar el texto
+    return numeros.astype(float).abs().fillna(0.0).round(4)
+
+
+def _formatear(numeros):
+    """Números con 4 decimales como texto; 'None' donde falta el valor"""
+    texto = numeros.map('{:.4f}'.format, na_action='ignore')
+    return texto.where(numeros.notna(), "None")
+
+
+def _normalizar(df, col_isbn, col_cantidad, col_pnt):
+    """ISBN, cantidad y PNT de un lado, con una fila por ISBN (la primera aparición)"""
+    lado = pd.DataFrame({
+        'isbn': limpiar_isbn(df[col_isbn]).to_numpy(),
+        'cantidad': a_numeros(df[col_cantidad]).to_numpy(),
+        'pnt': a_numeros(df[col_pnt]).to_numpy(),
+    })
+    return lado.drop_duplicates('isbn', keep='first')
+
+
+def conciliar(df_reporte, df_factura, col_cantidad_reporte,
+              col_isbn_factura, col_cantidad_factura, col_pnt_factura,
+              col_isbn_reporte='f_articulo', col_pnt_reporte='total'):
+    """
+    Compara el reporte de GESLib con la factura por ISBN.
+    Devuelve un DataFrame con COLUMNAS_ANALISIS y una fila por ISBN de
+    cualquiera de los dos lados, ordenado por ISBN. Si un ISBN se repite en
+    un lado se usa su primera aparición, como hacía el análisis original.
+    """
+    reporte = _normalizar(df_reporte, col_isbn_reporte, col_cantidad_reporte, col_pnt_reporte)
+    factura = _normalizar(df_factura, col_isbn_factura, col_cantidad_factura, col_pnt_factura)
+    cruce = reporte.merge(factura, on='isbn', how='outer', sort=False,
+                          suffixes=('_reporte', '_factura'), indicator=True)
+
+    en_reporte = cruce['_merge'].isin(['both', 'left_only']).to_numpy()
+    en_factura = cruce['_merge'].isin(['both', 'right_only']).to_numpy()
+    en_ambos = en_reporte & en_factura
+    # Si el ISBN falta de un lado, su cantidad y PNT no coinciden con nada
+    cantidad_igual = en_ambos & (cruce['cantidad_reporte'] == cruce['cantidad_factura']).to_numpy()
+    pnt_igual = en_ambos & (cruce['pnt_reporte'] == cruce['pnt_factura']).to_numpy()
+
+    notas = pd.Series("", index=cruce.index, dtype=object)
+
+    def agregar_nota(condicion, texto):
+        nonlocal notas
+        con_separador = notas.where(notas == "", notas + "; ") + texto
+        notas = notas.where(~condicion, con_separador)
+
+    agregar_nota(~en_reporte, "El ISBN no aparece en el reporte")
+    agregar_nota(~en_factura, "El ISBN no aparece en la factura")
+    # Los números solo se formatean en las filas que llevan nota
+    def nota_diferencia(condicion, plantilla, columna):
+        filas = cruce.loc[condicion]
+        reporte = _formatear(filas[columna + '_reporte'])
+        factura = _formatear(filas[columna + '_factura'])
+        texto = pd.Series("", index=cruce.index, dtype=object)
+        texto[condicion] = plantilla[0] + reporte + plantilla[1] + factura
+        agregar_nota(condicion, texto)
+
+    nota_diferencia(~cantidad_igual, ("Existe una diferencia en cantidad: CR = ", " ; CF = "), 'cantidad')
+    nota_diferencia(~pnt_igual, ("Existe una diferencia de PNT: PNR = ", " ; PNF = "), 'pnt')
+    notas = notas.where(~(en_ambos & cantidad_igual & pnt_igual), "La congruencia es correcta")
+
+    return pd.DataFrame({
+        "ISBN": cruce['isbn'],
+        "Congruencia del ISBN": en_ambos.astype(int),
+        "Aparición en Reporte": en_reporte.astype(int),
+        "Aparición en Factura": en_factura.astype(int),
+        "Congruencia de cantidad": cantidad_igual.astype(int),
+        "Congruencia de PNT": pnt_igual.astype(int),
+        "Notas": notas,
+    }, columns=COLUMNAS_ANALISIS)
@@ -0,0 +1,75 @@
+"""
+Congruencia de ISBN entre varios documentos a la vez.
+
+Los ISBN de todos los documentos se normalizan a ISBN-13 y se cuentan en
+un solo groupby, que agrupa por hash en tiempo lineal. El resultado es una
+matriz ISBN x documento con el número de apariciones: mayor que cero
+indica presencia y mayor que uno indica un duplicado dentro del documento.
+Los valores con forma de ISBN (10 o 13 caracteres) cuyo dígito de control
+no cuadra se cuentan tal cual y se reportan con su propio estado, para que
+un ISBN mal escrito aparezca como discrepancia en lugar de desaparecer.
+
+    conteos = contar_isbn({'Tabla 1': df1['ISBN'], 'Tabla 2': df2['isbn']})
+    resumen = resumir(conteos)
+"""
+import numpy as np
+import pandas as pd
+from app.models.isbn import normalizar as normalizar_isbn, es_valido as es_isbn_valido
+
+CONGRUENTE = "Congruente"
+NO_CONGRUENTE = "No congruente"
+ISBN_INVALIDO = "ISBN inválido"
+
+
+def contar_isbn(documentos):
+    """
+    Cuenta las apariciones de cada ISBN en cada documento.
+    :param documentos: Diccionario nombre -> Series con los ISBN del documento
+        (en cualquier formato). Los ISBN válidos se cuentan como ISBN-13; los
+        de 10 o 13 caracteres con dígito de control incorrecto se cuentan
+        limpios, y los valores que no tienen forma de ISBN se ignoran.
+    :return: DataFrame con un ISBN-13 por fila (índice, ordenado) y una
+        columna de enteros por documento, en el orden recibido.
+    """
+    nombres = list(documentos)
+    partes = [pd.DataFrame({'isbn': [], 'documento': []})]
+    for codigo, nombre in enumerate(nombres):
+        isbns = normalizar_isbn(documentos[nombre], conservar_invalidos=True)
+        isbns = isbns[isbns.str.len().isin((10, 13))]
+        partes.append(pd.DataFrame({'isbn': isbns.to_numpy(),
+                                    'documento': np.full(len(isbns), codigo)}))
+    todos = pd.concat(partes, ignore_index=True)
+    conteos = (todos.groupby(['isbn', 'documento'], sort=True).size()
+               .unstack(fill_value=0)
+               .reindex(columns=range(len(nombres)), fill_value=0))
+    conteos.index.name = 'ISBN'
+    conteos.columns = nombres
+    return conteos.astype(int)
+
+
+def resumir(conteos):
+    """
+    Tabla de resultados a partir de contar_isbn: "Sí"/"No" por documento,
+    los duplicados de cada documento ("Tabla 1: 3") y el estado, que es
+    congruente solo si el ISBN aparece en todos los documentos. Los ISBN
+    con dígito de control incorrecto llevan el estado ISBN_INVALIDO.
+    """
+    valores = conteos.to_numpy()
+    resumen = pd.DataFrame({'ISBN': conteos.index.to_numpy()})
+    for j, nombre in enumerate(conteos.columns):
+        resumen[nombre] = np.where(valores[:, j] > 0, "Sí", "No")
+
+    duplicados = pd.Series("", index=resumen.index, dtype=object)
+    for j, nombre in enumerate(conteos.columns):
+        repetido = valores[:, j] > 1
+        if repetido.any():
+            texto = f"{nombre}: " + pd.Series(valores[repetido, j]).astype(str).to_numpy()
+            previo = duplicados[repetido]
+            duplicados[repetido] = previo.where(previo == "", previo + "; ") + texto
+    resumen['Duplicados'] = duplicados
+
+    en_todos = (valores > 0).all(axis=1) if valores.shape[1] else np.zeros(len(resumen), dtype=bool)
+    validos = es_isbn_valido(resumen['ISBN']).to_numpy()
+    resumen['Estado'] = np.where(~validos, ISBN_INVALIDO,
+                                 np.where(en_todos, CONGRUENTE, NO_CONGRUENTE))
+    return resumen
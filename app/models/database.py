@@ -1,16 +1,443 @@
+import hashlib
+import io
+import logging
+import os
+import queue
+import shutil
 import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import pandas as pd
+from app.models.isbn import normalizar as normalizar_isbn
 
-class ConcesionesDB:
-    def __init__(self, db_name='concesiones.db'):
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Tamaño de los bloques con los que se copian los BLOBs entre archivo y base
+TAMANO_BLOQUE = 1024 * 1024
+
+# Dias antes del vencimiento en los que una concesion pasa a 'Vence pronto'
+DIAS_VENCE_PRONTO = 14
+
+# Segundos sin escrituras que espera activar_vacuum_incremental para hacer el
+# VACUUM completo que convierte una base existente
+INACTIVIDAD_VACUUM_COMPLETO = 60
+
+# Bytes libres que necesita una migracion por cada byte de BLOB que copia:
+# la copia nueva en el archivo mas la misma copia en el WAL hasta el checkpoint
+ESPACIO_POR_BYTE_MIGRADO = 2
+
+# Espacio maximo de las tablas guardadas en CacheExtracciones
+LIMITE_CACHE_EXTRACCIONES = 64 * 1024 * 1024
+
+# Rango de fecha_vencimiento que corresponde a cada estado. Se expresan como
+# comparaciones sobre la columna para que los filtros puedan usar el indice
+# idx_concesiones_finalizada_vencimiento.
+_CONDICIONES_ESTADO = {
+    'Vencida': "fecha_vencimiento < date('now', 'localtime')",
+    'Vence pronto': (f"fecha_vencimiento BETWEEN date('now', 'localtime') "
+                     f"AND date('now', 'localtime', '+{DIAS_VENCE_PRONTO} days')"),
+    'Valido': f"fecha_vencimiento > date('now', 'localtime', '+{DIAS_VENCE_PRONTO} days')",
+}
+
+_SQL_STATUS = f'''CASE
+            WHEN {_CONDICIONES_ESTADO['Vencida']} THEN 'Vencida'
+            WHEN {_CONDICIONES_ESTADO['Vence pronto']} THEN 'Vence pronto'
+            ELSE 'Valido'
+        END'''
+
+_SQL_DIAS_RESTANTES = "CAST(julianday(fecha_vencimiento) - julianday(date('now', 'localtime')) AS INTEGER)"
+
+# Orden de las listas: primero las que vencen pronto, luego las validas y al final las vencidas
+_SQL_PRIORIDAD_STATUS = f'''CASE
+            WHEN {_CONDICIONES_ESTADO['Vence pronto']} THEN 0
+            WHEN {_CONDICIONES_ESTADO['Valido']} THEN 1
+            ELSE 2
+        END'''
+
+# Tipos de documento cuyo contenido se comprime al almacenarse
+TIPOS_COMPRIMIBLES = ('CSV', 'Excel')
+
+# Filas huerfanas por tabla, en el orden en que se pueden borrar sin violar
+# las claves foraneas. Un vinculo DocumentoProducto tambien es huerfano si su
+# documento o su producto lo es. Blobs sin documentos se cuentan aunque el
+# disparador documentos_blob_delete ya deberia haberlos borrado.
+_CONDICIONES_HUERFANOS = [
+    ('DocumentoProducto', '''documento_id NOT IN (SELECT id FROM Documentos
+                                               WHERE concesion_id IN (SELECT id FROM Concesiones))
+                           OR producto_id NOT IN (SELECT id FROM Productos
+                                                  WHERE concesion_id IN (SELECT id FROM Concesiones))'''),
+    ('Documentos', 'concesion_id NOT IN (SELECT id FROM Concesiones)'),
+    ('Productos', 'concesion_id NOT IN (SELECT id FROM Concesiones)'),
+    ('ReportesPDF', 'concesion_id NOT IN (SELECT id FROM Concesiones)'),
+    ('Contacto', 'emisor_id NOT IN (SELECT id FROM grantingEmisor)'),
+    ('Blobs', 'sha256 NOT IN (SELECT sha256 FROM Documentos WHERE sha256 IS NOT NULL)'),
+]
+
+# Columnas que importar_productos exige en las filas a importar
+COLUMNAS_REQUERIDAS_PRODUCTO = ('cantidad', 'descripcion', 'precio_neto')
+
+# Perfiles de durabilidad: PRAGMAs que se aplican a cada conexion al abrirla.
+# 'normal' usa WAL con synchronous=NORMAL: una confirmacion no espera al fsync
+# y solo se pueden perder las ultimas transacciones ante un corte de energia,
+# nunca corromper la base. 'seguro' hace fsync en cada confirmacion y
+# 'clasico' conserva el diario rollback y los valores por omision de SQLite.
+PERFILES_DURABILIDAD = {
+    'normal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,  # KiB (negativo) => 16 MB por conexion
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    'seguro': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    'clasico': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+    },
+}
+PERFIL_POR_DEFECTO = 'normal'
+
+
+def _nuevo_compresor():
+    """Devuelve (nombre, compresor), prefiriendo zstd si esta instalado"""
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor().compressobj()
+    return 'zlib', zlib.compressobj(6)
+
+
+def _nuevo_descompresor(compresion):
+    if compresion == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Se requiere el paquete 'zstandard' para leer este documento")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if compresion == 'zlib':
+        return zlib.decompressobj()
+    return None
+
+
+def _a_numero(serie):
+    """Convierte importes escritos como texto ('$1,234.50') a float; lo ilegible queda NaN"""
+    texto = serie.astype(str).str.replace(r'[$,\s]', '', regex=True)
+    return pd.to_numeric(texto, errors='coerce')
+
+
+class _LectorBlob(io.RawIOBase):
+    """
+    Adapta un sqlite3.Blob a un flujo de lectura de Python,
+    descomprimiendo al vuelo si se indica un descompresor.
+    """
+    def __init__(self, blob, descompresor=None):
+        self.blob = blob
+        self.descompresor = descompresor
+        self.pendiente = b''
+        self.posicion = 0
+        self.fin = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.descompresor is None:
+            datos = self.blob.read(len(buffer))
+            buffer[:len(datos)] = datos
+            return len(datos)
+
+        while self.posicion >= len(self.pendiente) and not self.fin:
+            datos = self.blob.read(TAMANO_BLOQUE)
+            if datos:
+                self.pendiente = self.descompresor.decompress(datos)
+            else:
+                self.pendiente = self.descompresor.flush()
+                self.fin = True
+            self.posicion = 0
+
+        n = min(len(buffer), len(self.pendiente) - self.posicion)
+        buffer[:n] = self.pendiente[self.posicion:self.posicion + n]
+        self.posicion += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.blob.close()
+        super().close()
+
+
+class EspacioInsuficiente(OSError):
+    """No hay espacio libre en disco para una operacion que copia la base"""
+
+
+def _espacio_libre(db_name):
+    """Bytes libres en el disco donde esta el archivo de la base"""
+    return shutil.disk_usage(os.path.dirname(os.path.abspath(db_name))).free
+
+
+class GestorConexiones:
+    """
+    Administra las conexiones a una base de datos para todo el proceso.
+    Mantiene una unica conexion de escritura y un pequeño pool de conexiones
+    de lectura, y ejecuta la creacion del esquema una sola vez.
+    """
+    _gestores = {}
+    _lock_gestores = threading.Lock()
+
+    def __init__(self, db_name, tam_pool_lectura=2, perfil=PERFIL_POR_DEFECTO, progreso_migracion=None):
+        if perfil not in PERFILES_DURABILIDAD:
+            raise ValueError(f"Perfil de durabilidad desconocido: {perfil}")
         self.db_name = db_name
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
-        self._crear_tablas()
-        
-    def _crear_tablas(self):
-        """Crea las tablas necesarias si no existen"""
-        self.cursor.executescript('''
+        self.perfil = perfil
+        self.lock_escritura = threading.RLock()
+        # Transacciones abiertas con transaccion() y el hilo que las posee
+        self.nivel_transaccion = 0
+        self.hilo_transaccion = None
+        # Momento (time.monotonic) de la ultima transaccion, para saber si la base esta inactiva
+        self.ultima_escritura = time.monotonic()
+        # Activo mientras corre el VACUUM completo de activar_vacuum_incremental
+        self._vacuum_completo = threading.Event()
+        self.conn_escritura = sqlite3.connect(db_name, check_same_thread=False)
+        # Solo tiene efecto si el archivo aun no existe: debe ir antes de que
+        # journal_mode = WAL lo cree. Las bases existentes se convierten en
+        # activar_vacuum_incremental
+        self.conn_escritura.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        try:
+            self._aplicar_perfil(self.conn_escritura)
+            _crear_tablas(self.conn_escritura)
+            _aplicar_migraciones(self.conn_escritura, progreso_migracion)
+        except Exception:
+            self.conn_escritura.close()
+            raise
+        # Se activa despues de las migraciones: con foreign_keys=ON, reconstruir
+        # tablas (RENAME/DROP) modificaria o validaria las referencias
+        self.conn_escritura.execute('PRAGMA foreign_keys = ON')
+        self._hilo_vacuum = None
+        self._detener_vacuum = threading.Event()
+        # Emisores ya consultados, compartidos por todas las ConcesionesDB del proceso
+        self.cache_emisores = {}
+
+        # Una base en memoria no puede compartirse entre conexiones
+        if db_name == ':memory:':
+            tam_pool_lectura = 0
+        self._lectores = queue.Queue()
+        self._conexiones_lectura = []
+        for _ in range(tam_pool_lectura):
+            conn = sqlite3.connect(db_name, check_same_thread=False)
+            self._aplicar_perfil(conn)
+            self._conexiones_lectura.append(conn)
+            self._lectores.put(conn)
+
+    def _aplicar_perfil(self, conn):
+        for pragma, valor in PERFILES_DURABILIDAD[self.perfil].items():
+            conn.execute(f'PRAGMA {pragma} = {valor}')
+
+    @classmethod
+    def obtener(cls, db_name='concesiones.db', perfil=None, progreso_migracion=None):
+        """
+        Devuelve el gestor del proceso para db_name, creandolo si no existe.
+        El perfil y progreso_migracion solo se usan al crearlo; None equivale
+        a PERFIL_POR_DEFECTO. Ver _aplicar_migraciones.
+        """
+        clave = db_name if db_name == ':memory:' else os.path.abspath(db_name)
+        with cls._lock_gestores:
+            gestor = cls._gestores.get(clave)
+            if gestor is None:
+                gestor = cls(db_name, perfil=perfil or PERFIL_POR_DEFECTO,
+                             progreso_migracion=progreso_migracion)
+                cls._gestores[clave] = gestor
+            return gestor
+
+    @classmethod
+    def cerrar_todos(cls):
+        """Cierra todas las conexiones abiertas por el proceso"""
+        with cls._lock_gestores:
+            for gestor in cls._gestores.values():
+                gestor.cerrar()
+            cls._gestores.clear()
+
+    @contextmanager
+    def lector(self):
+        """
+        Presta una conexion de lectura del pool. Si el pool esta vacio
+        (por ejemplo en una base en memoria) o el hilo tiene una transaccion
+        abierta, se usa la conexion de escritura para ver sus propios cambios.
+        """
+        if not self._conexiones_lectura or self.hilo_transaccion == threading.get_ident():
+            with self.lock_escritura:
+                yield self.conn_escritura
+            return
+        conn = self._lectores.get()
+        try:
+            yield conn
+        finally:
+            self._lectores.put(conn)
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Agrupa las escrituras del bloque en una sola transaccion de la conexion
+        de escritura: se confirma al salir y se deshace si hay una excepcion.
+        Los bloques anidados usan SAVEPOINT, asi que un error interno solo
+        deshace su parte. Otros hilos esperan a que termine para escribir,
+        salvo al VACUUM completo de activar_vacuum_incremental, que se
+        interrumpe para no dejar a la interfaz esperando.
+        """
+        while not self.lock_escritura.acquire(timeout=0.05):
+            if self._vacuum_completo.is_set():
+                self.conn_escritura.interrupt()
+        try:
+            self.ultima_escritura = time.monotonic()
+            conn = self.conn_escritura
+            nivel = self.nivel_transaccion + 1
+            if nivel > 1:
+                conn.execute(f'SAVEPOINT nivel_{nivel}')
+            elif not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            self.nivel_transaccion = nivel
+            if nivel == 1:
+                self.hilo_transaccion = threading.get_ident()
+            try:
+                yield conn
+            except BaseException:
+                if nivel == 1:
+                    conn.rollback()
+                else:
+                    conn.execute(f'ROLLBACK TO nivel_{nivel}')
+                    conn.execute(f'RELEASE nivel_{nivel}')
+                raise
+            else:
+                if nivel == 1:
+                    conn.commit()
+                else:
+                    conn.execute(f'RELEASE nivel_{nivel}')
+            finally:
+                self.nivel_transaccion -= 1
+                if nivel == 1:
+                    self.hilo_transaccion = None
+        finally:
+            self.lock_escritura.release()
+
+    def vacuum_incremental(self, paginas_por_paso=256):
+        """
+        Devuelve al sistema las paginas libres del archivo (auto_vacuum=INCREMENTAL)
+        en pasos cortos, soltando el lock de escritura entre paso y paso para no
+        bloquear a la interfaz. Devuelve el numero de paginas liberadas.
+        """
+        liberadas = 0
+        while not self._detener_vacuum.is_set():
+            with self.lock_escritura:
+                conn = self.conn_escritura
+                libres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if libres == 0:
+                    break
+                conn.execute(f'PRAGMA incremental_vacuum({min(libres, paginas_por_paso)})').fetchall()
+                liberadas += libres - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return liberadas
+
+    def activar_vacuum_incremental(self):
+        """
+        Pasa una base existente a auto_vacuum=INCREMENTAL; las nuevas ya se
+        crean asi. Requiere un VACUUM completo, que reescribe todo el archivo:
+        tarda en proporcion al tamaño de la base (minutos con varios GB) y
+        necesita libre en disco alrededor del doble del archivo (la copia
+        temporal y el WAL). Por eso no se hace al abrir la base sino en el
+        hilo de iniciar_vacuum_periodico, cuando no ha habido escrituras en
+        INACTIVIDAD_VACUUM_COMPLETO segundos. Si mientras corre otro hilo
+        abre una transaccion, el VACUUM se interrumpe y se deshace en lugar
+        de hacerlo esperar. Devuelve True si la base queda en modo
+        incremental y False si falta espacio o se interrumpio; en ambos casos
+        se puede reintentar mas tarde.
+        """
+        with self.lock_escritura:
+            conn = self.conn_escritura
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return True
+            if conn.in_transaction:
+                return False  # VACUUM no puede correr dentro de una transaccion
+            if self.db_name != ':memory:':
+                tamano = os.path.getsize(self.db_name)
+                libre = _espacio_libre(self.db_name)
+                if libre < 2 * tamano:
+                    logger.warning("No se activa el vacuum incremental: se necesitan %d bytes libres y hay %d",
+                                   2 * tamano, libre)
+                    return False
+            self._vacuum_completo.set()
+            try:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            except sqlite3.OperationalError as e:
+                if str(e) != 'interrupted':
+                    raise
+                logger.info("VACUUM completo interrumpido por una escritura; se reintentara")
+                return False
+            finally:
+                self._vacuum_completo.clear()
+        return True
+
+    def iniciar_vacuum_periodico(self, intervalo=300, paginas_por_paso=256,
+                                 inactividad=INACTIVIDAD_VACUUM_COMPLETO):
+        """
+        En un hilo de fondo, convierte la base a vacuum incremental si hace
+        falta (activar_vacuum_incremental) en cuanto lleva 'inactividad'
+        segundos sin escrituras, reintentando cada 'intervalo' si no lo logra,
+        y despues ejecuta vacuum_incremental cada 'intervalo' segundos.
+        """
+        if self._hilo_vacuum is not None:
+            return
+
+        def ejecutar():
+            convertida = False
+            espera = 0
+            while not self._detener_vacuum.wait(espera):
+                espera = intervalo
+                if not convertida:
+                    inactiva = time.monotonic() - self.ultima_escritura
+                    if inactiva < inactividad:
+                        espera = inactividad - inactiva
+                        continue
+                    try:
+                        convertida = self.activar_vacuum_incremental()
+                    except sqlite3.Error:
+                        logger.warning("No se pudo activar el vacuum incremental", exc_info=True)
+                    continue
+                try:
+                    self.vacuum_incremental(paginas_por_paso)
+                except sqlite3.Error:
+                    logger.warning("No se pudo ejecutar el vacuum incremental", exc_info=True)
+
+        self._hilo_vacuum = threading.Thread(target=ejecutar, name='vacuum-incremental', daemon=True)
+        self._hilo_vacuum.start()
+
+    def cerrar(self):
+        self._detener_vacuum.set()
+        if self._hilo_vacuum is not None:
+            self._hilo_vacuum.join()
+            self._hilo_vacuum = None
+        for conn in self._conexiones_lectura:
+            conn.close()
+        self._conexiones_lectura = []
+        self.conn_escritura.close()
+
+
+def _crear_tablas(conn):
+    """Crea las tablas necesarias si no existen"""
+    conn.executescript('''
             CREATE TABLE IF NOT EXISTS grantingEmisor (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 nombre_emisor TEXT NOT NULL,
@@ -41,9 +468,21 @@ class ConcesionesDB:
                 concesion_id INTEGER NOT NULL,
                 nombre TEXT NOT NULL,
                 tipo TEXT CHECK(tipo IN ('PDF', 'Excel', 'CSV')),
-                contenido BLOB NOT NULL,
+                tamano INTEGER NOT NULL DEFAULT 0,
+                sha256 TEXT,
+                fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (concesion_id) REFERENCES Concesiones(id)
             );
+
+            CREATE TABLE IF NOT EXISTS Blobs (
+                sha256 TEXT PRIMARY KEY,
+                tamano INTEGER NOT NULL,
+                compresion TEXT NOT NULL DEFAULT 'ninguna'
+                    CHECK(compresion IN ('ninguna', 'zlib', 'zstd')),
+                tamano_almacenado INTEGER NOT NULL,
+                referencias INTEGER NOT NULL DEFAULT 0,
+                contenido BLOB NOT NULL
+            );
                                   
             CREATE TABLE IF NOT EXISTS DocumentoProducto (
                 documento_id INTEGER NOT NULL,
@@ -75,42 +514,412 @@ class ConcesionesDB:
                 FOREIGN KEY (concesion_id) REFERENCES Concesiones(id)
             );                       
         ''')
-        self.conn.commit()
-    
+    conn.commit()
+
+
+def _existe_tabla(conn, nombre):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+    ).fetchone() is not None
+
+
+def _migracion_1_separar_documentos(conn):
+    """
+    Convierte una tabla Documentos antigua, que guardaba el BLOB en la misma
+    fila, al esquema de metadatos (Documentos) + contenido (DocumentosContenido).
+    """
+    columnas = [fila[1] for fila in conn.execute('PRAGMA table_info(Documentos)')]
+    if 'contenido' not in columnas:
+        return
+    _verificar_espacio_para_copiar(conn, 'SELECT SUM(length(contenido)) FROM Documentos')
+
+    conn.create_function('sha256_hex', 1, lambda datos: hashlib.sha256(datos).hexdigest())
+    conn.execute('''
+        CREATE TABLE Documentos_nuevo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            concesion_id INTEGER NOT NULL,
+            nombre TEXT NOT NULL,
+            tipo TEXT CHECK(tipo IN ('PDF', 'Excel', 'CSV')),
+            tamano INTEGER NOT NULL DEFAULT 0,
+            sha256 TEXT,
+            fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (concesion_id) REFERENCES Concesiones(id)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO Documentos_nuevo (id, concesion_id, nombre, tipo, tamano, sha256)
+            SELECT id, concesion_id, nombre, tipo, length(contenido), sha256_hex(contenido)
+            FROM Documentos
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS DocumentosContenido (
+            documento_id INTEGER PRIMARY KEY,
+            contenido BLOB NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO DocumentosContenido (documento_id, contenido)
+            SELECT id, contenido FROM Documentos
+    ''')
+    conn.execute('DROP TABLE Documentos')
+    conn.execute('ALTER TABLE Documentos_nuevo RENAME TO Documentos')
+
+
+def _verificar_espacio_para_copiar(conn, sql_bytes):
+    """
+    Lanza EspacioInsuficiente si en el disco de la base no cabe la copia de
+    los bytes que cuenta sql_bytes (length() de un BLOB no lee su contenido).
+    Asi una migracion que duplica los BLOBs falla antes de empezar en lugar
+    de a medias con SQLITE_FULL.
+    """
+    archivo = next(fila[2] for fila in conn.execute('PRAGMA database_list') if fila[1] == 'main')
+    if not archivo:
+        return  # Base en memoria
+    necesarios = ESPACIO_POR_BYTE_MIGRADO * (conn.execute(sql_bytes).fetchone()[0] or 0)
+    libres = _espacio_libre(archivo)
+    if libres < necesarios:
+        raise EspacioInsuficiente(
+            f"Se necesitan {necesarios // 2**20} MB libres para actualizar la base de datos "
+            f"y hay {libres // 2**20} MB")
+
+
+def _migracion_2_almacen_de_blobs(conn):
+    """
+    Mueve el contenido de DocumentosContenido (una copia por documento) al
+    almacen direccionado por contenido Blobs, fusionando los duplicados, y crea
+    los disparadores que mantienen el conteo de referencias.
+    """
+    if _existe_tabla(conn, 'DocumentosContenido'):
+        _verificar_espacio_para_copiar(conn, 'SELECT SUM(length(contenido)) FROM DocumentosContenido')
+        conn.create_function('sha256_hex', 1, lambda datos: hashlib.sha256(datos).hexdigest())
+        conn.execute('''
+            UPDATE Documentos SET sha256 = (
+                SELECT sha256_hex(dc.contenido) FROM DocumentosContenido dc
+                WHERE dc.documento_id = Documentos.id
+            ) WHERE sha256 IS NULL
+        ''')
+        conn.execute('''
+            INSERT OR IGNORE INTO Blobs (sha256, tamano, tamano_almacenado, contenido)
+                SELECT d.sha256, length(dc.contenido), length(dc.contenido), dc.contenido
+                FROM DocumentosContenido dc
+                JOIN Documentos d ON d.id = dc.documento_id
+                WHERE d.sha256 IS NOT NULL
+        ''')
+        conn.execute('''
+            UPDATE Blobs SET referencias = (
+                SELECT COUNT(*) FROM Documentos d WHERE d.sha256 = Blobs.sha256
+            )
+        ''')
+        conn.execute('DROP TABLE DocumentosContenido')
+    _crear_disparadores_blobs(conn)
+
+
+def _crear_disparadores_blobs(conn):
+    """Mantiene el conteo de referencias de Blobs al crear o borrar documentos"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS documentos_blob_insert
+        AFTER INSERT ON Documentos WHEN NEW.sha256 IS NOT NULL
+        BEGIN
+            UPDATE Blobs SET referencias = referencias + 1 WHERE sha256 = NEW.sha256;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS documentos_blob_delete
+        AFTER DELETE ON Documentos WHEN OLD.sha256 IS NOT NULL
+        BEGIN
+            UPDATE Blobs SET referencias = referencias - 1 WHERE sha256 = OLD.sha256;
+            DELETE FROM Blobs WHERE sha256 = OLD.sha256 AND referencias <= 0;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS documentos_blob_update
+        AFTER UPDATE OF sha256 ON Documentos WHEN OLD.sha256 IS NOT NEW.sha256
+        BEGIN
+            UPDATE Blobs SET referencias = referencias + 1 WHERE sha256 = NEW.sha256;
+            UPDATE Blobs SET referencias = referencias - 1 WHERE sha256 = OLD.sha256;
+            DELETE FROM Blobs WHERE sha256 = OLD.sha256 AND referencias <= 0;
+        END
+    ''')
+
+
+def _migracion_3_indices(conn):
+    """Indices secundarios para las columnas por las que filtran las consultas"""
+    for sql in (
+        'CREATE INDEX IF NOT EXISTS idx_documentos_concesion ON Documentos(concesion_id)',
+        'CREATE INDEX IF NOT EXISTS idx_documentos_sha256 ON Documentos(sha256)',
+        'CREATE INDEX IF NOT EXISTS idx_productos_concesion ON Productos(concesion_id)',
+        'CREATE INDEX IF NOT EXISTS idx_reportes_concesion ON ReportesPDF(concesion_id)',
+        'CREATE INDEX IF NOT EXISTS idx_contacto_emisor ON Contacto(emisor_id)',
+        'CREATE INDEX IF NOT EXISTS idx_concesiones_emisor ON Concesiones(emisor_id)',
+        '''CREATE INDEX IF NOT EXISTS idx_concesiones_finalizada_vencimiento
+               ON Concesiones(finalizada, fecha_vencimiento)''',
+        'CREATE INDEX IF NOT EXISTS idx_documento_producto_documento ON DocumentoProducto(documento_id)',
+        'CREATE INDEX IF NOT EXISTS idx_documento_producto_producto ON DocumentoProducto(producto_id)',
+    ):
+        conn.execute(sql)
+    conn.execute('ANALYZE')
+
+
+def _migracion_4_cache_titulos(conn):
+    """
+    Titulos de libros consultados en servicios externos. Un titulo NULL es un
+    resultado negativo (ningun servicio conoce el ISBN) y caduca con el TTL
+    que indique quien consulta; los positivos no caducan.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS CacheTitulos (
+            isbn TEXT PRIMARY KEY,
+            titulo TEXT,
+            fuente TEXT,
+            fecha_consulta REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+# Da de alta o actualiza en Catalogo el ISBN del producto NEW. El producto
+# mas reciente (id mayor) es el que define titulo, proveedor y PVP; un PVP
+# desconocido (NULL o 0, como lo deja importar_productos) no borra el anterior.
+_SQL_CATALOGO_DESDE_PRODUCTO = '''
+    INSERT INTO Catalogo (isbn, titulo, proveedor, ultimo_pvp, producto_id)
+    VALUES (NEW.isbn, NEW.descripcion,
+            (SELECT e.nombre_emisor FROM Concesiones c
+             JOIN grantingEmisor e ON e.id = c.emisor_id
+             WHERE c.id = NEW.concesion_id),
+            NULLIF(NEW.pvp_unitario, 0), NEW.id)
+    ON CONFLICT(isbn) DO UPDATE SET
+        titulo = excluded.titulo,
+        proveedor = excluded.proveedor,
+        ultimo_pvp = COALESCE(excluded.ultimo_pvp, Catalogo.ultimo_pvp),
+        producto_id = excluded.producto_id
+    WHERE excluded.producto_id >= Catalogo.producto_id;
+'''
+
+
+def _migracion_5_catalogo(conn):
+    """
+    Catalogo bibliografico propio: un renglon por ISBN con el titulo, el
+    proveedor y el ultimo PVP con que se ha recibido, mas un indice FTS5 para
+    buscar por titulo. Disparadores sobre Productos lo mantienen al dia fila
+    por fila, sin reconstruirlo; borrar productos no lo borra (es historial).
+    """
+    # executescript confirmaria la transaccion de la migracion: sentencia por sentencia
+    for sql in (
+        '''CREATE TABLE IF NOT EXISTS Catalogo (
+            id INTEGER PRIMARY KEY,
+            isbn TEXT NOT NULL UNIQUE,
+            titulo TEXT NOT NULL,
+            proveedor TEXT,
+            ultimo_pvp REAL,
+            producto_id INTEGER NOT NULL
+        )''',
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS CatalogoBusqueda USING fts5(
+            titulo, proveedor,
+            content='Catalogo', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS catalogo_busqueda_alta AFTER INSERT ON Catalogo
+        BEGIN
+            INSERT INTO CatalogoBusqueda (rowid, titulo, proveedor)
+            VALUES (NEW.id, NEW.titulo, NEW.proveedor);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS catalogo_busqueda_baja AFTER DELETE ON Catalogo
+        BEGIN
+            INSERT INTO CatalogoBusqueda (CatalogoBusqueda, rowid, titulo, proveedor)
+            VALUES ('delete', OLD.id, OLD.titulo, OLD.proveedor);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS catalogo_busqueda_cambio AFTER UPDATE OF titulo, proveedor ON Catalogo
+        BEGIN
+            INSERT INTO CatalogoBusqueda (CatalogoBusqueda, rowid, titulo, proveedor)
+            VALUES ('delete', OLD.id, OLD.titulo, OLD.proveedor);
+            INSERT INTO CatalogoBusqueda (rowid, titulo, proveedor)
+            VALUES (NEW.id, NEW.titulo, NEW.proveedor);
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS catalogo_producto_alta AFTER INSERT ON Productos
+        WHEN NEW.isbn IS NOT NULL AND NEW.isbn <> ''
+        BEGIN
+            {_SQL_CATALOGO_DESDE_PRODUCTO}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS catalogo_producto_cambio
+        AFTER UPDATE OF isbn, descripcion, pvp_unitario ON Productos
+        WHEN NEW.isbn IS NOT NULL AND NEW.isbn <> ''
+        BEGIN
+            {_SQL_CATALOGO_DESDE_PRODUCTO}
+        END''',
+    ):
+        conn.execute(sql)
+    # Los productos anteriores a la migracion entran una sola vez, del mas
+    # antiguo al mas reciente para que gane el ultimo
+    conn.execute('''
+        INSERT INTO Catalogo (isbn, titulo, proveedor, ultimo_pvp, producto_id)
+        SELECT p.isbn, p.descripcion, e.nombre_emisor, NULLIF(p.pvp_unitario, 0), p.id
+        FROM Productos p
+        LEFT JOIN Concesiones c ON c.id = p.concesion_id
+        LEFT JOIN grantingEmisor e ON e.id = c.emisor_id
+        WHERE p.isbn IS NOT NULL AND p.isbn <> ''
+        ORDER BY p.id
+        ON CONFLICT(isbn) DO UPDATE SET
+            titulo = excluded.titulo,
+            proveedor = excluded.proveedor,
+            ultimo_pvp = COALESCE(excluded.ultimo_pvp, Catalogo.ultimo_pvp),
+            producto_id = excluded.producto_id
+    ''')
+
+
+def _migracion_6_cache_extracciones(conn):
+    """
+    Tablas extraidas de PDF y filtros del usuario, por contenido del PDF
+    (sha256) y parametros de extraccion. Es una cache: se descarta la
+    entrada usada hace mas tiempo cuando el total pasa del limite.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS CacheExtracciones (
+            id INTEGER PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            parametros TEXT NOT NULL,
+            tablas BLOB NOT NULL,
+            filtros TEXT,
+            tamano INTEGER NOT NULL,
+            ultimo_uso REAL NOT NULL,
+            UNIQUE (sha256, parametros)
+        )
+    ''')
+
+
+def _migracion_7_paginas_en_cache(conn):
+    """
+    Paginas ya analizadas de una extraccion guardada a medias (el modo por
+    hoja solo extrae las que se consultan). NULL indica que estan todas.
+    """
+    columnas = [fila[1] for fila in conn.execute('PRAGMA table_info(CacheExtracciones)')]
+    if 'paginas' not in columnas:
+        conn.execute('ALTER TABLE CacheExtracciones ADD COLUMN paginas TEXT')
+
+
+# Escalera de migraciones. PRAGMA user_version guarda la ultima aplicada.
+# Para cambiar el esquema se agrega una funcion al final con el siguiente
+# numero; nunca se modifica ni se reordena una migracion ya publicada.
+# Cada migracion debe tolerar una base creada con el esquema actual de
+# _crear_tablas, porque en una base nueva se ejecutan todas.
+MIGRACIONES = [
+    (1, _migracion_1_separar_documentos),
+    (2, _migracion_2_almacen_de_blobs),
+    (3, _migracion_3_indices),
+    (4, _migracion_4_cache_titulos),
+    (5, _migracion_5_catalogo),
+    (6, _migracion_6_cache_extracciones),
+    (7, _migracion_7_paginas_en_cache),
+]
+
+
+def migraciones_pendientes(db_name='concesiones.db'):
+    """
+    Numero de migraciones que se aplicaran al abrir db_name, sin abrir el
+    gestor. Sirve para avisar al usuario antes de una actualizacion larga.
+    """
+    if db_name == ':memory:' or not os.path.exists(db_name):
+        return 0  # Una base nueva no tiene datos que migrar
+    conn = sqlite3.connect(db_name)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+    return sum(1 for numero, _ in MIGRACIONES if numero > version)
+
+
+def _aplicar_migraciones(conn, progreso=None):
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transaccion.
+    :param progreso: Funcion opcional progreso(hechas, total) que se llama antes
+        de cada migracion y al terminar la ultima.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    pendientes = [(numero, migracion) for numero, migracion in MIGRACIONES if numero > version]
+    if not pendientes:
+        return
+
+    nivel_aislamiento = conn.isolation_level
+    conn.isolation_level = None  # Las transacciones se controlan explicitamente
+    try:
+        for hechas, (numero, migracion) in enumerate(pendientes):
+            if progreso is not None:
+                progreso(hechas, len(pendientes))
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                migracion(conn)
+                conn.execute(f'PRAGMA user_version = {numero}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if progreso is not None:
+            progreso(len(pendientes), len(pendientes))
+    finally:
+        conn.isolation_level = nivel_aislamiento
+
+
+class ConcesionesDB:
+    """
+    Acceso a la base de datos de concesiones. Crear instancias es barato:
+    todas comparten las conexiones del GestorConexiones del proceso.
+    Cada metodo que escribe confirma sus cambios, salvo dentro de un bloque
+    'with db.transaccion():', que los confirma todos juntos al final.
+    """
+    def __init__(self, db_name='concesiones.db', perfil=None):
+        self.db_name = db_name
+        self.gestor = GestorConexiones.obtener(db_name, perfil)
+        self.conn = self.gestor.conn_escritura
+        self.cursor = self.conn.cursor()
+
+    def transaccion(self):
+        """Context manager que agrupa varias escrituras en una sola transaccion"""
+        return self.gestor.transaccion()
+
+    def _consultar(self, sql, params=()):
+        """Ejecuta una consulta de solo lectura en una conexion del pool"""
+        with self.gestor.lector() as conn:
+            cursor = conn.execute(sql, params)
+            column_names = [column[0] for column in cursor.description]
+            return column_names, cursor.fetchall()
+
+    def obtener_metadatos_documento(self, doc_id):
+        """Obtiene los datos de un documento sin leer su contenido"""
+        column_names, rows = self._consultar('''
+            SELECT id, concesion_id, nombre, tipo, tamano, sha256, fecha_creacion
+            FROM Documentos WHERE id = ?
+        ''', (doc_id,))
+        return dict(zip(column_names, rows[0])) if rows else None
 
     def obtener_documento_por_id(self, doc_id):
-        self.cursor.execute('SELECT nombre, tipo, contenido FROM Documentos WHERE id = ?', (doc_id,))
-        result = self.cursor.fetchone()
-        if result:
+        documento = self.obtener_metadatos_documento(doc_id)
+        if documento:
+            with self.leer_documento(doc_id) as flujo:
+                contenido = flujo.read() if flujo is not None else b''
             return {
-                'nombre': result[0],
-                'tipo': result[1],
-                'contenido': result[2]
+                'nombre': documento['nombre'],
+                'tipo': documento['tipo'],
+                'contenido': contenido
             }
         return None
 
     def marcar_concesion_como_finalizada(self, concesion_id):
-        self.cursor.execute('''
-            UPDATE Concesiones 
-            SET finalizada = 1 
-            WHERE id = ?
-        ''', (concesion_id,))
-        self.conn.commit()
+        with self.transaccion():
+            self.cursor.execute('''
+                UPDATE Concesiones 
+                SET finalizada = 1 
+                WHERE id = ?
+            ''', (concesion_id,))
 
     def obtener_concesion_por_id(self, concesion_id):
-        self.cursor.execute('SELECT * FROM Concesiones WHERE id = ?', (concesion_id,))
-        column_names = [column[0] for column in self.cursor.description]
-        row = self.cursor.fetchone()
-        if not row:
-            return None
-        concesion = dict(zip(column_names, row))
-        concesion['status'] = self._calcular_status(concesion['fecha_recepcion'], concesion['fecha_vencimiento'])
-        return concesion
+        column_names, rows = self._consultar(f'''
+            SELECT *, {_SQL_STATUS} AS status, {_SQL_DIAS_RESTANTES} AS dias_restantes
+            FROM Concesiones WHERE id = ?
+        ''', (concesion_id,))
+        return dict(zip(column_names, rows[0])) if rows else None
 
     def obtener_concesiones_no_finalizadas_con_emisor(self):
             """Obtiene todas las concesiones no finalizadas con el nombre del emisor y folio,
             filtrando solo aquellas que tienen documentos vinculados"""
-            self.cursor.execute('''
+            column_names, rows = self._consultar('''
             SELECT c.id, ge.nombre_emisor, c.folio, c.fecha_recepcion, c.fecha_vencimiento
             FROM Concesiones c
             JOIN grantingEmisor ge ON c.emisor_id = ge.id
@@ -121,26 +930,51 @@ class ConcesionesDB:
                 WHERE d.concesion_id = c.id
             )
             ''')
-            column_names = [column[0] for column in self.cursor.description]
-            return [dict(zip(column_names, row)) for row in self.cursor.fetchall()]
+            return [dict(zip(column_names, row)) for row in rows]
 
     def crear_emisor(self, nombre_emisor, nombre_vendedor):
         """Crea un nuevo emisor en grantingEmisor"""
-        self.cursor.execute('''
-            INSERT INTO grantingEmisor (nombre_emisor, nombre_vendedor)
-            VALUES (?, ?)
-        ''', (nombre_emisor, nombre_vendedor))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        with self.transaccion():
+            self.cursor.execute('''
+                INSERT INTO grantingEmisor (nombre_emisor, nombre_vendedor)
+                VALUES (?, ?)
+            ''', (nombre_emisor, nombre_vendedor))
+            emisor_id = self.cursor.lastrowid
+        self.gestor.cache_emisores.pop(emisor_id, None)
+        return emisor_id
+
+    def actualizar_emisor(self, emisor_id, nombre_emisor, nombre_vendedor):
+        """Actualiza el nombre y el vendedor de un emisor"""
+        with self.transaccion():
+            self.cursor.execute('''
+                UPDATE grantingEmisor SET nombre_emisor = ?, nombre_vendedor = ?
+                WHERE id = ?
+            ''', (nombre_emisor, nombre_vendedor, emisor_id))
+        self.gestor.cache_emisores.pop(emisor_id, None)
+
+    def obtener_emisor(self, emisor_id):
+        """
+        Obtiene un emisor como diccionario (id, nombre_emisor, nombre_vendedor).
+        El resultado se guarda en memoria hasta que el emisor se modifique.
+        """
+        cache = self.gestor.cache_emisores
+        if emisor_id not in cache:
+            column_names, rows = self._consultar(
+                'SELECT id, nombre_emisor, nombre_vendedor FROM grantingEmisor WHERE id = ?', (emisor_id,)
+            )
+            if not rows:
+                return None
+            cache[emisor_id] = dict(zip(column_names, rows[0]))
+        return cache[emisor_id]
     
     def crear_contacto(self, emisor_id, numero, correo):
         """Añade un contacto a un emisor"""
-        self.cursor.execute('''
-            INSERT INTO Contacto (emisor_id, numero, correo_electronico)
-            VALUES (?, ?, ?)
-        ''', (emisor_id, numero, correo))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        with self.transaccion():
+            self.cursor.execute('''
+                INSERT INTO Contacto (emisor_id, numero, correo_electronico)
+                VALUES (?, ?, ?)
+            ''', (emisor_id, numero, correo))
+            return self.cursor.lastrowid
     
     def crear_concesion(self, emisor_id, tipo, folio, fecha_recepcion,fecha_vencimiento=None, dias_validez=None):
         """Crea una nueva concesión con validación de fechas"""
@@ -154,122 +988,489 @@ class ConcesionesDB:
             fecha_recepcion = datetime.strptime(fecha_recepcion, '%Y-%m-%d').date()
             fecha_vencimiento = (fecha_recepcion + timedelta(days=dias_validez)).strftime('%Y-%m-%d')
         
-        self.cursor.execute('''
-            INSERT INTO Concesiones (emisor_id, tipo, folio, fecha_recepcion, fecha_vencimiento)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (emisor_id, tipo, folio, fecha_recepcion, fecha_vencimiento))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        with self.transaccion():
+            self.cursor.execute('''
+                INSERT INTO Concesiones (emisor_id, tipo, folio, fecha_recepcion, fecha_vencimiento)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (emisor_id, tipo, folio, fecha_recepcion, fecha_vencimiento))
+            return self.cursor.lastrowid
     
     def crear_documento(self, concesion_id, nombre, tipo, archivo_path):
         """Almacena un documento en la base de datos"""
         if tipo not in ('PDF', 'Excel', 'CSV'):
             raise ValueError("Tipo debe ser PDF, Excel o CSV")
-        
+
         with open(archivo_path, 'rb') as f:
-            contenido = f.read()
-        
-        self.cursor.execute('''
-            INSERT INTO Documentos (concesion_id, nombre, tipo, contenido)
-            VALUES (?, ?, ?, ?)
-        ''', (concesion_id, nombre, tipo, contenido))
-        self.conn.commit()
-        return self.cursor.lastrowid
+            return self.crear_documento_desde_flujo(concesion_id, nombre, tipo, f)
+
+    def crear_documento_desde_flujo(self, concesion_id, nombre, tipo, flujo):
+        """
+        Almacena un documento leyendo su contenido de un flujo binario con
+        seek (un archivo abierto o un io.BytesIO), sin pasar por el disco.
+        """
+        if tipo not in ('PDF', 'Excel', 'CSV'):
+            raise ValueError("Tipo debe ser PDF, Excel o CSV")
+
+        with self.transaccion():
+            sha256, tamano = self._guardar_contenido(flujo, tipo)
+            # El disparador documentos_blob_insert suma la referencia en Blobs
+            self.cursor.execute('''
+                INSERT INTO Documentos (concesion_id, nombre, tipo, tamano, sha256)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (concesion_id, nombre, tipo, tamano, sha256))
+            return self.cursor.lastrowid
+
+    def _guardar_contenido(self, origen, tipo):
+        """
+        Guarda el flujo origen en Blobs si su contenido aun no existe.
+        Los tipos de TIPOS_COMPRIMIBLES se comprimen cuando vale la pena.
+        Devuelve (sha256, tamano) del contenido original.
+        """
+        sha256 = hashlib.sha256()
+        tamano = 0
+        for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+            sha256.update(bloque)
+            tamano += len(bloque)
+        sha256 = sha256.hexdigest()
+
+        self.cursor.execute('SELECT 1 FROM Blobs WHERE sha256 = ?', (sha256,))
+        if self.cursor.fetchone():
+            return sha256, tamano
+
+        origen.seek(0)
+        with tempfile.TemporaryFile() as comprimido:
+            compresion = 'ninguna'
+            tamano_almacenado = tamano
+            if tipo in TIPOS_COMPRIMIBLES and tamano > 0:
+                nombre_compresion, compresor = _nuevo_compresor()
+                for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+                    comprimido.write(compresor.compress(bloque))
+                comprimido.write(compresor.flush())
+                # Solo se conserva la version comprimida si ahorra al menos un 10%
+                if comprimido.tell() < tamano * 0.9:
+                    compresion = nombre_compresion
+                    tamano_almacenado = comprimido.tell()
+                comprimido.seek(0)
+                origen.seek(0)
+
+            self.cursor.execute('''
+                INSERT INTO Blobs (sha256, tamano, compresion, tamano_almacenado, contenido)
+                VALUES (?, ?, ?, ?, zeroblob(?))
+            ''', (sha256, tamano, compresion, tamano_almacenado, tamano_almacenado))
+            self._escribir_blob('Blobs', self.cursor.lastrowid,
+                                comprimido if compresion != 'ninguna' else origen)
+        return sha256, tamano
+
+    def _escribir_blob(self, tabla, rowid, origen):
+        """
+        Copia el flujo origen por bloques al BLOB 'contenido' de la fila rowid,
+        previamente reservado con zeroblob.
+        """
+        with self.conn.blobopen(tabla, 'contenido', rowid) as blob:
+            for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+                blob.write(bloque)
+
+    @contextmanager
+    def _abrir_blob(self, tabla, consulta, params):
+        """
+        Abre como flujo de solo lectura el BLOB 'contenido' de la fila de tabla
+        indicada por consulta, que debe devolver (rowid, compresion).
+        """
+        with self.gestor.lector() as conn:
+            fila = conn.execute(consulta, params).fetchone()
+            if not fila:
+                yield None
+                return
+            rowid, compresion = fila
+            blob = conn.blobopen(tabla, 'contenido', rowid, readonly=True)
+            flujo = io.BufferedReader(_LectorBlob(blob, _nuevo_descompresor(compresion)), TAMANO_BLOQUE)
+            try:
+                yield flujo
+            finally:
+                flujo.close()
+
+    def _exportar_blob(self, flujo_cm, destino):
+        """Copia por bloques un flujo abierto con _abrir_blob al archivo destino"""
+        with flujo_cm as flujo:
+            if flujo is None:
+                return False
+            with open(destino, 'wb') as f:
+                while True:
+                    bloque = flujo.read(TAMANO_BLOQUE)
+                    if not bloque:
+                        break
+                    f.write(bloque)
+        return True
+
+    def leer_documento(self, doc_id):
+        """
+        Abre el contenido de un documento como flujo de lectura sin cargarlo
+        completo en memoria. Usar con 'with'; produce None si no existe.
+        """
+        return self._abrir_blob('Blobs', '''
+            SELECT b.rowid, b.compresion
+            FROM Documentos d JOIN Blobs b ON b.sha256 = d.sha256
+            WHERE d.id = ?
+        ''', (doc_id,))
+
+    def leer_documento_csv(self, doc_id):
+        """Lee un documento CSV como DataFrame. Devuelve None si no existe."""
+        with self.leer_documento(doc_id) as flujo:
+            return pd.read_csv(flujo) if flujo is not None else None
+
+    def exportar_documento(self, doc_id, destino):
+        """Escribe el contenido de un documento en destino. Devuelve False si no existe."""
+        return self._exportar_blob(self.leer_documento(doc_id), destino)
+
+    def eliminar_documento(self, doc_id):
+        """
+        Elimina un documento. Su contenido se borra de Blobs cuando ningún
+        otro documento lo referencia (disparador documentos_blob_delete).
+        """
+        with self.transaccion():
+            self.cursor.execute('DELETE FROM Documentos WHERE id = ?', (doc_id,))
+
+    def eliminar_concesion(self, concesion_id):
+        """
+        Elimina una concesión junto con sus documentos, productos, vínculos
+        DocumentoProducto y reportes. El contenido de los documentos se borra
+        de Blobs si ya no lo usa otra concesión. El espacio liberado se
+        devuelve al disco con el vacuum incremental.
+        """
+        with self.transaccion():
+            self.cursor.execute('''
+                DELETE FROM DocumentoProducto
+                WHERE documento_id IN (SELECT id FROM Documentos WHERE concesion_id = ?)
+                   OR producto_id IN (SELECT id FROM Productos WHERE concesion_id = ?)
+            ''', (concesion_id, concesion_id))
+            for tabla in ('Documentos', 'Productos', 'ReportesPDF'):
+                self.cursor.execute(f'DELETE FROM {tabla} WHERE concesion_id = ?', (concesion_id,))
+            self.cursor.execute('DELETE FROM Concesiones WHERE id = ?', (concesion_id,))
+            return self.cursor.rowcount > 0
+
+    def buscar_huerfanos(self):
+        """Cuenta, por tabla, las filas que apuntan a un padre que ya no existe"""
+        huerfanos = {}
+        for tabla, condicion in _CONDICIONES_HUERFANOS:
+            huerfanos[tabla] = self._consultar(f'SELECT COUNT(*) FROM {tabla} WHERE {condicion}')[1][0][0]
+        return huerfanos
+
+    def purgar_huerfanos(self):
+        """Borra en una transacción las filas que cuenta buscar_huerfanos. Devuelve lo borrado por tabla."""
+        borrados = {}
+        with self.transaccion():
+            for tabla, condicion in _CONDICIONES_HUERFANOS:
+                self.cursor.execute(f'DELETE FROM {tabla} WHERE {condicion}')
+                borrados[tabla] = self.cursor.rowcount
+        return borrados
+
+    def obtener_estadisticas_almacenamiento(self):
+        """Compara el tamaño de los documentos con lo que ocupan realmente en Blobs"""
+        column_names, rows = self._consultar('''
+            SELECT
+                (SELECT COUNT(*) FROM Documentos) AS documentos,
+                (SELECT COALESCE(SUM(tamano), 0) FROM Documentos) AS bytes_documentos,
+                (SELECT COUNT(*) FROM Blobs) AS blobs,
+                (SELECT COALESCE(SUM(tamano_almacenado), 0) FROM Blobs) AS bytes_almacenados
+        ''')
+        return dict(zip(column_names, rows[0]))
     
     def obtener_emisores(self):
         """Obtiene todos los emisores registrados"""
-        self.cursor.execute('SELECT * FROM grantingEmisor')
-        return self.cursor.fetchall()
-    
-    def obtener_concesiones(self):
-        """Obtiene todas las concesiones con su estado actualizado"""
-        self.cursor.execute('SELECT * FROM Concesiones')
-        column_names = [column[0] for column in self.cursor.description]
-        concesiones = []
-
-        prioridad_estados = {
-        "Vence pronto": 0,
-        "Valido": 1,
-        "Vencida": 2
-        }
-
-        for row in self.cursor.fetchall():
-            # Crear diccionario con nombres de columna
-            concesion = dict(zip(column_names, row))
-            # Calcular estado
-            concesion['status'] = self._calcular_status(concesion['fecha_recepcion'], concesion['fecha_vencimiento'])
-            concesiones.append(concesion)
-        return sorted(concesiones, 
-                key=lambda x: (prioridad_estados[x['status']], x['fecha_vencimiento']))
+        return self._consultar('SELECT * FROM grantingEmisor')[1]
     
+    def obtener_concesiones(self, estado=None, limite=None, desplazamiento=0):
+        """
+        Obtiene las concesiones con su estado ('Vencida', 'Vence pronto', 'Valido')
+        y los días restantes, calculados por SQLite, ordenadas por prioridad de
+        estado y fecha de vencimiento.
+        :param estado: Estado o lista de estados a incluir. None incluye todos.
+        :param limite: Número máximo de filas a devolver. None devuelve todas.
+        :param desplazamiento: Filas a omitir antes de empezar a devolver.
+        """
+        columnas = f'*, {_SQL_STATUS} AS status, {_SQL_DIAS_RESTANTES} AS dias_restantes'
+        sql, params = self._sql_concesiones(columnas, estado, limite, desplazamiento)
+        column_names, rows = self._consultar(sql, params)
+        return [dict(zip(column_names, row)) for row in rows]
 
-    def _calcular_status(self, fecha_recepcion, fecha_vencimiento):
-        """Calcula el estado de la concesión según las nuevas reglas"""
-        hoy = datetime.now().date()
-        rec = datetime.strptime(fecha_recepcion, '%Y-%m-%d').date()
-        venc = datetime.strptime(fecha_vencimiento, '%Y-%m-%d').date()
+    def obtener_lista_concesiones(self, estado=None, limite=None, desplazamiento=0):
+        """
+        Igual que obtener_concesiones, pero cada concesión incluye además
+        nombre_emisor, nombre_vendedor, num_productos y num_documentos,
+        todo en una sola consulta. Pensado para llenar listas en la interfaz.
+        """
+        columnas = f'''c.*, {_SQL_STATUS} AS status, {_SQL_DIAS_RESTANTES} AS dias_restantes,
+            ge.nombre_emisor, ge.nombre_vendedor,
+            (SELECT COUNT(*) FROM Productos p WHERE p.concesion_id = c.id) AS num_productos,
+            (SELECT COUNT(*) FROM Documentos d WHERE d.concesion_id = c.id) AS num_documentos'''
+        tablas = 'Concesiones c LEFT JOIN grantingEmisor ge ON ge.id = c.emisor_id'
+        sql, params = self._sql_concesiones(columnas, estado, limite, desplazamiento, tablas=tablas)
+        column_names, rows = self._consultar(sql, params)
+        return [dict(zip(column_names, row)) for row in rows]
 
-        if hoy > venc:
-            return 'Vencida'
-        
-        # Si la fecha actual está dentro del rango [recepción, vencimiento]
-        dias_restantes = (venc - hoy).days
-        return 'Vence pronto' if dias_restantes <= 14 else 'Valido'
+    def contar_concesiones(self, estado=None):
+        """Cuenta las concesiones, opcionalmente solo las de ciertos estados"""
+        sql, params = self._sql_concesiones('COUNT(*)', estado, ordenar=False)
+        return self._consultar(sql, params)[1][0][0]
+
+    def _sql_concesiones(self, columnas, estado=None, limite=None, desplazamiento=0, ordenar=True,
+                         tablas='Concesiones c'):
+        """
+        Arma la consulta de concesiones con filtro por estado, orden y paginación.
+        El id desempata el orden para que LIMIT/OFFSET no repita ni salte filas
+        entre páginas cuando varias concesiones vencen el mismo día.
+        """
+        if isinstance(estado, str):
+            estado = (estado,)
+        sql = f'SELECT {columnas} FROM {tablas}'
+        params = []
+        if estado is not None:
+            for e in estado:
+                if e not in _CONDICIONES_ESTADO:
+                    raise ValueError(f"Estado de concesión desconocido: {e}")
+            sql += ' WHERE ' + ' OR '.join(f'({_CONDICIONES_ESTADO[e]})' for e in estado)
+        if ordenar:
+            sql += f' ORDER BY {_SQL_PRIORIDAD_STATUS}, fecha_vencimiento, c.id'
+        if limite is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [limite, desplazamiento]
+        return sql, params
     
     def obtener_documentos(self, concesion_id):
-        """Obtiene documentos asociados a una concesión"""
-        self.cursor.execute('SELECT * FROM Documentos WHERE concesion_id = ?', (concesion_id,))
-        return self.cursor.fetchall()
+        """
+        Obtiene los metadatos de los documentos de una concesión:
+        (id, concesion_id, nombre, tipo, tamano, sha256, fecha_creacion).
+        El contenido se lee aparte con obtener_documento_por_id.
+        """
+        return self._consultar('''
+            SELECT id, concesion_id, nombre, tipo, tamano, sha256, fecha_creacion
+            FROM Documentos WHERE concesion_id = ?
+        ''', (concesion_id,))[1]
     
     def obtener_contactos(self, emisor_id):
         """Obtiene contactos de un emisor"""
-        self.cursor.execute('SELECT * FROM Contacto WHERE emisor_id = ?', (emisor_id,))
-        return self.cursor.fetchall()
+        return self._consultar('SELECT * FROM Contacto WHERE emisor_id = ?', (emisor_id,))[1]
     
     def crear_producto(self, concesion_id, cantidad, descripcion, isbn, pvp_unitario, precio_neto):
         precio_total = cantidad * precio_neto
-        self.cursor.execute('''
-        INSERT INTO Productos (concesion_id, cantidad, descripcion, isbn, pvp_unitario, precio_neto, precio_total)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (concesion_id, cantidad, descripcion, isbn, pvp_unitario, precio_neto, precio_total))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        with self.transaccion():
+            self.cursor.execute('''
+            INSERT INTO Productos (concesion_id, cantidad, descripcion, isbn, pvp_unitario, precio_neto, precio_total)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (concesion_id, cantidad, descripcion, isbn, pvp_unitario, precio_neto, precio_total))
+            return self.cursor.lastrowid
+
+    def importar_productos(self, concesion_id, rows):
+        """
+        Inserta en una sola transaccion los productos de rows, un DataFrame (o
+        lista de diccionarios) con columnas cantidad, descripcion y precio_neto,
+        y opcionalmente isbn y pvp_unitario. Los importes pueden venir como
+        texto ('$1,234.50'). Los ISBN validos se guardan como ISBN-13; los que
+        no lo son se guardan limpios (solo digitos y X) para no perder el dato,
+        y los vacios quedan NULL. Se descartan las filas sin descripcion, con una
+        cantidad que no sea un entero positivo o con precio_neto ilegible.
+        Devuelve (numero de productos insertados, DataFrame de filas descartadas).
+        """
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+        faltantes = [col for col in COLUMNAS_REQUERIDAS_PRODUCTO if col not in df.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas para importar productos: {', '.join(faltantes)}")
+        vacia = pd.Series(None, index=df.index, dtype=object)
+        isbn = normalizar_isbn(df.get('isbn', vacia), conservar_invalidos=True)
+
+        productos = pd.DataFrame({
+            'cantidad': _a_numero(df['cantidad']),
+            'descripcion': df['descripcion'].fillna('').astype(str).str.strip(),
+            'isbn': isbn.where(isbn != '', None),
+            'pvp_unitario': _a_numero(df.get('pvp_unitario', vacia)).fillna(0.0),
+            'precio_neto': _a_numero(df['precio_neto']),
+        }, index=df.index)
+        validas = ((productos['descripcion'] != '')
+                   & (productos['cantidad'] > 0)
+                   & (productos['cantidad'] % 1 == 0)
+                   & productos['precio_neto'].notna())
+        productos = productos[validas].astype({'cantidad': int})
+        productos['precio_total'] = productos['cantidad'] * productos['precio_neto']
+
+        # sqlite3 no acepta tipos de numpy: se pasan como objetos de Python
+        filas = productos.astype(object).where(productos.notna(), None)
+        with self.transaccion():
+            self.cursor.executemany('''
+            INSERT INTO Productos (concesion_id, cantidad, descripcion, isbn, pvp_unitario, precio_neto, precio_total)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', ((concesion_id, *fila) for fila in filas.itertuples(index=False, name=None)))
+        return len(productos), df[~validas]
 
     def obtener_productos_por_concesion(self, concesion_id):
-        self.cursor.execute('SELECT * FROM Productos WHERE concesion_id = ?', (concesion_id,))
-        column_names = [column[0] for column in self.cursor.description]
-        return [dict(zip(column_names, row)) for row in self.cursor.fetchall()]
+        column_names, rows = self._consultar('SELECT * FROM Productos WHERE concesion_id = ?', (concesion_id,))
+        return [dict(zip(column_names, row)) for row in rows]
 
     def actualizar_cantidad_vendida(self, producto_id, cantidad_vendida):
-        self.cursor.execute('UPDATE Productos SET cantidad_vendida = ? WHERE id = ?', 
-                        (cantidad_vendida, producto_id))
-        self.conn.commit()
+        with self.transaccion():
+            self.cursor.execute('UPDATE Productos SET cantidad_vendida = ? WHERE id = ?', 
+                            (cantidad_vendida, producto_id))
+
+    def obtener_de_catalogo(self, isbns):
+        """
+        Entradas del catalogo propio para los ISBN dados, como diccionario
+        isbn -> {'titulo', 'proveedor', 'ultimo_pvp'}. Los ISBN que nunca se
+        han recibido no aparecen.
+        """
+        entradas = {}
+        isbns = list(isbns)
+        for inicio in range(0, len(isbns), 500):
+            lote = isbns[inicio:inicio + 500]
+            _, filas = self._consultar(f'''
+                SELECT isbn, titulo, proveedor, ultimo_pvp FROM Catalogo
+                WHERE isbn IN ({','.join('?' * len(lote))})
+            ''', lote)
+            for isbn, titulo, proveedor, ultimo_pvp in filas:
+                entradas[isbn] = {'titulo': titulo, 'proveedor': proveedor, 'ultimo_pvp': ultimo_pvp}
+        return entradas
+
+    def buscar_en_catalogo(self, texto, limite=50):
+        """
+        Busca en el catalogo por palabras del titulo o del proveedor (sin
+        distinguir acentos ni mayusculas; 'algo*' busca por prefijo).
+        Devuelve diccionarios con isbn, titulo, proveedor y ultimo_pvp,
+        los mas relevantes primero.
+        """
+        # Cada palabra se busca como termino literal para que la puntuacion
+        # del usuario no se interprete como sintaxis de FTS5
+        terminos = ['"' + palabra.rstrip('*').replace('"', '""') + '"' + ('*' if palabra.endswith('*') else '')
+                    for palabra in texto.split() if palabra.rstrip('*')]
+        if not terminos:
+            return []
+        columnas, filas = self._consultar('''
+            SELECT c.isbn, c.titulo, c.proveedor, c.ultimo_pvp
+            FROM CatalogoBusqueda
+            JOIN Catalogo c ON c.id = CatalogoBusqueda.rowid
+            WHERE CatalogoBusqueda MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (' '.join(terminos), limite))
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def obtener_titulos_en_cache(self, isbns, ttl_negativo):
+        """
+        Titulos guardados en CacheTitulos para los ISBN dados, como diccionario
+        isbn -> titulo. Los resultados negativos aparecen con titulo None solo
+        si tienen menos de ttl_negativo segundos; los ISBN ausentes del
+        diccionario deben consultarse de nuevo.
+        """
+        limite = time.time() - ttl_negativo
+        titulos = {}
+        isbns = list(isbns)
+        # sqlite limita el numero de parametros por consulta
+        for inicio in range(0, len(isbns), 500):
+            lote = isbns[inicio:inicio + 500]
+            _, filas = self._consultar(f'''
+                SELECT isbn, titulo FROM CacheTitulos
+                WHERE isbn IN ({','.join('?' * len(lote))})
+                  AND (titulo IS NOT NULL OR fecha_consulta >= ?)
+            ''', (*lote, limite))
+            titulos.update(filas)
+        return titulos
+
+    def guardar_titulos_en_cache(self, resultados):
+        """
+        Guarda resultados de consultas externas: iterable de
+        (isbn, titulo o None, fuente). Reemplaza lo que hubiera para cada ISBN.
+        """
+        ahora = time.time()
+        with self.transaccion() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO CacheTitulos (isbn, titulo, fuente, fecha_consulta)
+                VALUES (?, ?, ?, ?)
+            ''', [(isbn, titulo, fuente, ahora) for isbn, titulo, fuente in resultados])
+
+    def obtener_extraccion_en_cache(self, sha256, parametros):
+        """
+        (tablas, filtros, paginas) guardados para el PDF y los parametros
+        dados, o None. Marca la entrada como usada para el desalojo LRU.
+        """
+        with self.transaccion() as conn:
+            fila = conn.execute('''
+                SELECT id, tablas, filtros, paginas FROM CacheExtracciones
+                WHERE sha256 = ? AND parametros = ?
+            ''', (sha256, parametros)).fetchone()
+            if not fila:
+                return None
+            conn.execute('UPDATE CacheExtracciones SET ultimo_uso = ? WHERE id = ?', (time.time(), fila[0]))
+        return fila[1], fila[2], fila[3]
+
+    def guardar_extraccion_en_cache(self, sha256, parametros, tablas, filtros=None, paginas=None,
+                                    limite_bytes=LIMITE_CACHE_EXTRACCIONES):
+        """
+        Guarda las tablas (bytes ya serializados), los filtros y las paginas
+        analizadas (texto; None si estan todas) de una extraccion y desaloja
+        las entradas menos usadas recientemente hasta que el total de tablas
+        quepa en limite_bytes.
+        """
+        with self.transaccion() as conn:
+            conn.execute('''
+                INSERT INTO CacheExtracciones (sha256, parametros, tablas, filtros, paginas, tamano, ultimo_uso)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sha256, parametros) DO UPDATE SET
+                    tablas = excluded.tablas,
+                    filtros = excluded.filtros,
+                    paginas = excluded.paginas,
+                    tamano = excluded.tamano,
+                    ultimo_uso = excluded.ultimo_uso
+            ''', (sha256, parametros, tablas, filtros, paginas, len(tablas), time.time()))
+            conn.execute('''
+                DELETE FROM CacheExtracciones WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, SUM(tamano) OVER (ORDER BY ultimo_uso DESC, id DESC) AS acumulado
+                        FROM CacheExtracciones
+                    ) WHERE acumulado > ?
+                )
+            ''', (limite_bytes,))
+
+    def guardar_filtros_en_cache(self, sha256, parametros, filtros):
+        """Actualiza los filtros de una extraccion guardada. Devuelve False si no esta en cache."""
+        with self.transaccion() as conn:
+            return conn.execute('''
+                UPDATE CacheExtracciones SET filtros = ?, ultimo_uso = ?
+                WHERE sha256 = ? AND parametros = ?
+            ''', (filtros, time.time(), sha256, parametros)).rowcount > 0
 
     def crear_reporte_pdf(self, concesion_id, nombre_archivo, contenido):
         """Almacena un reporte PDF en la base de datos"""
-        self.cursor.execute('''
-            INSERT INTO ReportesPDF (concesion_id, nombre_archivo, contenido)
-            VALUES (?, ?, ?)
-        ''', (concesion_id, nombre_archivo, contenido))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        with self.transaccion():
+            self.cursor.execute('''
+                INSERT INTO ReportesPDF (concesion_id, nombre_archivo, contenido)
+                VALUES (?, ?, ?)
+            ''', (concesion_id, nombre_archivo, contenido))
+            return self.cursor.lastrowid
     
+    def crear_reporte_pdf_desde_archivo(self, concesion_id, nombre_archivo, archivo_path):
+        """Almacena un reporte PDF copiándolo por bloques desde un archivo"""
+        tamano = os.path.getsize(archivo_path)
+        with self.transaccion(), open(archivo_path, 'rb') as f:
+            self.cursor.execute('''
+                INSERT INTO ReportesPDF (concesion_id, nombre_archivo, contenido)
+                VALUES (?, ?, zeroblob(?))
+            ''', (concesion_id, nombre_archivo, tamano))
+            reporte_id = self.cursor.lastrowid
+            self._escribir_blob('ReportesPDF', reporte_id, f)
+        return reporte_id
+
+    def exportar_reporte(self, reporte_id, destino):
+        """Escribe el contenido de un reporte en destino. Devuelve False si no existe."""
+        flujo = self._abrir_blob('ReportesPDF', "SELECT rowid, 'ninguna' FROM ReportesPDF WHERE id = ?",
+                                 (reporte_id,))
+        return self._exportar_blob(flujo, destino)
+
     def obtener_reportes_por_concesion(self, concesion_id):
         """Obtiene todos los reportes PDF de una concesión"""
-        self.cursor.execute('''
+        return self._consultar('''
             SELECT id, nombre_archivo, fecha_creacion 
             FROM ReportesPDF 
             WHERE concesion_id = ?
-        ''', (concesion_id,))
-        return self.cursor.fetchall()
+        ''', (concesion_id,))[1]
     
     def obtener_contenido_reporte(self, reporte_id):
         """Obtiene el contenido binario de un reporte"""
-        self.cursor.execute('''
-            SELECT contenido FROM ReportesPDF WHERE id = ?
-        ''', (reporte_id,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
-
-    def __del__(self):
-        self.conn.close()
\ No newline at end of file
+        rows = self._consultar('SELECT contenido FROM ReportesPDF WHERE id = ?', (reporte_id,))[1]
+        return rows[0][0] if rows else None
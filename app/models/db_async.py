@@ -0,0 +1,121 @@
+"""
+Fachada asincrona de ConcesionesDB para la interfaz.
+
+Las consultas se ejecutan en un QThreadPool y el resultado se entrega por
+señales en el hilo de la interfaz, asi que una lectura lenta (disco, BLOBs
+grandes) no congela las ventanas.
+
+    self.db_async = ConcesionesDBAsync(parent=self)
+    self.db_async.ejecutar('obtener_documentos', concesion_id,
+                           al_terminar=self.mostrar_documentos)
+"""
+import logging
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from app.models.database import ConcesionesDB
+
+logger = logging.getLogger(__name__)
+
+
+class _SenalesTarea(QObject):
+    terminado = pyqtSignal(object, object)  # tarea, resultado
+    fallido = pyqtSignal(object, object)  # tarea, excepcion
+
+
+class Tarea(QRunnable):
+    """Una llamada a la base pendiente de ejecutarse en el pool"""
+    def __init__(self, db, funcion, args, kwargs, al_terminar=None, al_fallar=None, clave=None):
+        super().__init__()
+        # La fachada conserva la referencia hasta entregar el resultado
+        self.setAutoDelete(False)
+        self.db = db
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.clave = clave
+        self.cancelada = False
+        self.senales = _SenalesTarea()
+
+    def cancelar(self):
+        """Descarta el resultado; la consulta termina pero no se llama a al_terminar"""
+        self.cancelada = True
+
+    def run(self):
+        try:
+            resultado = self.funcion(self.db, *self.args, **self.kwargs)
+        except Exception as e:
+            self.senales.fallido.emit(self, e)
+        else:
+            self.senales.terminado.emit(self, resultado)
+
+
+class ConcesionesDBAsync(QObject):
+    """
+    Ejecuta metodos de ConcesionesDB en segundo plano. Conviene crearla con la
+    ventana como parent: si la ventana se destruye, los resultados pendientes
+    se descartan en lugar de llegar a widgets que ya no existen.
+    """
+    def __init__(self, db=None, parent=None, max_hilos=2):
+        super().__init__(parent)
+        self.db = db if db is not None else ConcesionesDB()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_hilos)
+        self._pendientes = set()
+        self._ultima_por_clave = {}
+
+    def ejecutar(self, funcion, *args, al_terminar=None, al_fallar=None, clave=None, **kwargs):
+        """
+        Ejecuta funcion en el pool y llama a al_terminar(resultado) en el hilo
+        de la interfaz. funcion es el nombre de un metodo de ConcesionesDB o una
+        funcion que recibe la ConcesionesDB como primer argumento, util para
+        hacer varias consultas en una sola tarea.
+        :param al_fallar: Recibe la excepcion; si es None se registra con logging.
+        :param clave: Si se lanza otra tarea con la misma clave antes de que
+            esta termine, el resultado de esta se descarta (p. ej. al cambiar
+            rapido de concesion seleccionada).
+        Devuelve la Tarea, que puede cancelarse.
+        """
+        if isinstance(funcion, str):
+            funcion = getattr(ConcesionesDB, funcion)
+        tarea = Tarea(self.db, funcion, args, kwargs, al_terminar, al_fallar, clave)
+        tarea.senales.terminado.connect(self._entregar_resultado)
+        tarea.senales.fallido.connect(self._entregar_error)
+        if clave is not None:
+            self._ultima_por_clave[clave] = tarea
+        self._pendientes.add(tarea)
+        self.pool.start(tarea)
+        return tarea
+
+    def cancelar(self, clave):
+        """Descarta el resultado de la tarea pendiente con esa clave, si la hay"""
+        tarea = self._ultima_por_clave.get(clave)
+        if tarea is not None:
+            tarea.cancelar()
+
+    def esperar(self, milisegundos=-1):
+        """Bloquea hasta que terminen las tareas en curso. Devuelve False si se agota el tiempo."""
+        return self.pool.waitForDone(milisegundos)
+
+    def _vigente(self, tarea):
+        """Quita la tarea de las pendientes e indica si su resultado aun interesa"""
+        self._pendientes.discard(tarea)
+        if tarea.clave is not None:
+            if self._ultima_por_clave.get(tarea.clave) is not tarea:
+                return False
+            del self._ultima_por_clave[tarea.clave]
+        return not tarea.cancelada
+
+    def _entregar_resultado(self, tarea, resultado):
+        if self._vigente(tarea) and tarea.al_terminar is not None:
+            tarea.al_terminar(resultado)
+
+    def _entregar_error(self, tarea, error):
+        if not self._vigente(tarea):
+            return
+        if tarea.al_fallar is not None:
+            tarea.al_fallar(error)
+        else:
+            logger.error("Error en consulta a la base de datos (%s)",
+                         getattr(tarea.funcion, '__name__', tarea.funcion),
+                         exc_info=(type(error), error, error.__traceback__))
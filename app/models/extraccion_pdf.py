@@ -0,0 +1,288 @@
+"""
+Extracción de tablas de un PDF con camelot en varios procesos.
+
+El rango de páginas se reparte en lotes; cada lote es una llamada a
+camelot.read_pdf en un proceso del pool, así que las páginas se analizan en
+paralelo (camelot es CPU y no suelta el GIL). Las tablas se entregan por
+señales en el orden de las páginas pedidas a medida que terminan los lotes,
+de modo que la interfaz puede mostrar las primeras hojas mientras se
+procesan las demás. Pidiendo primero una página y luego sus vecinas
+(paginas_con_vecinas) se extrae solo lo que el usuario consulta.
+
+    extraccion = ExtraccionPaginas(ruta, range(1, contar_paginas(ruta) + 1), parent=self)
+    extraccion.tablas.connect(self.agregar_tablas)
+    extraccion.iniciar()
+
+CacheExtracciones guarda en la base las tablas ya extraídas, las páginas
+analizadas y los filtros del usuario por contenido del PDF, para que volver
+a abrir un documento no repita camelot (ni siquiera en las páginas que se
+alcanzaron a extraer en el modo por hoja).
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QObject, pyqtSignal
+from app.models.database import ConcesionesDB, TAMANO_BLOQUE
+
+# Páginas por llamada a camelot: lotes chicos reparten mejor el trabajo,
+# lotes grandes pagan menos veces la apertura del PDF en cada proceso
+TAM_LOTE = 2
+
+# Lo que la interfaz usa de una tabla de camelot; a diferencia de
+# camelot.core.Table se puede pasar entre procesos
+TablaExtraida = namedtuple('TablaExtraida', ['page', 'df'])
+
+# Páginas a cada lado de la seleccionada que se extraen por adelantado en
+# el modo por hoja
+PAGINAS_VECINAS = 2
+
+# Parámetros con los que se llama a camelot; forman parte de la clave de caché
+PARAMETROS_POR_DEFECTO = {'flavor': 'stream'}
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def _obtener_pool():
+    """Pool de procesos compartido por todas las extracciones del proceso"""
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def contar_paginas(ruta):
+    """Número de páginas del PDF, sin analizar su contenido"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(ruta) as pdf:
+            return len(pdf.pages)
+    return len(PdfReader(ruta).pages)
+
+
+def extraer_lote(ruta, paginas, flavor=PARAMETROS_POR_DEFECTO['flavor']):
+    """
+    Ejecuta camelot sobre las páginas indicadas. Corre en un proceso del
+    pool, por eso camelot se importa aquí y se devuelven TablaExtraida.
+    """
+    import camelot
+    tablas = camelot.read_pdf(ruta, flavor=flavor, pages=",".join(str(p) for p in paginas))
+    return [TablaExtraida(int(tabla.page), tabla.df) for tabla in tablas]
+
+
+def paginas_con_vecinas(pagina, total, vecinas=PAGINAS_VECINAS):
+    """
+    La página dada y sus vecinas dentro de 1..total, de la más cercana a la
+    más lejana (primero la siguiente, que es la que se suele consultar).
+    """
+    paginas = [pagina]
+    for distancia in range(1, vecinas + 1):
+        paginas.extend(p for p in (pagina + distancia, pagina - distancia) if 1 <= p <= total)
+    return paginas
+
+
+def insertar_por_pagina(tablas, nuevas):
+    """
+    Lista con las tablas de 'tablas' y 'nuevas' ordenadas por página; dentro
+    de una página conservan su orden y las ya existentes van primero.
+    Devuelve (lista, posiciones), donde posiciones[i] es la nueva posición de
+    tablas[i], para actualizar lo que se guarda por posición.
+    """
+    orden = sorted(range(len(tablas) + len(nuevas)),
+                   key=lambda i: (tablas[i] if i < len(tablas) else nuevas[i - len(tablas)]).page)
+    lista = [tablas[i] if i < len(tablas) else nuevas[i - len(tablas)] for i in orden]
+    posiciones = [0] * len(tablas)
+    for nueva, i in enumerate(orden):
+        if i < len(tablas):
+            posiciones[i] = nueva
+    return lista, posiciones
+
+
+def mascara_filas(total, inicio, fin, excluidas=()):
+    """
+    Arreglo booleano de 'total' filas: True en las filas inicio..fin-1 que
+    no están en excluidas (posiciones desde 0; las fuera de rango se ignoran).
+    """
+    mascara = np.zeros(total, dtype=bool)
+    mascara[inicio:fin] = True
+    excluidas = np.fromiter(excluidas, dtype=np.intp)
+    mascara[excluidas[(excluidas >= 0) & (excluidas < total)]] = False
+    return mascara
+
+
+def aplicar_filtros(df, filtros):
+    """
+    Filas y columnas de df que conservan los filtros de una tabla
+    ({'start_row', 'end_row', 'exclude_rows', 'selected_columns'}); sin
+    filtros devuelve df.
+    """
+    if not filtros:
+        return df
+    mascara = mascara_filas(len(df), filtros['start_row'], filtros['end_row'], filtros['exclude_rows'])
+    return df.iloc[mascara, filtros['selected_columns']]
+
+
+def huella_pdf(ruta):
+    """SHA-256 del contenido del archivo, leído por bloques"""
+    sha256 = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+
+def serializar_tablas(tablas):
+    """Lista de TablaExtraida como JSON comprimido (camelot solo produce texto)"""
+    datos = [{'page': tabla.page, 'columns': tabla.df.columns.tolist(),
+              'data': tabla.df.values.tolist()} for tabla in tablas]
+    return zlib.compress(json.dumps(datos, ensure_ascii=False).encode('utf-8'))
+
+
+def deserializar_tablas(datos):
+    return [TablaExtraida(t['page'], pd.DataFrame(t['data'], columns=t['columns']))
+            for t in json.loads(zlib.decompress(datos).decode('utf-8'))]
+
+
+class CacheExtracciones:
+    """
+    Tablas extraídas, filtros por tabla (posición en la lista de tablas ->
+    diccionario de filtros) y páginas analizadas guardados en la base. La
+    clave es el SHA-256 del PDF más los parámetros de extracción.
+    """
+    def __init__(self, db=None, parametros=None):
+        self.db = db if db is not None else ConcesionesDB()
+        self.parametros = json.dumps(parametros or PARAMETROS_POR_DEFECTO, sort_keys=True)
+
+    def obtener(self, sha256):
+        """
+        (tablas, filtros, paginas) de una extracción anterior, o None.
+        paginas es el conjunto de páginas analizadas, o None si son todas.
+        """
+        guardado = self.db.obtener_extraccion_en_cache(sha256, self.parametros)
+        if guardado is None:
+            return None
+        tablas, filtros, paginas = guardado
+        filtros = {int(indice): f for indice, f in json.loads(filtros).items()} if filtros else {}
+        paginas = set(json.loads(paginas)) if paginas is not None else None
+        return deserializar_tablas(tablas), filtros, paginas
+
+    def guardar(self, sha256, tablas, filtros, paginas=None):
+        """Guarda una extracción; paginas son las analizadas si no son todas"""
+        self.db.guardar_extraccion_en_cache(sha256, self.parametros, serializar_tablas(tablas),
+                                            json.dumps(filtros),
+                                            json.dumps(sorted(paginas)) if paginas is not None else None)
+
+    def guardar_filtros(self, sha256, filtros):
+        return self.db.guardar_filtros_en_cache(sha256, self.parametros, json.dumps(filtros))
+
+
+class ExtraccionPaginas(QObject):
+    """
+    Extrae las tablas de las páginas dadas en segundo plano.
+    Señales (se reciben en el hilo de la interfaz):
+      tablas(list): TablaExtraida de uno o más lotes ya terminados, en
+          el orden de 'paginas'; se emite varias veces durante la extracción.
+      analizadas(list): páginas cuyas tablas ya se entregaron, tengan o no
+          tablas; se emite después de cada 'tablas'.
+      progreso(int, int): páginas analizadas y total.
+      terminado(): se analizaron todas las páginas.
+      fallido(str): camelot falló; no se emite nada más.
+    :param funcion: funcion(ruta, paginas) que corre en el pool; debe poder
+        importarse desde otro proceso (por omisión extraer_lote).
+    """
+    tablas = pyqtSignal(list)
+    analizadas = pyqtSignal(list)
+    progreso = pyqtSignal(int, int)
+    terminado = pyqtSignal()
+    fallido = pyqtSignal(str)
+
+    def __init__(self, ruta, paginas, tam_lote=TAM_LOTE, funcion=extraer_lote, pool=None, parent=None):
+        super().__init__(parent)
+        self.ruta = ruta
+        self.paginas = list(paginas)
+        self.tam_lote = tam_lote
+        self.funcion = funcion
+        self.pool = pool
+        self._cancelado = threading.Event()
+        self._hilo = None
+        self._futuros = {}
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._ejecutar, name='extraccion-pdf', daemon=True)
+        self._hilo.start()
+
+    def cancelar(self):
+        """Descarta los lotes pendientes; los que ya corren terminan pero no se entregan"""
+        self._cancelado.set()
+        for futuro in list(self._futuros):
+            futuro.cancel()
+
+    def cancelada(self):
+        return self._cancelado.is_set()
+
+    def esperar(self, segundos=None):
+        """Bloquea hasta que el hilo coordinador termine. Devuelve False si se agota el tiempo."""
+        if self._hilo is not None:
+            self._hilo.join(segundos)
+            return not self._hilo.is_alive()
+        return True
+
+    def _ejecutar(self):
+        pool = self.pool or _obtener_pool()
+        lotes = [self.paginas[i:i + self.tam_lote] for i in range(0, len(self.paginas), self.tam_lote)]
+        futuros = self._futuros = {pool.submit(self.funcion, self.ruta, lote): n for n, lote in enumerate(lotes)}
+        if self._cancelado.is_set():
+            self.cancelar()  # Se canceló mientras se enviaban los lotes
+        terminados = {}
+        siguiente = 0
+        hechas = 0
+        try:
+            for futuro in as_completed(futuros):
+                if self._cancelado.is_set():
+                    return
+                n = futuros[futuro]
+                try:
+                    terminados[n] = futuro.result()
+                except Exception as e:
+                    self._emitir(self.fallido, str(e))
+                    self._cancelado.set()
+                    return
+                hechas += len(lotes[n])
+                # Solo se entregan lotes contiguos desde el primero para
+                # respetar el orden de las páginas
+                listas = []
+                paginas = []
+                while siguiente in terminados:
+                    listas.extend(terminados.pop(siguiente))
+                    paginas.extend(lotes[siguiente])
+                    siguiente += 1
+                if listas:
+                    self._emitir(self.tablas, listas)
+                if paginas:
+                    self._emitir(self.analizadas, paginas)
+                self._emitir(self.progreso, hechas, len(self.paginas))
+        finally:
+            for futuro in futuros:
+                futuro.cancel()
+        if not self._cancelado.is_set():
+            self._emitir(self.terminado)
+
+    def _emitir(self, senal, *args):
+        if self._cancelado.is_set():
+            return
+        try:
+            senal.emit(*args)
+        except RuntimeError:
+            # La ventana que recibía las tablas ya se destruyó
+            self._cancelado.set()
@@ -0,0 +1,154 @@
+"""
+Normalización y validación de ISBN por columnas completas.
+
+Los valores se pasan a una matriz de bytes de NumPy (una fila por valor)
+y la limpieza, el dígito de control y la conversión a ISBN-13 se hacen con
+operaciones sobre esa matriz, sin expresiones regulares ni bucles de
+Python por valor. Un mismo libro escrito como ISBN-10 o ISBN-13, con
+guiones o leído como número desde un CSV, queda siempre con el mismo
+ISBN-13.
+
+    df['isbn'] = isbn.normalizar(df['isbn'])  # ISBN-13 o None
+"""
+import numpy as np
+import pandas as pd
+
+_CERO = ord('0')
+_X = ord('X')
+_PESOS_10 = np.arange(10, 0, -1)
+_PESOS_13 = np.tile([1, 3], 7)[:13]
+
+
+def _como_texto(serie):
+    """Valores como lista de str; los nulos quedan '' y los float sin decimales"""
+    if pd.api.types.is_float_dtype(serie):
+        serie = serie.round().astype('Int64')
+    return serie.astype(object).where(serie.notna(), '').astype(str).tolist()
+
+
+def _matriz(valores):
+    """
+    Matriz uint8 (n, ancho) con los bytes de cada valor, rellena con ceros.
+    Los caracteres fuera de ASCII no pueden ser parte de un ISBN y se descartan.
+    """
+    try:
+        crudo = np.array(valores, dtype=bytes)
+    except UnicodeEncodeError:
+        crudo = np.array([v.encode('ascii', 'ignore') for v in valores], dtype=bytes)
+    ancho = max(crudo.dtype.itemsize, 1)
+    return crudo.view(np.uint8).reshape(len(valores), ancho) if len(valores) else np.zeros((0, ancho), np.uint8)
+
+
+def _limpiar_matriz(bytes_):
+    """
+    Deja solo dígitos y X (la x se pasa a mayúscula), recorridos a la
+    izquierda. Antes quita un '.0' final, el de los ISBN leídos como float.
+    Devuelve la matriz limpia y el largo de cada fila.
+    """
+    bytes_ = bytes_.copy()
+    filas = np.arange(len(bytes_))
+    largo = (bytes_ != 0).sum(axis=1)
+    con_decimal = ((largo >= 2)
+                   & (bytes_[filas, np.maximum(largo - 2, 0)] == ord('.'))
+                   & (bytes_[filas, np.maximum(largo - 1, 0)] == _CERO))
+    bytes_[filas[con_decimal], largo[con_decimal] - 1] = 0
+    bytes_[filas[con_decimal], largo[con_decimal] - 2] = 0
+    bytes_[bytes_ == ord('x')] = _X
+
+    conservar = ((bytes_ >= _CERO) & (bytes_ <= ord('9'))) | (bytes_ == _X)
+    largo = conservar.sum(axis=1)
+    # Las filas que ya son solo dígitos no se mueven; el resto se compacta
+    # copiando cada byte conservado a su posición final en la matriz plana
+    sucias = np.flatnonzero(((bytes_ != 0) & ~conservar).any(axis=1))
+    limpia = bytes_
+    if len(sucias):
+        ancho = bytes_.shape[1]
+        subconjunto = conservar[sucias]
+        posicion = np.cumsum(subconjunto, axis=1, dtype=np.int32) - 1
+        origen = np.flatnonzero(subconjunto)
+        destino = origen - origen % ancho + posicion.ravel()[origen]
+        compacta = np.zeros((len(sucias), ancho), dtype=np.uint8)
+        compacta.ravel()[destino] = bytes_[sucias].ravel()[origen]
+        limpia[sucias] = compacta
+    return limpia, largo
+
+
+def _a_series(bytes_, index):
+    """Convierte una matriz de bytes de vuelta a una Series de str"""
+    ancho = max(bytes_.shape[1], 1)
+    texto = np.ascontiguousarray(bytes_).view(f'S{ancho}').ravel().astype(f'U{ancho}')
+    return pd.Series(texto, index=index, dtype=object)
+
+
+def _validos(limpia, largo):
+    """True en las filas que son un ISBN-10 o ISBN-13 con dígito de control correcto"""
+    validos = np.zeros(len(limpia), dtype=bool)
+    if limpia.shape[1] < 10:
+        return validos
+    # Solo importan los primeros 13 bytes; el resto de la matriz no se convierte
+    digitos = limpia[:, :13].astype(np.int32) - _CERO
+    es_digito = (digitos >= 0) & (digitos <= 9)
+
+    if limpia.shape[1] >= 13:
+        filas = largo == 13
+        d13 = digitos[filas, :13]
+        validos[filas] = (es_digito[filas, :13].all(axis=1)
+                          & ((d13 * _PESOS_13).sum(axis=1) % 10 == 0))
+
+    filas = largo == 10
+    d10 = digitos[filas, :10].copy()
+    ultimo_x = limpia[filas, 9] == _X
+    d10[ultimo_x, 9] = 10
+    validos[filas] = (es_digito[filas, :9].all(axis=1)
+                      & (es_digito[filas, 9] | ultimo_x)
+                      & ((d10 * _PESOS_10).sum(axis=1) % 11 == 0))
+    return validos
+
+
+def _isbn13(limpia, largo, validos):
+    """Matriz (n, 13) con el ISBN-13 de cada fila válida (ceros en las demás)"""
+    resultado = np.zeros((len(limpia), 13), dtype=np.uint8)
+    if not validos.any():
+        return resultado
+    filas_13 = validos & (largo == 13)
+    resultado[filas_13] = limpia[filas_13, :13]
+
+    filas_10 = validos & (largo == 10)
+    if filas_10.any():
+        cuerpo = np.empty((filas_10.sum(), 12), dtype=np.uint8)
+        cuerpo[:, :3] = np.frombuffer(b'978', dtype=np.uint8)
+        cuerpo[:, 3:] = limpia[filas_10, :9]
+        control = (10 - ((cuerpo.astype(np.int64) - _CERO) * _PESOS_13[:12]).sum(axis=1) % 10) % 10
+        resultado[filas_10, :12] = cuerpo
+        resultado[filas_10, 12] = control + _CERO
+    return resultado
+
+
+def limpiar(serie):
+    """
+    Deja solo dígitos y X en cada valor. Los números leídos como float
+    (9780134685991.0) se escriben sin decimales y los nulos quedan ''.
+    """
+    limpia, _ = _limpiar_matriz(_matriz(_como_texto(serie)))
+    return _a_series(limpia, serie.index)
+
+
+def es_valido(serie):
+    """True donde el valor es un ISBN-10 o ISBN-13 con dígito de control correcto"""
+    limpia, largo = _limpiar_matriz(_matriz(_como_texto(serie)))
+    return pd.Series(_validos(limpia, largo), index=serie.index)
+
+
+def normalizar(serie, conservar_invalidos=False):
+    """
+    Limpia, valida y convierte a ISBN-13 en un solo paso: los ISBN-10 se
+    prefijan con 978 y se recalcula su dígito de control.
+    :param conservar_invalidos: Si es True, los valores que no son un ISBN
+        válido quedan limpios (como con limpiar) en lugar de None.
+    """
+    limpia, largo = _limpiar_matriz(_matriz(_como_texto(serie)))
+    validos = _validos(limpia, largo)
+    resultado = _a_series(_isbn13(limpia, largo, validos), serie.index)
+    if conservar_invalidos:
+        return resultado.where(validos, _a_series(limpia, serie.index))
+    return resultado.where(validos, None)
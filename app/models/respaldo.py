@@ -0,0 +1,192 @@
+"""
+Respaldos en caliente de la base de concesiones con la API de backup de SQLite.
+
+La copia se hace por lotes de paginas desde una conexion propia, asi que la
+aplicacion puede seguir leyendo y escribiendo mientras tanto, y el resultado
+es siempre una base consistente (a diferencia de copiar el archivo).
+
+Con WAL la copia es la instantanea del momento en que empezo. Con el diario
+rollback (perfil 'clasico') una lectura abierta impediria escribir, asi que
+la copia suelta la base entre pasos; si alguien escribe, SQLite reinicia la
+copia y esta refleja el estado al terminar.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Paginas que se copian por paso; entre pasos se informa el progreso
+PAGINAS_POR_PASO = 1024
+
+# Segundos de pausa entre pasos sin WAL, para que quien escribe tome el lock
+PAUSA_ENTRE_PASOS = 0.005
+
+# Bytes que se leen por vez al comprimir
+TAMANO_BLOQUE_COMPRESION = 1024 * 1024
+
+EXTENSION_COMPRIMIDA = '.zip'
+
+
+class RespaldoCancelado(Exception):
+    """Se lanza cuando el respaldo se cancela antes de terminar"""
+
+
+def respaldar(db_name, destino, comprimir=False, progreso=None, cancelado=None,
+              paginas_por_paso=PAGINAS_POR_PASO, pausa=PAUSA_ENTRE_PASOS):
+    """
+    Copia la base db_name en destino sin detener a quien escribe en ella.
+    :param comprimir: Si es True, destino es un archivo .zip con la base dentro.
+    :param progreso: Funcion progreso(fase, hechos, total) llamada tras cada paso;
+        fase es 'copiando' (paginas) o 'comprimiendo' (bytes).
+    :param cancelado: Funcion sin argumentos; si devuelve True se aborta con RespaldoCancelado.
+    :param pausa: Segundos de espera entre pasos cuando la base no usa WAL.
+    El archivo destino solo aparece cuando el respaldo termina completo.
+    Devuelve destino.
+    """
+    parcial = destino + '.parcial'
+    copia_path = parcial + '.db' if comprimir else parcial
+    origen = sqlite3.connect(db_name)
+    copia = sqlite3.connect(copia_path)
+    try:
+        wal = origen.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        if wal:
+            # Mantener abierta una transaccion de lectura fija la instantanea de
+            # todos los pasos: con WAL las escrituras continuan y la copia no se
+            # reinicia. Sin WAL esa lectura bloquearia a quien escribe todo el respaldo.
+            origen.execute('BEGIN')
+            origen.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+
+        def avance(estado, restantes, total):
+            if cancelado is not None and cancelado():
+                raise RespaldoCancelado()
+            if progreso is not None:
+                progreso('copiando', total - restantes, total)
+            if not wal and pausa:
+                time.sleep(pausa)
+
+        origen.backup(copia, pages=paginas_por_paso, progress=avance)
+        if wal:
+            origen.rollback()
+        # El respaldo debe ser un solo archivo, sin -wal
+        copia.execute('PRAGMA journal_mode = DELETE')
+        copia.close()
+        origen.close()
+
+        if comprimir:
+            _comprimir(copia_path, parcial, os.path.basename(db_name), progreso, cancelado)
+            os.remove(copia_path)
+        os.replace(parcial, destino)
+    except BaseException:
+        copia.close()
+        origen.close()
+        for path in {parcial, copia_path}:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return destino
+
+
+def _comprimir(origen, destino, nombre, progreso=None, cancelado=None):
+    """Escribe el archivo origen dentro de un zip destino con el nombre indicado"""
+    total = os.path.getsize(origen)
+    hechos = 0
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as archivo_zip, \
+            archivo_zip.open(nombre, 'w', force_zip64=True) as salida, \
+            open(origen, 'rb') as entrada:
+        for bloque in iter(lambda: entrada.read(TAMANO_BLOQUE_COMPRESION), b''):
+            if cancelado is not None and cancelado():
+                raise RespaldoCancelado()
+            salida.write(bloque)
+            hechos += len(bloque)
+            if progreso is not None:
+                progreso('comprimiendo', hechos, total)
+
+
+def nombre_respaldo(db_name, comprimir=False, fecha=None):
+    """Nombre con fecha y hora para un respaldo de db_name, p. ej. concesiones_20250131_235900.db"""
+    base = os.path.splitext(os.path.basename(db_name))[0]
+    nombre = f"{base}_{(fecha or datetime.now()):%Y%m%d_%H%M%S}.db"
+    return nombre + EXTENSION_COMPRIMIDA if comprimir else nombre
+
+
+def listar_respaldos(directorio, db_name):
+    """Rutas de los respaldos de db_name en directorio, del mas antiguo al mas reciente"""
+    if not os.path.isdir(directorio):
+        return []
+    prefijo = os.path.splitext(os.path.basename(db_name))[0] + '_'
+    nombres = [nombre for nombre in os.listdir(directorio)
+               if nombre.startswith(prefijo) and nombre.endswith(('.db', '.db' + EXTENSION_COMPRIMIDA))]
+    # La fecha va en el nombre, asi que el orden alfabetico es el cronologico
+    return [os.path.join(directorio, nombre) for nombre in sorted(nombres)]
+
+
+def rotar_respaldos(directorio, db_name, conservar):
+    """Borra los respaldos mas antiguos y deja solo los 'conservar' mas recientes"""
+    respaldos = listar_respaldos(directorio, db_name)
+    eliminados = respaldos[:-conservar] if conservar > 0 else respaldos
+    for path in eliminados:
+        os.remove(path)
+    return eliminados
+
+
+class ProgramadorRespaldos:
+    """
+    Hace respaldos periodicos de una base en un hilo de fondo y conserva
+    solo los mas recientes. Si al iniciar el ultimo respaldo ya es mas viejo
+    que el intervalo, el primero se hace de inmediato.
+    """
+    def __init__(self, db_name, directorio, intervalo=24 * 3600, conservar=7, comprimir=True):
+        self.db_name = db_name
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.conservar = conservar
+        self.comprimir = comprimir
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def respaldar_ahora(self):
+        """Hace un respaldo y rota los anteriores. Devuelve la ruta del nuevo respaldo."""
+        os.makedirs(self.directorio, exist_ok=True)
+        destino = os.path.join(self.directorio, nombre_respaldo(self.db_name, self.comprimir))
+        respaldar(self.db_name, destino, comprimir=self.comprimir, cancelado=self._detener.is_set)
+        rotar_respaldos(self.directorio, self.db_name, self.conservar)
+        return destino
+
+    def segundos_para_el_siguiente(self):
+        respaldos = listar_respaldos(self.directorio, self.db_name)
+        if not respaldos:
+            return 0
+        antiguedad = time.time() - os.path.getmtime(respaldos[-1])
+        return max(0, self.intervalo - antiguedad)
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+
+        def ejecutar():
+            while not self._detener.wait(self.segundos_para_el_siguiente()):
+                try:
+                    self.respaldar_ahora()
+                except RespaldoCancelado:
+                    break
+                except (sqlite3.Error, OSError):
+                    logger.error("No se pudo hacer el respaldo programado de %s", self.db_name, exc_info=True)
+                    # Reintentar en el siguiente intervalo en lugar de de inmediato
+                    if self._detener.wait(self.intervalo):
+                        break
+
+        self._hilo = threading.Thread(target=ejecutar, name='respaldos-programados', daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo; un respaldo en curso se cancela y no deja archivos a medias"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
@@ -0,0 +1,150 @@
+"""
+Resolución de ISBN a título con caché persistente.
+
+Primero se busca en el catálogo propio (los productos que ya se han recibido)
+y después en la tabla CacheTitulos, así que solo los ISBN nunca vistos (o
+cuyo resultado negativo caducó) salen a la red. Las
+consultas externas comparten una requests.Session (conexiones reutilizadas),
+corren en un número acotado de hilos, respetan un límite de peticiones por
+segundo y tienen tiempo máximo de espera.
+
+    resolvedor = ResolvedorTitulos(db)
+    titulos = resolvedor.resolver(['9780134685991', ...])  # isbn -> titulo o None
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from app.models.database import ConcesionesDB
+
+URL_GOOGLE_BOOKS = "https://www.googleapis.com/books/v1/volumes"
+URL_OPEN_LIBRARY = "https://openlibrary.org/api/books"
+# Un ISBN que ningún servicio conoce se vuelve a consultar pasada una semana
+TTL_NEGATIVO = 7 * 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def titulo_google_books(sesion, isbn, timeout, url=URL_GOOGLE_BOOKS):
+    """Título según Google Books, None si no lo conoce. Los errores de red se propagan."""
+    respuesta = sesion.get(url, params={'q': f'isbn:{isbn}'}, timeout=timeout)
+    respuesta.raise_for_status()
+    items = respuesta.json().get("items") or []
+    return items[0].get("volumeInfo", {}).get("title") if items else None
+
+
+def titulo_open_library(sesion, isbn, timeout, url=URL_OPEN_LIBRARY):
+    """Título según Open Library, None si no lo conoce. Los errores de red se propagan."""
+    respuesta = sesion.get(url, params={'bibkeys': f'ISBN:{isbn}', 'format': 'json'}, timeout=timeout)
+    respuesta.raise_for_status()
+    return respuesta.json().get(f"ISBN:{isbn}", {}).get("title")
+
+
+class _LimiteTasa:
+    """Espacia el inicio de las peticiones para no pasar de 'por_segundo'"""
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0.0
+        self.lock = threading.Lock()
+        self.siguiente = 0.0
+
+    def esperar(self):
+        with self.lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self.siguiente)
+            self.siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class ResolvedorTitulos:
+    """
+    Resuelve ISBN a títulos: primero el catálogo propio y la caché de la
+    base y después, en paralelo, las fuentes externas en orden hasta que
+    alguna conozca el ISBN.
+    :param fuentes: Lista de (nombre, funcion(sesion, isbn, timeout)); por
+        omisión Google Books y luego Open Library.
+    :param max_concurrentes: Consultas externas simultáneas.
+    :param por_segundo: Peticiones HTTP por segundo como máximo (0 sin límite).
+    :param timeout: Segundos de espera por petición.
+    :param ttl_negativo: Segundos que se recuerda que un ISBN no se encontró.
+    """
+    def __init__(self, db=None, fuentes=None, max_concurrentes=4, por_segundo=5,
+                 timeout=5, ttl_negativo=TTL_NEGATIVO):
+        self.db = db if db is not None else ConcesionesDB()
+        self.fuentes = fuentes if fuentes is not None else [
+            ('google_books', titulo_google_books),
+            ('open_library', titulo_open_library),
+        ]
+        self.max_concurrentes = max_concurrentes
+        self.timeout = timeout
+        self.ttl_negativo = ttl_negativo
+        self.limite = _LimiteTasa(por_segundo)
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=len(self.fuentes) or 1, pool_maxsize=max_concurrentes)
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+        self._cancelado = threading.Event()
+
+    def cancelar(self):
+        """Las consultas externas que aún no empiezan se omiten"""
+        self._cancelado.set()
+
+    def cerrar(self):
+        self.sesion.close()
+
+    def resolver(self, isbns, progreso=None):
+        """
+        Devuelve un diccionario isbn -> título (None si no se encontró o la
+        consulta falló). Los resultados de la red se guardan en la caché;
+        un fallo de red no se guarda, para reintentarse la próxima vez.
+        :param progreso: funcion(hechos, total) llamada en el hilo que ejecuta
+            resolver después de cada ISBN consultado en la red.
+        """
+        self._cancelado.clear()
+        pendientes = list(dict.fromkeys(isbn for isbn in isbns if isbn))
+        titulos = {isbn: entrada['titulo'] for isbn, entrada in self.db.obtener_de_catalogo(pendientes).items()}
+        pendientes = [isbn for isbn in pendientes if isbn not in titulos]
+        titulos.update(self.db.obtener_titulos_en_cache(pendientes, self.ttl_negativo))
+        pendientes = [isbn for isbn in pendientes if isbn not in titulos]
+        if not pendientes:
+            return titulos
+
+        consultados = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrentes) as pool:
+            futuros = {pool.submit(self._consultar, isbn): isbn for isbn in pendientes}
+            for hechos, futuro in enumerate(as_completed(futuros), start=1):
+                isbn = futuros[futuro]
+                resultado = futuro.result()
+                if resultado is not None:
+                    titulo, fuente = resultado
+                    titulos[isbn] = titulo
+                    consultados.append((isbn, titulo, fuente))
+                else:
+                    titulos[isbn] = None
+                if progreso is not None:
+                    progreso(hechos, len(pendientes))
+        if consultados:
+            self.db.guardar_titulos_en_cache(consultados)
+        return titulos
+
+    def _consultar(self, isbn):
+        """
+        (titulo, fuente) si alguna fuente conoce el ISBN; (None, None) si todas
+        respondieron que no; None si hubo errores o se canceló (no se guarda).
+        """
+        hubo_error = False
+        for nombre, funcion in self.fuentes:
+            if self._cancelado.is_set():
+                return None
+            self.limite.esperar()
+            try:
+                titulo = funcion(self.sesion, isbn, self.timeout)
+            except (requests.RequestException, ValueError) as e:
+                logger.warning("Error al buscar título para ISBN %s en %s: %s", isbn, nombre, e)
+                hubo_error = True
+                continue
+            if titulo:
+                return titulo, nombre
+        return None if hubo_error else (None, None)
@@ -0,0 +1,172 @@
+import logging
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter, QPen
+from app.models.db_async import ConcesionesDBAsync
+
+# Filas que se leen de la base en cada fetchMore
+TAM_LOTE = 200
+
+# Colores de la etiqueta de estado (los mismos que usaba ConcesionItem)
+COLORES_ESTADO = {
+    "Valido": "#4CAF50",
+    "Vence pronto": "#FFC107",
+    "Vencida": "#F44336",
+    "Pendiente": "#999999"
+}
+
+logger = logging.getLogger(__name__)
+
+
+class ConcesionesListModel(QAbstractListModel):
+    """
+    Modelo de la lista de concesiones. Solo guarda las filas ya leídas y
+    pide las siguientes por lotes cuando la vista llega al final
+    (canFetchMore/fetchMore), así que abrir la lista cuesta lo mismo con
+    cien concesiones que con cincuenta mil. Los lotes siguientes se leen con
+    db_async en segundo plano, uno a la vez, y las filas se agregan cuando
+    llega el resultado.
+
+    Qt.DisplayRole es el nombre del emisor, Qt.UserRole el id de la concesión
+    y ConcesionRole el diccionario completo de obtener_lista_concesiones.
+    """
+    ConcesionRole = Qt.UserRole + 1
+
+    def __init__(self, db, estado=None, tam_lote=TAM_LOTE, db_async=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.db_async = db_async if db_async is not None else ConcesionesDBAsync(db, self)
+        self.estado = estado
+        self.tam_lote = tam_lote
+        self._concesiones = []
+        self._total = 0
+        self._tarea_lote = None  # Lectura de lote en curso; solo hay una a la vez
+
+    def leer_primer_lote(self, db=None):
+        """
+        Lee el total y el primer lote sin tocar el modelo, para poder hacerlo
+        en segundo plano. El resultado se aplica con establecer().
+        """
+        db = db or self.db
+        return (db.contar_concesiones(self.estado),
+                db.obtener_lista_concesiones(self.estado, self.tam_lote, 0))
+
+    def establecer(self, lote):
+        """Reemplaza el contenido del modelo con el resultado de leer_primer_lote"""
+        # Un lote pedido antes de recargar ya no corresponde a estas filas
+        if self._tarea_lote is not None:
+            self._tarea_lote.cancelar()
+            self._tarea_lote = None
+        self.beginResetModel()
+        self._total, self._concesiones = lote[0], list(lote[1])
+        self.endResetModel()
+
+    def recargar(self):
+        self.establecer(self.leer_primer_lote())
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._concesiones)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and len(self._concesiones) < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent) or self._tarea_lote is not None:
+            return
+        self._tarea_lote = self.db_async.ejecutar(
+            'obtener_lista_concesiones', self.estado, self.tam_lote, len(self._concesiones),
+            al_terminar=self._agregar_lote, al_fallar=self._lote_fallido)
+
+    def _lote_fallido(self, error):
+        self._tarea_lote = None
+        logger.error("No se pudo leer el siguiente lote de concesiones: %s", error)
+
+    def _agregar_lote(self, lote):
+        self._tarea_lote = None
+        if not lote:
+            # Se borraron concesiones desde la última recarga
+            self._total = len(self._concesiones)
+            return
+        inicio = len(self._concesiones)
+        self.beginInsertRows(QModelIndex(), inicio, inicio + len(lote) - 1)
+        self._concesiones.extend(lote)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._concesiones):
+            return None
+        concesion = self._concesiones[index.row()]
+        if role == Qt.DisplayRole:
+            return concesion['nombre_emisor'] or "Desconocido"
+        if role == Qt.UserRole:
+            return concesion['id']
+        if role == self.ConcesionRole:
+            return concesion
+        return None
+
+    def fila_de(self, concesion_id):
+        """Fila de una concesión entre las ya leídas, o -1"""
+        for fila, concesion in enumerate(self._concesiones):
+            if concesion['id'] == concesion_id:
+                return fila
+        return -1
+
+
+class ConcesionDelegate(QStyledItemDelegate):
+    """
+    Dibuja cada concesión como lo hacía ConcesionItem: emisor a la izquierda,
+    folio al centro y el estado en una etiqueta de color a la derecha, pero
+    sin crear un widget por fila.
+    """
+    ALTO = 60
+    ANCHO_EMISOR = 150
+
+    def paint(self, painter, option, index):
+        concesion = index.data(ConcesionesListModel.ConcesionRole)
+        if concesion is None:
+            return super().paint(painter, option, index)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = option.rect
+
+        # Fondo según selección y hover
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, QColor("#13678A"))
+        elif option.state & QStyle.State_MouseOver:
+            painter.fillRect(rect, QColor("#4F8FAA"))
+        painter.setPen(QPen(QColor("#dddddd")))
+        painter.drawLine(rect.bottomLeft(), rect.bottomRight())
+
+        contenido = rect.adjusted(10, 0, -10, 0)
+        painter.setPen(Qt.white)
+
+        # Emisor en negrita a la izquierda
+        fuente_emisor = QFont(option.font)
+        fuente_emisor.setBold(True)
+        painter.setFont(fuente_emisor)
+        rect_emisor = QRect(contenido.left(), contenido.top(), self.ANCHO_EMISOR, contenido.height())
+        emisor = QFontMetrics(fuente_emisor).elidedText(
+            index.data(Qt.DisplayRole), Qt.ElideRight, self.ANCHO_EMISOR)
+        painter.drawText(rect_emisor, Qt.AlignLeft | Qt.AlignVCenter, emisor)
+
+        # Folio al centro
+        painter.setFont(option.font)
+        painter.drawText(contenido, Qt.AlignHCenter | Qt.AlignVCenter, f"Folio: {concesion['folio']}")
+
+        # Estado en una etiqueta redondeada a la derecha
+        status = concesion['status']
+        metricas = QFontMetrics(option.font)
+        ancho = metricas.horizontalAdvance(status) + 16
+        alto = metricas.height() + 8
+        rect_status = QRect(contenido.right() - ancho, contenido.center().y() - alto // 2, ancho, alto)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(COLORES_ESTADO.get(status, "#999999")))
+        painter.drawRoundedRect(rect_status, 4, 4)
+        painter.setPen(Qt.white)
+        painter.drawText(rect_status, Qt.AlignCenter, status)
+
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(0, self.ALTO)
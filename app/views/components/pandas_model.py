@@ -0,0 +1,222 @@
+"""
+Modelo de tabla sobre un DataFrame de pandas para las vistas de la aplicación.
+
+En lugar de crear un QTableWidgetItem por celda, la vista pide a
+PandasTableModel solo las celdas visibles y estas se leen directamente de
+las columnas del DataFrame, así que mostrar miles de filas es inmediato.
+El orden y el filtro se hacen con DataFrameProxyModel.
+
+    self.tabla = TablaDataFrame()
+    self.tabla.mostrar(df, formatos={'precio': lambda v: f"${v:.2f}"})
+"""
+import numpy as np
+import pandas as pd
+from PyQt5.QtWidgets import QTableView, QAbstractItemView
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+
+
+class PandasTableModel(QAbstractTableModel):
+    """
+    Muestra un DataFrame sin copiarlo. Qt.DisplayRole es el texto de la
+    celda (con formatos[columna] si se indicó) y Qt.UserRole el valor
+    original. Las columnas numéricas se alinean a la derecha.
+    :param colores: Diccionario columna -> funcion(valor) que devuelve el
+        QColor de fondo de la celda o None.
+    """
+    def __init__(self, df=None, formatos=None, colores=None, parent=None):
+        super().__init__(parent)
+        self._df = None
+        self._columnas = []
+        self._numericas = []
+        self._formatos = []
+        self._colores = []
+        self.establecer_dataframe(df, formatos, colores)
+
+    def establecer_dataframe(self, df, formatos=None, colores=None):
+        """
+        Cambia el DataFrame mostrado. Si las columnas no cambian, solo se
+        reemplazan las filas y la vista conserva anchos y orden de columnas.
+        """
+        misma_estructura = (self._df is not None and df is not None
+                            and list(self._df.columns) == list(df.columns))
+        if misma_estructura:
+            if self.rowCount():
+                self.beginRemoveRows(QModelIndex(), 0, self.rowCount() - 1)
+                self._asignar(None, formatos, colores, conservar_columnas=True)
+                self.endRemoveRows()
+            if len(df):
+                self.beginInsertRows(QModelIndex(), 0, len(df) - 1)
+                self._asignar(df, formatos, colores)
+                self.endInsertRows()
+            else:
+                self._asignar(df, formatos, colores)
+        else:
+            self.beginResetModel()
+            self._asignar(df, formatos, colores)
+            self.endResetModel()
+
+    def _asignar(self, df, formatos, colores, conservar_columnas=False):
+        if df is None:
+            if conservar_columnas:
+                self._df = self._df.iloc[0:0]
+                self._columnas = [columna[:0] for columna in self._columnas]
+                return
+            self._df, self._columnas, self._numericas = None, [], []
+            self._formatos, self._colores = [], []
+            return
+        formatos = formatos or {}
+        colores = colores or {}
+        self._df = df
+        # to_numpy de una sola columna no copia los datos
+        self._columnas = [df.iloc[:, j].to_numpy() for j in range(df.shape[1])]
+        self._numericas = [pd.api.types.is_numeric_dtype(df.dtypes.iloc[j]) for j in range(df.shape[1])]
+        self._formatos = [formatos.get(columna) for columna in df.columns]
+        self._colores = [colores.get(columna) for columna in df.columns]
+
+    def dataframe(self):
+        """El DataFrame mostrado (el mismo objeto, no una copia), o None"""
+        return self._df
+
+    def columna(self, j):
+        """Valores de la columna j como arreglo de numpy"""
+        return self._columnas[j]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self._df is None:
+            return 0
+        return len(self._df)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columnas)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        fila, col = index.row(), index.column()
+        valor = self._columnas[col][fila]
+        if role == Qt.DisplayRole:
+            if _es_nulo(valor):
+                return ""
+            formato = self._formatos[col]
+            return formato(valor) if formato is not None else str(valor)
+        if role == Qt.UserRole:
+            return None if _es_nulo(valor) else _a_python(valor)
+        if role == Qt.TextAlignmentRole and self._numericas[col]:
+            return Qt.AlignRight | Qt.AlignVCenter
+        if role == Qt.BackgroundRole and self._colores[col] is not None:
+            return self._colores[col](valor)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or self._df is None:
+            return None
+        if orientation == Qt.Vertical:
+            return str(section + 1)
+        columna = self._df.columns[section]
+        if isinstance(columna, (int, np.integer)):
+            # Tablas sin encabezados (p. ej. las de camelot): numerar desde 1
+            return str(columna + 1)
+        return str(columna)
+
+
+class DataFrameProxyModel(QSortFilterProxyModel):
+    """
+    Ordena y filtra un PandasTableModel. El orden y el filtro se calculan
+    con pandas sobre la columna completa y el proxy solo consulta arreglos
+    ya hechos, en lugar de comparar textos celda por celda.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rango = None
+        self._mascara = None
+
+    def setSourceModel(self, modelo):
+        super().setSourceModel(modelo)
+        # El orden y el filtro precalculados dejan de valer si cambian las filas
+        modelo.modelAboutToBeReset.connect(self._olvidar_filas)
+        modelo.rowsAboutToBeRemoved.connect(self._olvidar_filas)
+        modelo.rowsAboutToBeInserted.connect(self._olvidar_filas)
+
+    def _olvidar_filas(self, *args):
+        self._rango = None
+        self._mascara = None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        modelo = self.sourceModel()
+        if column >= 0 and modelo is not None and modelo.dataframe() is not None:
+            serie = pd.Series(modelo.columna(column))
+            numerica = pd.to_numeric(serie, errors='coerce')
+            # Columnas de texto con números (comunes en CSV) se ordenan como números
+            if numerica.notna().sum() >= serie.notna().sum():
+                serie = numerica
+            else:
+                serie = serie.astype(str)
+            self._rango = serie.rank(method='first', na_option='bottom').to_numpy()
+        super().sort(column, order)
+
+    def lessThan(self, izquierda, derecha):
+        if self._rango is None:
+            return super().lessThan(izquierda, derecha)
+        return bool(self._rango[izquierda.row()] < self._rango[derecha.row()])
+
+    def establecer_mascara(self, mascara):
+        """Muestra solo las filas donde mascara (arreglo booleano) es True; None muestra todas"""
+        self._mascara = None if mascara is None else np.asarray(mascara, dtype=bool)
+        self.invalidateFilter()
+
+    def filtrar_texto(self, texto, columnas=None):
+        """Muestra las filas en las que alguna columna contiene texto (sin distinguir mayúsculas)"""
+        df = self.sourceModel().dataframe() if self.sourceModel() is not None else None
+        if not texto or df is None:
+            self.establecer_mascara(None)
+            return
+        columnas = columnas if columnas is not None else range(df.shape[1])
+        mascara = np.zeros(len(df), dtype=bool)
+        for j in columnas:
+            mascara |= df.iloc[:, j].astype(str).str.contains(texto, case=False, regex=False).to_numpy()
+        self.establecer_mascara(mascara)
+
+    def filterAcceptsRow(self, fila, padre):
+        if self._mascara is None or fila >= len(self._mascara):
+            return True
+        return bool(self._mascara[fila])
+
+
+class TablaDataFrame(QTableView):
+    """QTableView de solo lectura con su PandasTableModel y su proxy ya conectados"""
+    def __init__(self, df=None, ordenable=True, parent=None):
+        super().__init__(parent)
+        self.modelo = PandasTableModel(parent=self)
+        self.proxy = DataFrameProxyModel(self)
+        self.proxy.setSourceModel(self.modelo)
+        self.setModel(self.proxy)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSortingEnabled(ordenable)
+        # Sin orden hasta que el usuario haga clic en un encabezado
+        self.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        if df is not None:
+            self.mostrar(df)
+
+    def mostrar(self, df, formatos=None, colores=None):
+        self.modelo.establecer_dataframe(df, formatos, colores)
+        if self.isSortingEnabled():
+            # Reaplicar el orden elegido por el usuario a los datos nuevos
+            self.proxy.sort(self.horizontalHeader().sortIndicatorSection(),
+                            self.horizontalHeader().sortIndicatorOrder())
+
+    def dataframe(self):
+        return self.modelo.dataframe()
+
+    def filas(self):
+        """Número de filas visibles (después del filtro)"""
+        return self.proxy.rowCount()
+
+
+def _es_nulo(valor):
+    return (valor is None or valor is pd.NA or valor is pd.NaT
+            or (isinstance(valor, (float, np.floating)) and valor != valor))
+
+
+def _a_python(valor):
+    """Convierte escalares de numpy a tipos de Python para que Qt los acepte"""
+    return valor.item() if isinstance(valor, np.generic) else valor
@@ -0,0 +1,68 @@
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtWidgets import QProgressDialog, QMessageBox
+from app.models.respaldo import respaldar, RespaldoCancelado
+
+
+class HiloRespaldo(QThread):
+    """Ejecuta respaldar() fuera del hilo de la interfaz y avisa su avance con señales"""
+    progreso = pyqtSignal(str, int, int)  # fase, hechos, total
+    terminado = pyqtSignal(str)
+    fallido = pyqtSignal(str)
+
+    def __init__(self, db_name, destino, comprimir=False, parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+        self.destino = destino
+        self.comprimir = comprimir
+        self.cancelar = False
+
+    def run(self):
+        try:
+            respaldar(self.db_name, self.destino, comprimir=self.comprimir,
+                      progreso=self.progreso.emit, cancelado=lambda: self.cancelar)
+        except RespaldoCancelado:
+            self.fallido.emit("Exportación cancelada.")
+        except Exception as e:
+            self.fallido.emit(str(e))
+        else:
+            self.terminado.emit(self.destino)
+
+
+class RespaldoDialog(QProgressDialog):
+    """Muestra el avance de la exportación de la base de datos y permite cancelarla"""
+    def __init__(self, db_name, destino, comprimir=False, parent=None):
+        super().__init__("Preparando exportación...", "Cancelar", 0, 100, parent)
+        self.setWindowTitle("Exportar Base de Datos")
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+
+        self.hilo = HiloRespaldo(db_name, destino, comprimir, self)
+        self.hilo.progreso.connect(self.actualizar_progreso)
+        self.hilo.terminado.connect(self.respaldo_terminado)
+        self.hilo.fallido.connect(self.respaldo_fallido)
+        self.canceled.connect(self.cancelar_respaldo)
+
+    def exec_(self):
+        self.hilo.start()
+        return super().exec_()
+
+    def actualizar_progreso(self, fase, hechos, total):
+        etiqueta = "Copiando base de datos..." if fase == 'copiando' else "Comprimiendo respaldo..."
+        self.setLabelText(etiqueta)
+        self.setValue(int(hechos * 100 / total) if total else 0)
+
+    def cancelar_respaldo(self):
+        self.setLabelText("Cancelando...")
+        self.hilo.cancelar = True
+
+    def respaldo_terminado(self, destino):
+        self.hilo.wait()
+        QMessageBox.information(self, "Éxito", f"Base de datos exportada correctamente a:\n{destino}")
+        self.accept()
+
+    def respaldo_fallido(self, mensaje):
+        self.hilo.wait()
+        QMessageBox.critical(self, "Error", f"No se pudo exportar la base de datos:\n{mensaje}")
+        self.reject()
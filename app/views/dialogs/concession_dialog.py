@@ -129,12 +129,6 @@ class NewConcesionDialog(QDialog):
             QMessageBox.critical(self, "Error", "El folio es requerido")
             return
         
-        # Guardar emisor
-        emisor_id = self.db.crear_emisor(
-            self.txt_nombre_emisor.text(),
-            self.txt_nombre_vendedor.text()
-        )
-        
         # Capturar la fecha de recepción seleccionada
         fecha_recepcion = self.date_recepcion.date().toString("yyyy-MM-dd")
 
@@ -146,21 +140,29 @@ class NewConcesionDialog(QDialog):
             dias = None
             fecha_vencimiento = self.date_vencimiento.date().toString("yyyy-MM-dd")
         
-        # Crear concesión
-        concesion_id = self.db.crear_concesion(
-            emisor_id=emisor_id,
-            tipo=self.cmb_tipo.currentText(),
-            folio=self.txt_folio.text(),
-            fecha_recepcion=fecha_recepcion,
-            fecha_vencimiento=fecha_vencimiento,
-            dias_validez=dias
-        )
-        
-        # Guardar documentos
-        for i in range(self.lista_docs.count()):
-            file_path = self.lista_docs.item(i).text()
-            tipo = "PDF" if file_path.lower().endswith(".pdf") else "Excel"
-            self.db.crear_documento(concesion_id, file_path.split("/")[-1], tipo, file_path)
+        # Emisor, concesión y documentos se confirman juntos
+        with self.db.transaccion():
+            # Guardar emisor
+            emisor_id = self.db.crear_emisor(
+                self.txt_nombre_emisor.text(),
+                self.txt_nombre_vendedor.text()
+            )
+            
+            # Crear concesión
+            concesion_id = self.db.crear_concesion(
+                emisor_id=emisor_id,
+                tipo=self.cmb_tipo.currentText(),
+                folio=self.txt_folio.text(),
+                fecha_recepcion=fecha_recepcion,
+                fecha_vencimiento=fecha_vencimiento,
+                dias_validez=dias
+            )
+            
+            # Guardar documentos
+            for i in range(self.lista_docs.count()):
+                file_path = self.lista_docs.item(i).text()
+                tipo = "PDF" if file_path.lower().endswith(".pdf") else "Excel"
+                self.db.crear_documento(concesion_id, file_path.split("/")[-1], tipo, file_path)
         
         self.accept()
 
@@ -211,7 +213,8 @@ class EditConcesionDialog(NewConcesionDialog):
     def __init__(self, concesion_data, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Editar Concesión")
-        self.concesion_id = concesion_data[0]
+        self.concesion_id = concesion_data['id']
+        self.emisor_id = concesion_data['emisor_id']
 
         # Deshabilitar elementos innecesarios
         self.deshabilitar_elementos_no_editables()
@@ -221,26 +224,23 @@ class EditConcesionDialog(NewConcesionDialog):
     def cargar_datos_iniciales(self, data):
         """Carga los datos existentes en el formulario"""
         # Obtener datos del emisor
-        emisor = self.db.cursor.execute(
-            "SELECT * FROM grantingEmisor WHERE id = ?", 
-            (data[1],)
-        ).fetchone()
+        emisor = self.db.obtener_emisor(data['emisor_id'])
         
-        self.txt_nombre_emisor.setText(emisor[1])
-        self.txt_nombre_vendedor.setText(emisor[2])
+        self.txt_nombre_emisor.setText(emisor['nombre_emisor'])
+        self.txt_nombre_vendedor.setText(emisor['nombre_vendedor'])
         
         # Cargar datos de la concesión
-        self.cmb_tipo.setCurrentText(data[2])
-        self.txt_folio.setText(data[3])
-        self.date_recepcion.setDate(QDate.fromString(data[4], "yyyy-MM-dd"))
+        self.cmb_tipo.setCurrentText(data['tipo'])
+        self.txt_folio.setText(data['folio'])
+        self.date_recepcion.setDate(QDate.fromString(data['fecha_recepcion'], "yyyy-MM-dd"))
         
         # Configurar fecha de vencimiento
-        if "dias" in data[5]:  # Asumiendo que tienes este dato
+        if "dias" in data['fecha_vencimiento']:  # Asumiendo que tienes este dato
             self.rdb_dias.setChecked(True)
-            self.spn_dias.setValue(int(data[5].split(" ")[0]))
+            self.spn_dias.setValue(int(data['fecha_vencimiento'].split(" ")[0]))
         else:
             self.rdb_fecha.setChecked(True)
-            self.date_vencimiento.setDate(QDate.fromString(data[5], "yyyy-MM-dd"))
+            self.date_vencimiento.setDate(QDate.fromString(data['fecha_vencimiento'], "yyyy-MM-dd"))
     
     def deshabilitar_elementos_no_editables(self):
         """Deshabilita todos los elementos excepto los relacionados con el emisor"""
@@ -268,16 +268,9 @@ class EditConcesionDialog(NewConcesionDialog):
     def guardar_concesion(self):
         """Actualiza los datos en lugar de crear nuevos"""
         # Actualizar emisor
-        self.db.cursor.execute('''
-            UPDATE grantingEmisor SET 
-                nombre_emisor = ?,
-                nombre_vendedor = ?
-            WHERE id = (SELECT emisor_id FROM Concesiones WHERE id = ?)
-        ''', (
+        self.db.actualizar_emisor(
+            self.emisor_id,
             self.txt_nombre_emisor.text(),
-            self.txt_nombre_vendedor.text(),
-            self.concesion_id
-        ))
-        
-        self.db.conn.commit()
+            self.txt_nombre_vendedor.text()
+        )
         self.accept()
\ No newline at end of file
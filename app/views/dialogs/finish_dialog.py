@@ -127,13 +127,11 @@ class FinConcesionDialog(QDialog):
                 )
                 
                 # Guardar el PDF en la base de datos
-                with open(filename, 'rb') as f:
-                    contenido = f.read()
                 nombre_archivo = os.path.basename(filename)
-                self.parent().db.crear_reporte_pdf(
+                self.parent().db.crear_reporte_pdf_desde_archivo(
                     self.parent().current_concesion_id,
                     nombre_archivo,
-                    contenido
+                    filename
                 )
                 QMessageBox.information(self, "Éxito", "PDF generado correctamente y almacenado en la base de datos")
                 self.accept()
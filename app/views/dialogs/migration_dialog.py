@@ -0,0 +1,65 @@
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtWidgets import QProgressDialog, QMessageBox
+from app.models.database import GestorConexiones
+
+
+class HiloMigracion(QThread):
+    """Abre la base (y con ello aplica sus migraciones) fuera del hilo de la interfaz"""
+    progreso = pyqtSignal(int, int)  # hechas, total
+    terminado = pyqtSignal()
+    fallido = pyqtSignal(str)
+
+    def __init__(self, db_name, parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+
+    def run(self):
+        try:
+            GestorConexiones.obtener(self.db_name, progreso_migracion=self.progreso.emit)
+        except Exception as e:
+            self.fallido.emit(str(e))
+        else:
+            self.terminado.emit()
+
+
+class MigracionDialog(QProgressDialog):
+    """
+    Muestra el avance de la actualización del esquema de la base. Una
+    migración que copia los documentos tarda con una base grande y no se
+    puede cancelar a medias, así que el diálogo no tiene botón Cancelar.
+    """
+    def __init__(self, db_name='concesiones.db', parent=None):
+        super().__init__("Actualizando la base de datos...", None, 0, 100, parent)
+        self.setWindowTitle("Actualizar Base de Datos")
+        self.setWindowModality(Qt.ApplicationModal)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+
+        self.hilo = HiloMigracion(db_name, self)
+        self.hilo.progreso.connect(self.actualizar_progreso)
+        self.hilo.terminado.connect(self.migracion_terminada)
+        self.hilo.fallido.connect(self.migracion_fallida)
+
+    def exec_(self):
+        self.hilo.start()
+        return super().exec_()
+
+    def actualizar_progreso(self, hechas, total):
+        if hechas < total:
+            self.setLabelText(f"Actualizando la base de datos (paso {hechas + 1} de {total})...")
+        self.setValue(int(hechas * 100 / total) if total else 100)
+
+    def migracion_terminada(self):
+        self.hilo.wait()
+        self.accept()
+
+    def migracion_fallida(self, mensaje):
+        self.hilo.wait()
+        QMessageBox.critical(self, "Error", f"No se pudo actualizar la base de datos:\n{mensaje}")
+        self.reject()
+
+    def reject(self):
+        # Escape o cerrar la ventana no detienen la migración
+        if self.hilo.isFinished():
+            super().reject()
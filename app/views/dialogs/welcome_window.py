@@ -1,10 +1,10 @@
 from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QLabel, QListWidget, QListWidgetItem, QMessageBox, QStyledItemDelegate
 from PyQt5.QtCore import Qt, QMargins
 from PyQt5.QtGui import QPainter, QColor, QBrush, QPen, QFont
-from datetime import datetime
 from app.views.main_window import MainWindow
 from app.models.json_extract import (extract_version_from_file)
 from app.models.database import ConcesionesDB
+from app.models.db_async import ConcesionesDBAsync
 from app.views.dialogs.update_dialog import UpdateDialog
 from app.views.dialogs.about_dialog import AboutDialog
 import os
@@ -76,6 +76,7 @@ class WelcomeWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.db = ConcesionesDB()  # Base de datos para acceder a las concesiones
+        self.db_async = ConcesionesDBAsync(self.db, self)
         self.initUI()
 
     def initUI(self):
@@ -150,16 +151,16 @@ class WelcomeWindow(QMainWindow):
         self.setCentralWidget(main_widget)
 
     def actualizar_lista_concesiones(self):
+        # No mostrar concesiones vencidas
+        self.db_async.ejecutar('obtener_lista_concesiones', estado=('Vence pronto', 'Valido'),
+                               al_terminar=self.mostrar_lista_concesiones, clave='concesiones')
+
+    def mostrar_lista_concesiones(self, concesiones):
         self.lista_concesiones.clear()
-        concesiones = self.db.obtener_concesiones()
         for concesion in concesiones:
-            if concesion['status'] == 'Vencido':
-                continue  # No mostrar concesiones vencidas
-
-            emisor = self.obtener_nombre_emisor(concesion['emisor_id'])
+            emisor = concesion['nombre_emisor'] or "Desconocido"
             folio = concesion['folio']
-            fecha_vencimiento = datetime.strptime(concesion['fecha_vencimiento'], '%Y-%m-%d').date()
-            dias_restantes = (fecha_vencimiento - datetime.now().date()).days
+            dias_restantes = concesion['dias_restantes']
 
             item_text = f"{emisor} | {folio} | {dias_restantes} días restantes"
             item = QListWidgetItem(item_text)
@@ -172,12 +173,6 @@ class WelcomeWindow(QMainWindow):
         # Aplicar el delegado personalizado
         self.lista_concesiones.setItemDelegate(CustomItemDelegate(self.lista_concesiones))
 
-    def obtener_nombre_emisor(self, emisor_id):
-        """Obtiene el nombre del emisor desde la base de datos."""
-        self.db.cursor.execute('SELECT nombre_emisor FROM grantingEmisor WHERE id = ?', (emisor_id,))
-        result = self.db.cursor.fetchone()
-        return result[0] if result else "Desconocido"
-
     def iniciar_gestor_concesiones(self):
         """Cierra la ventana de bienvenida y abre el MainWindow."""
         self.close()
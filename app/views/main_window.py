@@ -1,27 +1,61 @@
 import os
-from PyQt5.QtWidgets import (QMainWindow, QListWidget, QListWidgetItem, QWidget, 
-                            QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem, 
+import pandas as pd
+from PyQt5.QtWidgets import (QMainWindow, QListWidget, QListWidgetItem, QListView, QWidget, 
+                            QVBoxLayout, QLabel, 
                             QPushButton, QFileDialog, QMessageBox,QHBoxLayout, QSizePolicy,
                             QDialog, QAction, QMenu, QDockWidget)
 from PyQt5.QtCore import Qt, QSize, QDate
 from app.models.database import ConcesionesDB
+from app.models.db_async import ConcesionesDBAsync
 from app.views.dialogs import (ProductoDialog, NewConcesionDialog, 
                               AlertDialog, FinConcesionDialog)
-from app.views.dialogs.concession_dialog import (EditConcesionDialog, ConcesionItem)
+from app.views.dialogs.concession_dialog import EditConcesionDialog
+from app.views.components.concession_list import ConcesionesListModel, ConcesionDelegate
+from app.views.components.pandas_model import TablaDataFrame
 from app.views.dialogs.about_dialog import AboutDialog
+from app.views.dialogs.backup_dialog import RespaldoDialog
 from app.views.tools.table_extractor import PdfTableExtractor
 from app.views.tools.congruence_analisis import AnalizadorCongruencias
 from app.views.tools.gslibCut_analisis import AnalizadorCorteGeslib
 from app.views.dialogs.update_dialog import UpdateDialog
 from app.models.json_extract import extract_version_from_file
-from datetime import datetime
-import shutil
+
+
+# Columnas de Productos que se muestran y su encabezado en la tabla
+COLUMNAS_PRODUCTOS = {
+    'cantidad': "Cantidad",
+    'descripcion': "Descripción",
+    'isbn': "ISBN",
+    'pvp_unitario': "PVP Unitario",
+    'precio_neto': "Precio Neto",
+    'precio_total': "Precio Total",
+}
+COLUMNAS_TABLA_PRODUCTOS = list(COLUMNAS_PRODUCTOS.values())
+
+
+def _formato_precio(valor):
+    return f"${valor:.2f}"
+
+
+def _leer_detalles_concesion(db, concesion_id):
+    """Lee en una sola tarea todo lo que muestra el panel de detalles"""
+    concesion = db.obtener_concesion_por_id(concesion_id)
+    if not concesion:
+        return None
+    return {
+        'concesion': concesion,
+        'emisor': db.obtener_emisor(concesion['emisor_id']),
+        'documentos': db.obtener_documentos(concesion_id),
+        'productos': db.obtener_productos_por_concesion(concesion_id),
+    }
 
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.db = ConcesionesDB()
+        # Las lecturas que llenan la ventana se hacen en segundo plano
+        self.db_async = ConcesionesDBAsync(self.db, self)
         self.current_concesion_id = None  # Almacenará el ID de la concesión seleccionada
         
         self.initUI()
@@ -139,26 +173,22 @@ class MainWindow(QMainWindow):
         list_layout.addWidget(header)
         
         # Lista
-        self.lista = QListWidget()
+        # Las filas se leen por lotes al desplazarse y las dibuja el delegado
+        self.modelo_concesiones = ConcesionesListModel(self.db, db_async=self.db_async, parent=self)
+        self.lista = QListView()
+        self.lista.setModel(self.modelo_concesiones)
+        self.lista.setItemDelegate(ConcesionDelegate(self.lista))
+        self.lista.setUniformItemSizes(True)
+        self.lista.setMouseTracking(True)
         self.lista.setStyleSheet("""
-            QListWidget {
+            QListView {
                 border: none;
                 border-radius: 5px;
                 background: #012030;
             }
-            QListWidget::item {
-                border-bottom: 1px solid #ddd;
-            }
-            QListWidget::item:hover {
-                background: #4F8FAA;
-            }
-            QListWidget::item:selected {
-                background: #13678A;
-                color: white;
-            }
         """)
         self.lista.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.lista.itemSelectionChanged.connect(self.mostrar_detalles_concesion)
+        self.lista.selectionModel().currentChanged.connect(self.mostrar_detalles_concesion)
         list_layout.addWidget(self.lista)
         
         list_widget.setLayout(list_layout)
@@ -187,12 +217,7 @@ class MainWindow(QMainWindow):
             details_layout.addWidget(lbl)
         
                 # En MainWindow.initUI(), añade estos elementos:
-        self.tabla_productos = QTableWidget()
-        self.tabla_productos.setColumnCount(6)
-        self.tabla_productos.setHorizontalHeaderLabels([
-            "Cantidad", "Descripción", "ISBN", "PVP Unitario", 
-            "Precio Neto", "Precio Total"
-        ])
+        self.tabla_productos = TablaDataFrame(pd.DataFrame(columns=COLUMNAS_TABLA_PRODUCTOS))
 
         self.tabla_productos.horizontalHeader().setStretchLastSection(True)
         self.tabla_productos.setColumnWidth(0, 80)   # Cantidad
@@ -306,14 +331,12 @@ class MainWindow(QMainWindow):
             return
         
         reporte_id = item.data(Qt.UserRole)
-        contenido = self.db.obtener_contenido_reporte(reporte_id)
         
         filename, _ = QFileDialog.getSaveFileName(
         self, "Guardar PDF", item.text().split(" - ")[0], "PDF (*.pdf)")
         
         if filename:
-            with open(filename, 'wb') as f:
-                f.write(contenido)
+            self.db.exportar_reporte(reporte_id, filename)
             QMessageBox.information(self, "Éxito", "PDF exportado correctamente")
             dialog.close()
 
@@ -369,35 +392,19 @@ class MainWindow(QMainWindow):
             self.actualizar_productos()
 
     def actualizar_productos(self):
-        self.tabla_productos.setRowCount(0)
         if not self.current_concesion_id:
+            self.mostrar_productos([])
             return
-            
-        productos = self.db.obtener_productos_por_concesion(self.current_concesion_id)
-        for prod in productos:
-            row = self.tabla_productos.rowCount()
-            self.tabla_productos.insertRow(row)
-            
-            # Formatear valores numéricos
-            pvp = prod['pvp_unitario'] or 0.0
-            neto = prod['precio_neto'] or 0.0
-            total = prod['precio_total'] or 0.0
-            
-            items = [
-                QTableWidgetItem(str(prod['cantidad'])),
-                QTableWidgetItem(prod['descripcion']),
-                QTableWidgetItem(prod['isbn'] or "N/A"),
-                QTableWidgetItem(f"${pvp:.2f}"),
-                QTableWidgetItem(f"${neto:.2f}"),
-                QTableWidgetItem(f"${total:.2f}")
-            ]
-            
-            # Alinear numéricos a la derecha
-            for i in [0, 3, 4, 5]:
-                items[i].setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                
-            for col, item in enumerate(items):
-                self.tabla_productos.setItem(row, col, item)
+        self.db_async.ejecutar('obtener_productos_por_concesion', self.current_concesion_id,
+                               al_terminar=self.mostrar_productos, clave='productos')
+
+    def mostrar_productos(self, productos):
+        df = pd.DataFrame(productos, columns=list(COLUMNAS_PRODUCTOS))
+        df = df.rename(columns=COLUMNAS_PRODUCTOS)
+        df["ISBN"] = df["ISBN"].fillna("N/A")
+        precios = ["PVP Unitario", "Precio Neto", "Precio Total"]
+        df[precios] = df[precios].astype(float).fillna(0.0)
+        self.tabla_productos.mostrar(df, formatos={columna: _formato_precio for columna in precios})
 
     def mostrar_nueva_concesion(self):
         dialog = NewConcesionDialog(self)
@@ -405,47 +412,56 @@ class MainWindow(QMainWindow):
             self.cargar_concesiones()
 
     def mostrar_alerta_concesiones(self):
-        concesiones = self.db.obtener_concesiones()
+        self.db_async.ejecutar('obtener_lista_concesiones', estado='Vence pronto',
+                               al_terminar=self.mostrar_dialogo_alerta)
+
+    def mostrar_dialogo_alerta(self, concesiones):
         concesiones_proximas = []
         
         for concesion in concesiones:
-            if concesion['status'] == 'Vence pronto':
-                dias_restantes = (datetime.strptime(concesion['fecha_vencimiento'], '%Y-%m-%d').date() - datetime.now().date()).days
-                concesiones_proximas.append({
-                    'emisor': self.obtener_nombre_emisor(concesion['emisor_id']),
-                    'folio': concesion['folio'],
-                    'dias_restantes': dias_restantes
-                })
+            concesiones_proximas.append({
+                'emisor': concesion['nombre_emisor'] or "Desconocido",
+                'folio': concesion['folio'],
+                'dias_restantes': concesion['dias_restantes']
+            })
         
        # if concesiones_proximas or not concesiones:
         dialog = AlertDialog(concesiones_proximas, self)
         dialog.exec_()
 
     def mostrar_detalles_concesion(self):
-        selected = self.lista.currentItem()
-        if not selected:
+        selected = self.lista.currentIndex()
+        if not selected.isValid():
             return
             
-        # Obtener ID desde el item seleccionado
+        # Obtener ID desde la fila seleccionada
         concesion_id = selected.data(Qt.UserRole)
-        concesion = self.db.obtener_concesion_por_id(concesion_id)
-        
-        if not concesion:
+        # Si se cambia de concesion antes de que termine, se descarta la anterior,
+        # igual que las listas pendientes de la concesion previa
+        self.db_async.cancelar('documentos')
+        self.db_async.cancelar('productos')
+        self.db_async.ejecutar(_leer_detalles_concesion, concesion_id,
+                               al_terminar=self.mostrar_datos_concesion, clave='detalles')
+
+    def mostrar_datos_concesion(self, detalles):
+        if detalles is None:
             QMessageBox.warning(self, "Error", "Concesión no encontrada")
             return
-        
+
+        concesion = detalles['concesion']
         self.current_concesion_id = concesion['id']
         
         # Actualizar labels...
-        self.lbl_emisor.setText(f"Emisor: {self.obtener_nombre_emisor(concesion['emisor_id'])}")
+        emisor = detalles['emisor']
+        self.lbl_emisor.setText(f"Emisor: {emisor['nombre_emisor'] if emisor else 'Desconocido'}")
         self.lbl_folio.setText(f"Folio: {concesion['folio']}")
         self.lbl_tipo.setText(f"Tipo: {concesion['tipo']}")
         self.lbl_fecha_recepcion.setText(f"Fecha Recepción: {concesion['fecha_recepcion']}")
         self.lbl_fecha_vencimiento.setText(f"Fecha Vencimiento: {concesion['fecha_vencimiento']}")
         self.lbl_estado.setText(f"Estado: {concesion['status']}")
         
-        self.actualizar_documentos()
-        self.actualizar_productos()
+        self.mostrar_documentos(detalles['documentos'])
+        self.mostrar_productos(detalles['productos'])
 
         finalizada = concesion.get('finalizada', 0)
         if finalizada:
@@ -458,49 +474,38 @@ class MainWindow(QMainWindow):
 
         
     def cargar_concesiones(self):
-        self.lista.clear()
-        concesiones = self.db.obtener_concesiones()
-        
-        for concesion in concesiones:
-            item = QListWidgetItem(self.lista)
-            item.setData(Qt.UserRole, concesion['id'])  # Almacenar ID
-            item.setSizeHint(QSize(0, 60))  # Altura del item
-            
-            # Crear widget personalizado
-            widget = ConcesionItem(
-                emisor=self.obtener_nombre_emisor(concesion['emisor_id']),
-                folio=concesion['folio'],
-                status=concesion['status']
-            )
-            
-            self.lista.addItem(item)
-            self.lista.setItemWidget(item, widget)
-    
-    def obtener_nombre_emisor(self, emisor_id):
-        # Consultar nombre del emisor desde la base de datos
-        self.db.cursor.execute('SELECT nombre_emisor FROM grantingEmisor WHERE id = ?', (emisor_id,))
-        result = self.db.cursor.fetchone()
-        return result[0] if result else "Desconocido"
+        # Solo el primer lote; el resto lo pide la vista al desplazarse
+        self.db_async.ejecutar(self.modelo_concesiones.leer_primer_lote,
+                               al_terminar=self.mostrar_concesiones, clave='concesiones')
+
+    def mostrar_concesiones(self, lote):
+        self.modelo_concesiones.establecer(lote)
+        # Conservar la selección si la concesión sigue entre las filas leídas
+        fila = self.modelo_concesiones.fila_de(self.current_concesion_id)
+        if fila >= 0:
+            self.lista.setCurrentIndex(self.modelo_concesiones.index(fila))
 
     def actualizar_documentos(self):
         """Actualiza la lista de documentos de la concesión actual"""
+        if not self.current_concesion_id:
+            self.lista_documentos.clear()
+            return
+        self.db_async.ejecutar('obtener_documentos', self.current_concesion_id,
+                               al_terminar=self.mostrar_documentos, clave='documentos')
+
+    def mostrar_documentos(self, documentos):
         self.lista_documentos.clear()
-        if self.current_concesion_id:
-            documentos = self.db.obtener_documentos(self.current_concesion_id)
-            for doc in documentos:
-                item = QListWidgetItem(f"{doc[2]} ({doc[3]})")  # Nombre (Tipo)
-                item.setData(Qt.UserRole, doc[0])  # Almacenar ID del documento
-                self.lista_documentos.addItem(item)
+        for doc in documentos:
+            item = QListWidgetItem(f"{doc[2]} ({doc[3]})")  # Nombre (Tipo)
+            item.setData(Qt.UserRole, doc[0])  # Almacenar ID del documento
+            self.lista_documentos.addItem(item)
     
     def editar_concesion(self):
         if not self.verificar_concesion_seleccionada():
             return
         
         # Obtener datos actuales
-        concesion_data = self.db.cursor.execute(
-            "SELECT * FROM Concesiones WHERE id = ?", 
-            (self.current_concesion_id,)
-        ).fetchone()
+        concesion_data = self.db.obtener_concesion_por_id(self.current_concesion_id)
         
         dialog = EditConcesionDialog(concesion_data, self)
         if dialog.exec_():
@@ -531,12 +536,11 @@ class MainWindow(QMainWindow):
         )
 
         if confirm == QMessageBox.Yes:
-            self.db.cursor.execute("DELETE FROM Concesiones WHERE id = ?", (self.current_concesion_id,))
-            self.db.conn.commit()
+            self.db.eliminar_concesion(self.current_concesion_id)
             self.cargar_concesiones()
             self.current_concesion_id = None
             self.lista_documentos.clear()
-            self.tabla_productos.setRowCount(0)
+            self.mostrar_productos([])
 
     def mostrar_menu_documento(self, item):
         menu = QMenu(self)
@@ -548,7 +552,7 @@ class MainWindow(QMainWindow):
         
         # Obtener ID y tipo del documento
         doc_id = item.data(Qt.UserRole)
-        documento = self.db.obtener_documento_por_id(doc_id)
+        documento = self.db.obtener_metadatos_documento(doc_id)
         
         if not documento:
             QMessageBox.warning(self, "Error", "Documento no encontrado")
@@ -567,7 +571,7 @@ class MainWindow(QMainWindow):
         menu.exec_(self.cursor().pos())
 
     def exportar_documento(self, doc_id):
-        documento = self.db.obtener_documento_por_id(doc_id)
+        documento = self.db.obtener_metadatos_documento(doc_id)
         if not documento:
             QMessageBox.warning(self, "Error", "Documento no encontrado")
             return
@@ -585,8 +589,7 @@ class MainWindow(QMainWindow):
         
         if filename:
             try:
-                with open(filename, 'wb') as f:
-                    f.write(documento['contenido'])
+                self.db.exportar_documento(doc_id, filename)
                 QMessageBox.information(self, "Éxito", "Documento exportado correctamente")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"No se pudo guardar: {str(e)}")
@@ -600,8 +603,7 @@ class MainWindow(QMainWindow):
         )
         
         if confirm == QMessageBox.Yes:
-            self.db.cursor.execute("DELETE FROM Documentos WHERE id = ?", (doc_id,))
-            self.db.conn.commit()
+            self.db.eliminar_documento(doc_id)
             self.actualizar_documentos()
             QMessageBox.information(self, "Éxito", "Documento eliminado correctamente")
 
@@ -609,78 +611,29 @@ class MainWindow(QMainWindow):
         dialog = PdfTableExtractor()
         if dialog.exec():
             self.actualizar_documentos()
+        self.actualizar_productos()
 
     def abrir_extractor_con_documento(self, doc_id):
         """Abre PdfTableExtractor con el archivo PDF asociado al documento"""
-        print("Iniciando proceso para abrir PdfTableExtractor...")
-
-        # Obtener el documento desde la base de datos
-        print(f"Buscando documento con ID: {doc_id}")
-        documento = self.db.obtener_documento_por_id(doc_id)
+        documento = self.db.obtener_metadatos_documento(doc_id)
         if not documento:
-            print("Error: No se encontró el documento en la base de datos.")
             QMessageBox.warning(self, "Error", "No se pudo encontrar el documento seleccionado.")
             return
 
-        print("Documento encontrado. Creando archivo temporal...")
-
-        # Guardar el contenido del documento en un archivo temporal
-        temp_pdf_path = f"temp_doc_{doc_id}.pdf"
-        try:
-            with open(temp_pdf_path, 'wb') as f:
-                f.write(documento['contenido'])
-            print(f"Archivo temporal creado: {temp_pdf_path}")
-        except Exception as e:
-            print(f"Error al crear el archivo temporal: {str(e)}")
-            QMessageBox.critical(self, "Error", f"No se pudo guardar el archivo temporal: {str(e)}")
-            return
-
-        print("Creando instancia de PdfTableExtractor...")
-        # Crear y mostrar la ventana PdfTableExtractor
+        # Crear y mostrar la ventana PdfTableExtractor; el extractor exporta el
+        # PDF a su propio directorio temporal y lo borra al cerrarse
         extractor = PdfTableExtractor()
         extractor.set_load_pdf_enabled(False) # Se deshabilita boton de cargar PDF para este PDFTableExtractor
-        print("Instancia de PdfTableExtractor creada.")
-
-        # Cargar el archivo en PdfTableExtractor
-        try:
-            print(f"Cargando archivo PDF desde: {temp_pdf_path}")
-            extractor.load_pdf_from_path(temp_pdf_path)
-            print("Archivo cargado correctamente en PdfTableExtractor.")
-        except Exception as e:
-            print(f"Error al cargar el archivo en PdfTableExtractor: {str(e)}")
-            QMessageBox.critical(self, "Error", f"No se pudo cargar el archivo en PdfTableExtractor: {str(e)}")
-            return
-
-        # Conectar el evento destroyed para eliminar el archivo temporal
-        print("Conectando evento destroyed para limpieza de archivos temporales...")
-        
-        # Usar una función segura para eliminar archivos temporales
-        def eliminar_temp_file():
-            print(f"Eliminando archivo temporal: {temp_pdf_path}")
-            self.eliminar_archivos_temporales([temp_pdf_path])
-
-        extractor.destroyed.connect(eliminar_temp_file)
-        print("Evento destroyed conectado.")
+        extractor.selected_concesion_id = documento['concesion_id']  # Guardar e importar en la concesión del documento
+        extractor.load_pdf_from_document(doc_id)
 
-        # Mostrar la ventana
-        print("Mostrando la ventana PdfTableExtractor...")
         extractor.exec()  # Usar exec() en lugar de show()
         self.actualizar_documentos()
-        print("Ventana PdfTableExtractor cerrada.")
-
-    def eliminar_archivos_temporales(self, files):
-        """Elimina archivos temporales"""
-        for file in files:
-            if os.path.exists(file):
-                try:
-                    os.remove(file)
-                    print(f"Archivo temporal eliminado: {file}")
-                except Exception as e:
-                    print(f"No se pudo eliminar el archivo temporal {file}: {str(e)}")
+        self.actualizar_productos()
 
     def mostrar_ExportarBaseDatos(self):
-            # Obtener la ruta absoluta de la base de datos (en la raíz del proyecto)
-            db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'concesiones.db'))
+            # Ruta absoluta de la base de datos que usa la aplicación
+            db_path = os.path.abspath(self.db.db_name)
 
             # Verificar si la base de datos existe
             if not os.path.exists(db_path):
@@ -690,21 +643,21 @@ class MainWindow(QMainWindow):
             # Abrir el cuadro de diálogo para guardar el archivo
             options = QFileDialog.Options()
             options |= QFileDialog.DontUseNativeDialog  # Opcional: Desactiva el diálogo nativo (puedes omitirlo si prefieres el nativo)
-            file_name, _ = QFileDialog.getSaveFileName(self, "Exportar Base de Datos", "", "Archivos de Base de Datos (*.db);;Todos los archivos (*)", options=options)
+            filtro_comprimido = "Respaldo comprimido (*.zip)"
+            file_name, filtro = QFileDialog.getSaveFileName(
+                self, "Exportar Base de Datos", "",
+                f"Archivos de Base de Datos (*.db);;{filtro_comprimido};;Todos los archivos (*)", options=options)
 
             if file_name:
-                try:
-                    # Asegurarse de que el archivo tenga la extensión .db
-                    if not file_name.endswith('.db'):
-                        file_name += '.db'
-
-                    # Copiar la base de datos a la nueva ubicación
-                    shutil.copy(db_path, file_name)
-                    QMessageBox.information(self, "Éxito", f"Base de datos exportada correctamente a:\n{file_name}")
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"No se pudo exportar la base de datos:\n{str(e)}")
-
-                    
+                # Asegurarse de que el archivo tenga la extensión correspondiente
+                comprimir = filtro == filtro_comprimido or file_name.endswith('.zip')
+                extension = '.zip' if comprimir else '.db'
+                if not file_name.endswith(extension):
+                    file_name += extension
+
+                # Copia consistente en un hilo aparte, aunque la base esté en uso
+                RespaldoDialog(db_path, file_name, comprimir, self).exec_()
+
     def mostrar_Analizador_Congruencia(self):
         dialog = AnalizadorCongruencias()
         if dialog.exec():
@@ -1,24 +1,27 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, 
                              QPushButton, QListWidget, QLabel, 
-                             QComboBox, QTableWidget, QTableWidgetItem,
+                             QComboBox, QTabWidget, QWidget, QProgressDialog,
                              QListWidgetItem, QMessageBox, QFileDialog)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QColor
 from app.models.database import ConcesionesDB
+from app.models.db_async import ConcesionesDBAsync
+from app.models.congruencia import contar_isbn, resumir, NO_CONGRUENTE, ISBN_INVALIDO
+from app.models.titulos import ResolvedorTitulos
+from app.views.components.pandas_model import TablaDataFrame
 from app.utils.report_generator import Reporte
-import pandas as pd
-import requests
 import os
-import re
-import io
 
 class AnalizadorCongruencias(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.db = ConcesionesDB()  # Instancia de la base de datos
+        self.db_async = ConcesionesDBAsync(self.db, self)
+        self.resolvedor_titulos = ResolvedorTitulos(self.db)
         self.documentos_seleccionados = []  # Lista de documentos seleccionados
-        self.tabla_1_data = None
-        self.tabla_2_data = None
+        self.nombres_documentos = []  # Texto de cada documento seleccionado
+        self.tablas_data = []  # DataFrame de cada documento, en el mismo orden
+        self.selectores_columna = []
         self.initUI()
 
     def initUI(self):
@@ -28,7 +31,7 @@ class AnalizadorCongruencias(QDialog):
         layout = QVBoxLayout()
 
         # Etiqueta de instrucciones
-        layout.addWidget(QLabel("Seleccione dos documentos CSV de una concesión activa."))
+        layout.addWidget(QLabel("Seleccione dos o más documentos CSV de una concesión activa."))
 
         # Paso 1: Seleccionar concesión
         self.concesion_list = QListWidget()
@@ -43,22 +46,10 @@ class AnalizadorCongruencias(QDialog):
         layout.addWidget(QLabel("Documentos Disponibles (CSV):"))
         layout.addWidget(self.documento_list)
 
-        # Paso 3: Mostrar tablas seleccionadas
-        self.tabla_1_widget = QTableWidget()
-        self.tabla_2_widget = QTableWidget()
-
-        layout.addWidget(QLabel("Tabla 1:"))
-        layout.addWidget(self.tabla_1_widget)
-        layout.addWidget(QLabel("Tabla 2:"))
-        layout.addWidget(self.tabla_2_widget)
-
-        # Paso 4: Seleccionar columnas con ISBN
-        self.columna_selector_1 = QComboBox()
-        self.columna_selector_2 = QComboBox()
-        layout.addWidget(QLabel("Columna con ISBN (Tabla 1):"))
-        layout.addWidget(self.columna_selector_1)
-        layout.addWidget(QLabel("Columna con ISBN (Tabla 2):"))
-        layout.addWidget(self.columna_selector_2)
+        # Pasos 3 y 4: Una pagina por documento con su tabla y su columna de ISBN
+        self.tablas_tabs = QTabWidget()
+        layout.addWidget(QLabel("Documentos seleccionados:"))
+        layout.addWidget(self.tablas_tabs)
 
         # Botón para iniciar análisis
         btn_analizar = QPushButton("Analizar Congruencias")
@@ -66,7 +57,7 @@ class AnalizadorCongruencias(QDialog):
         layout.addWidget(btn_analizar)
 
         # Resultados
-        self.result_table = QTableWidget()
+        self.result_table = TablaDataFrame()
         layout.addWidget(QLabel("Resultados:"))
         layout.addWidget(self.result_table)
 
@@ -77,7 +68,10 @@ class AnalizadorCongruencias(QDialog):
 
     def cargar_concesiones_activas(self):
         """Carga las concesiones activas con documentos vinculados."""
-        concesiones = self.db.obtener_concesiones_no_finalizadas_con_emisor()
+        self.db_async.ejecutar('obtener_concesiones_no_finalizadas_con_emisor',
+                               al_terminar=self.mostrar_concesiones_activas)
+
+    def mostrar_concesiones_activas(self, concesiones):
         for concesion in concesiones:
             item = QListWidgetItem(f"{concesion['nombre_emisor']} - Folio: {concesion['folio']}")
             item.setData(Qt.UserRole, concesion['id'])
@@ -86,7 +80,10 @@ class AnalizadorCongruencias(QDialog):
     def cargar_documentos_csv(self, item):
         """Carga los documentos asociados a la concesión seleccionada, filtrando solo CSV."""
         concesion_id = item.data(Qt.UserRole)
-        documentos = self.db.obtener_documentos(concesion_id)
+        self.db_async.ejecutar('obtener_documentos', concesion_id,
+                               al_terminar=self.mostrar_documentos_csv, clave='documentos')
+
+    def mostrar_documentos_csv(self, documentos):
         self.documento_list.clear()
         for doc in documentos:
             if doc[3] == 'CSV':  # Filtrar solo documentos CSV
@@ -97,61 +94,67 @@ class AnalizadorCongruencias(QDialog):
     def seleccionar_documentos(self):
         """Guarda los documentos seleccionados y muestra sus tablas."""
         selected_items = self.documento_list.selectedItems()
-        if len(selected_items) == 2:
+        if len(selected_items) >= 2:
             self.documentos_seleccionados = [item.data(Qt.UserRole) for item in selected_items]
+            self.nombres_documentos = [item.text() for item in selected_items]
             QMessageBox.information(self, "Éxito", "Documentos seleccionados correctamente.")
             self.cargar_tablas_seleccionadas()
         else:
-            QMessageBox.warning(self, "Advertencia", "Debe seleccionar exactamente dos documentos.")
+            QMessageBox.warning(self, "Advertencia", "Debe seleccionar al menos dos documentos.")
 
     def cargar_tablas_seleccionadas(self):
         """Carga y muestra las tablas de los documentos seleccionados."""
-        self.tabla_1_data = self.leer_csv_desde_documento(self.documentos_seleccionados[0])
-        self.tabla_2_data = self.leer_csv_desde_documento(self.documentos_seleccionados[1])
-
-        self.mostrar_tabla(self.tabla_1_widget, self.tabla_1_data)
-        self.mostrar_tabla(self.tabla_2_widget, self.tabla_2_data)
-
-        # Configurar selectores de columna
-        self.columna_selector_1.clear()
-        self.columna_selector_1.addItems(self.tabla_1_data.columns)
-        self.columna_selector_2.clear()
-        self.columna_selector_2.addItems(self.tabla_2_data.columns)
+        self.db_async.ejecutar(
+            lambda db, ids: [db.leer_documento_csv(doc_id) for doc_id in ids],
+            list(self.documentos_seleccionados),
+            al_terminar=self.mostrar_tablas_seleccionadas,
+            al_fallar=lambda e: QMessageBox.critical(self, "Error", f"Error al leer los documentos: {str(e)}"),
+            clave='tablas'
+        )
 
-    def leer_csv_desde_documento(self, doc_id):
-        """Lee un archivo CSV desde un documento en la base de datos."""
-        documento = self.db.obtener_documento_por_id(doc_id)
-        contenido = documento['contenido']
-        return pd.read_csv(io.BytesIO(contenido))
+    def mostrar_tablas_seleccionadas(self, tablas):
+        if any(tabla is None for tabla in tablas):
+            QMessageBox.warning(self, "Error", "Documento no encontrado")
+            return
+        self.tablas_data = tablas
+
+        self.tablas_tabs.clear()
+        self.selectores_columna = []
+        for i, (nombre, data) in enumerate(zip(self.nombres_documentos, self.tablas_data)):
+            pagina = QWidget()
+            pagina_layout = QVBoxLayout(pagina)
+            selector = QComboBox()
+            selector.addItems([str(columna) for columna in data.columns])
+            pagina_layout.addWidget(QLabel("Columna con ISBN:"))
+            pagina_layout.addWidget(selector)
+            tabla_widget = TablaDataFrame()
+            self.mostrar_tabla(tabla_widget, data)
+            pagina_layout.addWidget(tabla_widget)
+            self.tablas_tabs.addTab(pagina, f"{self.nombre_tabla(i)}: {nombre}")
+            self.selectores_columna.append(selector)
+
+    def nombre_tabla(self, i):
+        """Nombre corto del documento i en los resultados y el PDF."""
+        return f"Tabla {i + 1}"
 
     def mostrar_tabla(self, tabla_widget, data):
-        """Muestra una tabla en un QTableWidget."""
-        tabla_widget.setRowCount(data.shape[0])
-        tabla_widget.setColumnCount(data.shape[1])
-        tabla_widget.setHorizontalHeaderLabels(data.columns)
-        tabla_widget.setEditTriggers(QTableWidget.NoEditTriggers)  # No editable
-
-        for row in range(data.shape[0]):
-            for col in range(data.shape[1]):
-                item = QTableWidgetItem(str(data.iat[row, col]))
-                tabla_widget.setItem(row, col, item)
+        """Muestra una tabla en un TablaDataFrame."""
+        tabla_widget.mostrar(data)
 
     def analizar_congruencias(self):
-        """Analiza las congruencias entre los documentos seleccionados."""
-        if len(self.documentos_seleccionados) != 2:
-            QMessageBox.warning(self, "Advertencia", "Debe seleccionar dos documentos para analizar.")
+        """Analiza las congruencias entre todos los documentos seleccionados."""
+        if len(self.tablas_data) < 2:
+            QMessageBox.warning(self, "Advertencia", "Debe seleccionar al menos dos documentos para analizar.")
             return
 
-        # Obtener columnas seleccionadas
-        columna_1 = self.columna_selector_1.currentText()
-        columna_2 = self.columna_selector_2.currentText()
+        # La columna elegida de cada documento, por su nombre corto
+        documentos = {
+            self.nombre_tabla(i): data.iloc[:, selector.currentIndex()]
+            for i, (data, selector) in enumerate(zip(self.tablas_data, self.selectores_columna))
+        }
 
-        # Extraer ISBNs
-        isbn_list_1 = self.extraer_isbn(self.tabla_1_data[columna_1])
-        isbn_list_2 = self.extraer_isbn(self.tabla_2_data[columna_2])
-
-        # Comparar ISBNs
-        resultados = self.comparar_isbn(isbn_list_1, isbn_list_2)
+        # Contar los ISBN de todos los documentos en una sola pasada
+        resultados = resumir(contar_isbn(documentos))
 
         # Mostrar resultados en la tabla
         self.mostrar_resultados(resultados)
@@ -159,52 +162,11 @@ class AnalizadorCongruencias(QDialog):
         # Generar PDF
         self.generar_pdf(resultados)
 
-    def extraer_isbn(self, columna):
-        """Extrae números ISBN válidos de una columna."""
-        isbn_list = []
-        for value in columna:
-            isbn = self.limpiar_isbn(str(value))
-            if isbn and self.validar_isbn(isbn):
-                isbn_list.append(isbn)
-        return isbn_list
-
-    def limpiar_isbn(self, texto):
-        """Limpia un número ISBN eliminando guiones y otros caracteres no numéricos."""
-        return re.sub(r'[^0-9X]', '', texto.upper())
-
-    def validar_isbn(self, isbn):
-        """Valida si un número ISBN tiene 10 o 13 dígitos."""
-        return len(isbn) in (10, 13)
-
-    def comparar_isbn(self, isbn_list_1, isbn_list_2):
-        """Compara dos listas de ISBN y devuelve los resultados."""
-        resultados = []
-        for isbn in set(isbn_list_1 + isbn_list_2):
-            en_tabla_1 = isbn in isbn_list_1
-            en_tabla_2 = isbn in isbn_list_2
-            estado = "Congruente" if en_tabla_1 and en_tabla_2 else "No congruente"
-            resultados.append({
-                "ISBN": isbn,
-                "Tabla 1": "Sí" if en_tabla_1 else "No",
-                "Tabla 2": "Sí" if en_tabla_2 else "No",
-                "Estado": estado
-            })
-        return resultados
-
     def mostrar_resultados(self, resultados):
         """Muestra los resultados en una tabla."""
-        self.result_table.setRowCount(len(resultados))
-        self.result_table.setColumnCount(4)
-        self.result_table.setHorizontalHeaderLabels(["ISBN", "Tabla 1", "Tabla 2", "Estado"])
-
-        for row, resultado in enumerate(resultados):
-            self.result_table.setItem(row, 0, QTableWidgetItem(resultado["ISBN"]))
-            self.result_table.setItem(row, 1, QTableWidgetItem(resultado["Tabla 1"]))
-            self.result_table.setItem(row, 2, QTableWidgetItem(resultado["Tabla 2"]))
-            estado_item = QTableWidgetItem(resultado["Estado"])
-            if resultado["Estado"] == "No congruente":
-                estado_item.setBackground(QColor("red"))
-            self.result_table.setItem(row, 3, estado_item)
+        self.result_table.mostrar(resultados, colores={
+            "Estado": lambda estado: QColor("red") if estado in (NO_CONGRUENTE, ISBN_INVALIDO) else None
+        })
 
     def generar_pdf(self, resultados):
         """
@@ -219,16 +181,34 @@ class AnalizadorCongruencias(QDialog):
             QMessageBox.No
         )
 
-        # Buscar títulos si el usuario selecciona "Sí"
-        if reply == QMessageBox.Yes:
-            for resultado in resultados:
-                isbn = resultado["ISBN"]
-                titulo = self.buscar_titulo_por_isbn(isbn)
-                resultado["Titulo"] = titulo
-        else:
-            for resultado in resultados:
-                resultado["Titulo"] = ""
+        resultados = resultados.copy()
+        if reply != QMessageBox.Yes:
+            resultados["Título"] = ""
+            self.guardar_pdf(resultados)
+            return
+
+        # Buscar los títulos en segundo plano; solo los ISBN que no están en el
+        # catálogo ni en la caché salen a la red
+        progreso = QProgressDialog("Buscando títulos...", "Cancelar", 0, 0, self)
+        progreso.setWindowModality(Qt.WindowModal)
+        progreso.canceled.connect(self.resolvedor_titulos.cancelar)
+        progreso.show()
 
+        def mostrar_pdf(titulos):
+            progreso.close()
+            resultados["Título"] = [titulos.get(isbn) or "Título no encontrado" for isbn in resultados["ISBN"]]
+            self.guardar_pdf(resultados)
+
+        def fallo(error):
+            progreso.close()
+            QMessageBox.critical(self, "Error", f"No se pudieron buscar los títulos: {str(error)}")
+
+        self.db_async.ejecutar(lambda db, isbns: self.resolvedor_titulos.resolver(isbns),
+                               resultados["ISBN"].tolist(),
+                               al_terminar=mostrar_pdf, al_fallar=fallo, clave='titulos')
+
+    def guardar_pdf(self, resultados):
+        """Pide el archivo de destino y genera el PDF con la columna Título ya llena."""
         # Abrir cuadro de diálogo para guardar el archivo PDF
         filename, _ = QFileDialog.getSaveFileName(
             self, "Guardar PDF", "", "PDF (*.pdf)"
@@ -244,24 +224,15 @@ class AnalizadorCongruencias(QDialog):
 
         # 1. Encabezado personalizado
         advertencia = (
-            "* Nota: Este reporte utiliza la API de Google Books y Open Library para identificar "
-            "los títulos correspondientes a los ISBN. Los resultados pueden contener "
-            "errores debido a limitaciones en la precisión de la API."
+            "* Nota: Los títulos se toman del catálogo de productos recibidos y, si el ISBN no "
+            "aparece ahí, de la API de Google Books y Open Library. Los resultados de las API "
+            "pueden contener errores debido a limitaciones en su precisión."
         )
         elementos.append({"tipo": "texto", "contenido": advertencia})
 
         # 2. Tabla de resultados
-        columnas = ["ISBN", "Tabla 1", "Tabla 2", "Estado", "Título"]
-        datos_tabla = [
-            {
-                "ISBN": resultado["ISBN"],
-                "Tabla 1": resultado["Tabla 1"],
-                "Tabla 2": resultado["Tabla 2"],
-                "Estado": resultado["Estado"],
-                "Título": resultado["Titulo"],
-            }
-            for resultado in resultados
-        ]
+        columnas = list(resultados.columns)
+        datos_tabla = resultados.to_dict('records')
         elementos.append({"tipo": "tabla", "datos": datos_tabla, "columnas": columnas})
 
         # Generar el PDF usando la clase Reporte
@@ -292,48 +263,3 @@ class AnalizadorCongruencias(QDialog):
         if linea_actual:
             lineas.append(linea_actual)
         return lineas
-
-
-    def buscar_titulo_por_isbn(self, isbn):
-        """Busca el título de un libro usando múltiples APIs gratuitas."""
-        # Intentar con Google Books primero
-        google_books_title = self.buscar_titulo_por_isbn_google_books(isbn)
-        if google_books_title != "Título no encontrado":
-            return google_books_title
-
-        # Si Google Books no encuentra el título, intentar con Open Library
-        open_library_title = self.buscar_titulo_por_isbn_open_library(isbn)
-        if open_library_title != "Título no encontrado":
-            return open_library_title
-
-        # Si ninguna API encuentra el título, devolver "Título no encontrado"
-        return "Título no encontrado"
-
-    def buscar_titulo_por_isbn_google_books(self, isbn):
-        """Busca el título de un libro usando la API de Google Books."""
-        url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("items"):
-                    return data["items"][0]["volumeInfo"].get("title", "Título no encontrado")
-            return "Título no encontrado"
-        except Exception as e:
-            print(f"Error al buscar título para ISBN {isbn} en Google Books: {str(e)}")
-            return "Título no encontrado"
-
-    def buscar_titulo_por_isbn_open_library(self, isbn):
-        """Busca el título de un libro usando la API de Open Library."""
-        url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json"
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                key = f"ISBN:{isbn}"
-                if key in data and "title" in data[key]:
-                    return data[key]["title"]
-            return "Título no encontrado"
-        except Exception as e:
-            print(f"Error al buscar título para ISBN {isbn} en Open Library: {str(e)}")
-            return "Título no encontrado"
@@ -1,18 +1,24 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, 
-                            QLabel, QTableWidget, QTableWidgetItem, QMessageBox, 
+                            QLabel, QMessageBox, 
                             QFileDialog, QComboBox, QInputDialog, QRadioButton, 
                             QButtonGroup, QStackedWidget, QWidget)
 from PyQt5.QtCore import Qt
 from app.models.database import ConcesionesDB
+from app.models.db_async import ConcesionesDBAsync
+from app.models.conciliacion import conciliar
+from app.models.isbn import normalizar as normalizar_isbn, es_valido as es_isbn_valido
+from app.views.components.pandas_model import TablaDataFrame
 from app.utils.report_generator import Reporte
 import pandas as pd
-import io
-import re
 
 class AnalizadorCorteGeslib(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.db = ConcesionesDB()  # Usamos tu clase de base de datos
+        self.db_async = ConcesionesDBAsync(self.db, self)
+        # Datos cargados con sus tipos originales; las tablas solo los muestran
+        self.df_geslib = None
+        self.df_csv = None
         self.initUI()
         
     def initUI(self):
@@ -32,7 +38,7 @@ class AnalizadorCorteGeslib(QDialog):
         self.btn_cargar_geslib = QPushButton("Seleccionar Excel")
         self.btn_cargar_geslib.clicked.connect(self.cargar_excel)
         left_panel.addWidget(self.btn_cargar_geslib)
-        self.tabla_geslib = QTableWidget()
+        self.tabla_geslib = TablaDataFrame()
         left_panel.addWidget(self.tabla_geslib)
 
         # Panel Derecho - Factura CSV
@@ -89,7 +95,7 @@ class AnalizadorCorteGeslib(QDialog):
 
         right_panel.addWidget(self.csv_stack)
 
-        self.tabla_csv = QTableWidget()
+        self.tabla_csv = TablaDataFrame()
         right_panel.addWidget(self.tabla_csv)
 
         # Agregar los dos paneles principales al layout horizontal
@@ -117,7 +123,10 @@ class AnalizadorCorteGeslib(QDialog):
         self.cargar_concesiones_activas()
 
     def cargar_concesiones_activas(self):
-        concesiones = self.db.obtener_concesiones_no_finalizadas_con_emisor()
+        self.db_async.ejecutar('obtener_concesiones_no_finalizadas_con_emisor',
+                               al_terminar=self.mostrar_concesiones_activas)
+
+    def mostrar_concesiones_activas(self, concesiones):
         self.list_concesiones.clear()
         for concesion in concesiones:
             self.list_concesiones.addItem(
@@ -127,7 +136,10 @@ class AnalizadorCorteGeslib(QDialog):
 
     def cargar_documentos_db(self):
         concesion_id = self.list_concesiones.currentData()
-        documentos = self.db.obtener_documentos(concesion_id)
+        self.db_async.ejecutar('obtener_documentos', concesion_id,
+                               al_terminar=self.mostrar_documentos_db, clave='documentos')
+
+    def mostrar_documentos_db(self, documentos):
         self.list_documentos.clear()
         for doc in documentos:
             if doc[3] == 'CSV':  # Índice 3 = tipo de documento
@@ -143,9 +155,13 @@ class AnalizadorCorteGeslib(QDialog):
 
     def cargar_csv_db(self):
         doc_id = self.list_documentos.currentData()
-        documento = self.db.obtener_documento_por_id(doc_id)
-        if documento:
-            df = pd.read_csv(io.BytesIO(documento['contenido']))
+        self.db_async.ejecutar(
+            'leer_documento_csv', doc_id, al_terminar=self.mostrar_csv_db,
+            al_fallar=lambda e: QMessageBox.critical(self, "Error", f"Error al leer archivo CSV: {str(e)}")
+        )
+
+    def mostrar_csv_db(self, df):
+        if df is not None:
             self.procesar_csv(df)
         else:
             QMessageBox.warning(self, "Error", "Documento no encontrado")
@@ -173,9 +189,10 @@ class AnalizadorCorteGeslib(QDialog):
                 df = df[['descripcion', 'precio', 'descuento', 'f_articulo', 'total'] + cnt_columns]
                 
                 # Limpiar ISBNs
-                df['f_articulo'] = df['f_articulo'].apply(self.limpiar_isbn)
+                df['f_articulo'] = normalizar_isbn(df['f_articulo'], conservar_invalidos=True)
                 
-                self.mostrar_dataframe(self.tabla_geslib, df)
+                self.df_geslib = df.reset_index(drop=True)
+                self.mostrar_dataframe(self.tabla_geslib, self.df_geslib)
                 
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error al leer archivo Excel: {str(e)}")
@@ -234,15 +251,7 @@ class AnalizadorCorteGeslib(QDialog):
         preview_layout = QVBoxLayout()
 
         # Crear una tabla para previsualizar el CSV
-        preview_table = QTableWidget()
-        preview_table.setRowCount(min(10, df.shape[0]))  # Mostrar máximo 10 filas
-        preview_table.setColumnCount(df.shape[1])
-        preview_table.setHorizontalHeaderLabels(df.columns)
-
-        # Llenar la tabla con datos del DataFrame
-        for i in range(min(10, df.shape[0])):
-            for j in range(df.shape[1]):
-                preview_table.setItem(i, j, QTableWidgetItem(str(df.iat[i, j])))
+        preview_table = TablaDataFrame(df.head(10))  # Mostrar máximo 10 filas
 
         preview_layout.addWidget(QLabel("Previsualización del archivo CSV:"))
         preview_layout.addWidget(preview_table)
@@ -258,49 +267,37 @@ class AnalizadorCorteGeslib(QDialog):
         col_cantidad = self.combo_cantidad.currentText()
 
         # Validar ISBNs
-        df['isbn_valid'] = df[col_isbn].apply(lambda x: self.validar_isbn(self.limpiar_isbn(str(x))))
-        df_filtrado = df[df['isbn_valid']].copy()
-        df_filtrado.drop(columns=['isbn_valid'], inplace=True)
+        df_filtrado = df[es_isbn_valido(df[col_isbn])].copy()
 
         # Procesar la columna "cantidad"
         df_filtrado[col_cantidad] = df_filtrado[col_cantidad].apply(self.procesar_cantidad)
 
         # Eliminar filas con cantidad inválida (None)
         df_filtrado = df_filtrado[df_filtrado[col_cantidad].notna()]
+        df_filtrado[col_cantidad] = df_filtrado[col_cantidad].astype(int)
 
         if len(df_filtrado) == 0:
             QMessageBox.warning(self, "Advertencia", "No se encontraron registros válidos después de procesar la columna 'cantidad'.")
             return
 
         # Mostrar el DataFrame filtrado en la tabla
-        self.mostrar_dataframe(self.tabla_csv, df_filtrado)
+        self.df_csv = df_filtrado.reset_index(drop=True)
+        self.mostrar_dataframe(self.tabla_csv, self.df_csv)
         dialog.close()
 
     def validar_encabezados(self, columns):
         required = ['descripcion', 'precio', 'descuento', 'f_articulo', 'total']
         return all(col in columns for col in required)
 
-    def limpiar_isbn(self, isbn):
-        return re.sub(r'[^0-9X]', '', str(isbn).upper())
-
-    def validar_isbn(self, isbn):
-        return len(isbn) in (10, 13) and (isbn[:-1].isdigit() or (len(isbn) == 10 and isbn[-1] in ('X', 'x')))
-
     def mostrar_dataframe(self, tabla, df):
-        tabla.setRowCount(df.shape[0])
-        tabla.setColumnCount(df.shape[1])
-        tabla.setHorizontalHeaderLabels(df.columns)
-        
-        for i in range(df.shape[0]):
-            for j in range(df.shape[1]):
-                tabla.setItem(i, j, QTableWidgetItem(str(df.iat[i, j])))
+        tabla.mostrar(df)
 
     def comparar_tablas(self):
         """
         Compara las tablas cargadas y genera un análisis de congruencia.
         """
         # Verificar si las tablas están cargadas
-        if self.tabla_geslib.rowCount() == 0 or self.tabla_csv.rowCount() == 0:
+        if self.df_geslib is None or self.df_csv is None or self.df_geslib.empty or self.df_csv.empty:
             QMessageBox.warning(
                 self,
                 "Tablas no cargadas",
@@ -308,115 +305,34 @@ class AnalizadorCorteGeslib(QDialog):
             )
             return
 
-        # Obtener los DataFrames de las tablas cargadas
-        try:
-            self.df_geslib = self.obtener_dataframe_desde_tabla(self.tabla_geslib)
-            self.df_csv = self.obtener_dataframe_desde_tabla(self.tabla_csv)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudieron obtener los datos de las tablas: {str(e)}")
-            return
-
         # Crear el DataFrame df_TotalAnalisis
         df_TotalAnalisis = self.generar_analisis_congruencia(self.df_geslib, self.df_csv)
+        if df_TotalAnalisis is None:
+            return
 
         # Mostrar el resultado en una nueva ventana
         self.mostrar_resultado(df_TotalAnalisis)
 
-    def obtener_dataframe_desde_tabla(self, tabla):
-        """
-        Convierte una QTableWidget en un DataFrame de pandas.
-        """
-        rows = tabla.rowCount()
-        cols = tabla.columnCount()
-        headers = [tabla.horizontalHeaderItem(i).text() for i in range(cols)]
-        data = []
-        for row in range(rows):
-            data.append([tabla.item(row, col).text() for col in range(cols)])
-        return pd.DataFrame(data, columns=headers)
-
     def generar_analisis_congruencia(self, df_geslib, df_csv):
         """
         Genera un análisis de congruencia entre los datos del reporte GESLib y la factura CSV.
         """
-        # Datos del Reporte (Excel)
-        report_isbn_col = self.df_geslib['f_articulo']
-        report_pnt_col = self.df_geslib['total']
-
         # Si hay múltiples columnas con "cnt", pedir al usuario que seleccione una
-        cnt_columns = [col for col in self.df_geslib.columns if 'cnt' in col.lower()]
+        cnt_columns = [col for col in df_geslib.columns if 'cnt' in col.lower()]
         if len(cnt_columns) > 1:
             cnt_column, ok = QInputDialog.getItem(self, "Seleccionar columna", "Seleccione la columna de cantidad:", cnt_columns, 0, False)
             if not ok:
-                return
+                return None
         else:
             cnt_column = cnt_columns[0]
-        report_cantidad_col = self.df_geslib[cnt_column]
-
-        # Datos de la Factura (CSV)
-        factura_isbn_col = self.df_csv[self.combo_isbn.currentText()]
-        factura_cantidad_col = self.df_csv[self.combo_cantidad.currentText()]
-        factura_pnt_col = self.df_csv[self.combo_precio.currentText()]
-
-        # Obtener todos los ISBN únicos
-        all_isbns = set(report_isbn_col).union(set(factura_isbn_col))
-
-        # Procesar cada ISBN
-        df_TotalAnalisis = pd.DataFrame(columns=[
-            "ISBN",
-            "Congruencia del ISBN",
-            "Aparición en Reporte",
-            "Aparición en Factura",
-            "Congruencia de cantidad",
-            "Congruencia de PNT",
-            "Notas"
-        ])
-
-        for isbn in all_isbns:
-            report_appears = 1 if isbn in report_isbn_col.values else 0
-            factura_appears = 1 if isbn in factura_isbn_col.values else 0
-            congruencia_isbn = 1 if report_appears and factura_appears else 0
-
-            # Obtener cantidades y PNT
-            report_cantidad = self.limpiar_y_formatear_numero(report_cantidad_col[report_isbn_col == isbn].values[0]) if report_appears else None
-            factura_cantidad = self.limpiar_y_formatear_numero(factura_cantidad_col[factura_isbn_col == isbn].values[0]) if factura_appears else None
-            report_pnt = self.limpiar_y_formatear_numero(report_pnt_col[report_isbn_col == isbn].values[0]) if report_appears else None
-            factura_pnt = self.limpiar_y_formatear_numero(factura_pnt_col[factura_isbn_col == isbn].values[0]) if factura_appears else None
-
-            # Congruencia de cantidad y PNT
-            congruencia_cantidad = 1 if report_cantidad == factura_cantidad else 0
-            congruencia_pnt = 1 if report_pnt == factura_pnt else 0
-
-            # Generar notas
-            notas = []
-            if congruencia_isbn and congruencia_cantidad and congruencia_pnt:
-                notas.append("La congruencia es correcta")
-            else:
-                if not congruencia_isbn:
-                    if not report_appears:
-                        notas.append("El ISBN no aparece en el reporte")
-                    if not factura_appears:
-                        notas.append("El ISBN no aparece en la factura")
-                if not congruencia_cantidad:
-                    notas.append(f"Existe una diferencia en cantidad: CR = {report_cantidad} ; CF = {factura_cantidad}")
-                if not congruencia_pnt:
-                    notas.append(f"Existe una diferencia de PNT: PNR = {report_pnt} ; PNF = {factura_pnt}")
-
-            # Concatenar todas las notas con "; "
-            notas_concatenadas = "; ".join(notas)
-
-            # Agregar fila al DataFrame
-            new_row = {
-                "ISBN": isbn,
-                "Congruencia del ISBN": congruencia_isbn,
-                "Aparición en Reporte": report_appears,
-                "Aparición en Factura": factura_appears,
-                "Congruencia de cantidad": congruencia_cantidad,
-                "Congruencia de PNT": congruencia_pnt,
-                "Notas": notas_concatenadas
-            }
-            df_TotalAnalisis = pd.concat([df_TotalAnalisis, pd.DataFrame([new_row])], ignore_index=True)
-
-        return df_TotalAnalisis
+
+        return conciliar(
+            df_geslib, df_csv,
+            col_cantidad_reporte=cnt_column,
+            col_isbn_factura=self.combo_isbn.currentText(),
+            col_cantidad_factura=self.combo_cantidad.currentText(),
+            col_pnt_factura=self.combo_precio.currentText()
+        )
 
     def mostrar_resultado(self, df):
         """
@@ -429,15 +345,7 @@ class AnalizadorCorteGeslib(QDialog):
         layout = QVBoxLayout()
         result_dialog.setLayout(layout)
 
-        table = QTableWidget()
-        table.setRowCount(df.shape[0])
-        table.setColumnCount(df.shape[1])
-        table.setHorizontalHeaderLabels(df.columns)
-
-        for i in range(df.shape[0]):
-            for j in range(df.shape[1]):
-                table.setItem(i, j, QTableWidgetItem(str(df.iat[i, j])))
-
+        table = TablaDataFrame(df)
         table.resizeColumnsToContents()
         table.resizeRowsToContents()
         layout.addWidget(table)
@@ -471,23 +379,7 @@ class AnalizadorCorteGeslib(QDialog):
         result_dialog.setLayout(layout)
 
         # Crear la tabla
-        table = QTableWidget()
-        table.setRowCount(df.shape[0])
-        table.setColumnCount(df.shape[1])
-        table.setHorizontalHeaderLabels([
-            "ISBN",
-            "Congruencia del ISBN",
-            "Aparición en Reporte",
-            "Aparición en Factura",
-            "Congruencia de cantidad",
-            "Congruencia de PNT",
-            "Notas"
-        ])
-
-        # Llenar la tabla con los datos del DataFrame
-        for i in range(df.shape[0]):
-            for j in range(df.shape[1]):
-                table.setItem(i, j, QTableWidgetItem(str(df.iat[i, j])))
+        table = TablaDataFrame(df)
 
         # Ajustar el ancho de las columnas según el contenido más largo
         table.resizeColumnsToContents()
@@ -501,27 +393,6 @@ class AnalizadorCorteGeslib(QDialog):
         # Mostrar la ventana
         result_dialog.exec_()
 
-    def limpiar_y_formatear_numero(self, valor):
-        """
-        Limpia y formatea un valor numérico para asegurar un formato estándar.
-        Ejemplo: 000000.0000
-        """
-        try:
-            # Eliminar caracteres no numéricos excepto el punto decimal
-            valor_limpio = re.sub(r'[^0-9.]', '', str(valor))
-            
-            # Convertir a float
-            numero = float(valor_limpio)
-            
-            print(f"Se ejecuto limpiar y formatear numero en {valor_limpio}, se obtuvo {numero}")
-
-            # Formatear con 4 decimales
-            return f"{numero:.4f}"
-        except ValueError:
-            # Si no se puede convertir, registrar el error y devolver un valor predeterminado
-            print(f"Error al limpiar y formatear el valor: '{valor}'")
-            return "0.0000"
-        
     def procesar_cantidad(self, valor):
         """
         Procesa el valor de la columna "cantidad" para asegurar que tenga el formato correcto.
@@ -1,6 +1,8 @@
+import io
 import os
 import re
 import sys
+import tempfile
 import camelot
 import pdfplumber
 import ollama
@@ -11,21 +13,40 @@ import subprocess
 from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog,
                              QTableWidget, QTableWidgetItem, QSpinBox, QListWidget, QLabel,
                              QMessageBox, QLineEdit, QComboBox, QListWidgetItem, QDialog, QInputDialog,
-                             QTextEdit, QProgressDialog)
-from PyQt5.QtCore import Qt
+                             QTextEdit, QProgressDialog, QCheckBox)
+from PyQt5.QtCore import Qt, QTimer
 from app.models.database import ConcesionesDB
+from app.models.extraccion_pdf import (TAM_LOTE, CacheExtracciones, ExtraccionPaginas, aplicar_filtros, contar_paginas,
+                                       huella_pdf, insertar_por_pagina, mascara_filas, paginas_con_vecinas)
+from app.views.components.pandas_model import TablaDataFrame
+
+
+# Milisegundos sin cambios en los filtros antes de actualizar la vista previa
+RETARDO_FILTRO_MS = 150
 
 
 class PdfTableExtractor(QDialog):
     def __init__(self):
         super().__init__()
         self.tables = []  # Lista de todas las tablas extraídas del PDF
-        self.selected_tables = []  # Lista de tablas seleccionadas por el usuario
+        self.selected_tables = []  # Posiciones en self.tables de las tablas seleccionadas por el usuario
         self.current_page = None  # Página actual seleccionada
-        self.temp_csv_path = "temp_combined_table.csv"  # Ruta del archivo CSV temporal
-        self.filters = {}  # Diccionario para guardar los filtros por tabla
+        self.combined_df = None  # Última tabla combinada
+        self.temp_dir = None  # Directorio temporal con los PDF exportados de la base (camelot pide una ruta)
+        self.filters = {}  # Filtros guardados por posición de la tabla en self.tables
         self.is_load_pdf_enabled = True 
+        self.extracciones = []  # Extracciones en curso (ExtraccionPaginas)
+        self.progreso_extraccion = None
+        self.pdf_path = None
+        self.pdf_sha256 = None  # Huella del PDF cargado, clave de la caché de extracciones
+        self.paginas_en_cache = None  # Páginas que cubre la entrada de la caché (None: no hay entrada)
+        self.num_pages = 0
+        self.paginas_extraidas = set()  # Páginas ya analizadas, tengan o no tablas
+        self.paginas_pendientes = set()  # Páginas enviadas a una extracción en curso
+        self.lazy_extraction = False  # Solo se extraen las hojas que se consultan
+        self.filtered_columns = None  # (tabla, columnas) que muestra filtered_table
         self.db = ConcesionesDB()
+        self.cache = CacheExtracciones(self.db)
         self.initUI()
 
         # Verificar si Ollama y Mistral están instalados
@@ -54,6 +75,11 @@ class PdfTableExtractor(QDialog):
         self.btn_load.clicked.connect(self.load_pdf_options)
         self.update_load_pdf_button_state()  # Actualizar estado inicial del botón
         control_layout.addWidget(self.btn_load)
+
+        # Modo por hoja: camelot solo analiza la hoja seleccionada y sus vecinas
+        self.lazy_mode_checkbox = QCheckBox('Extraer solo las hojas consultadas', self)
+        self.lazy_mode_checkbox.setChecked(True)
+        control_layout.addWidget(self.lazy_mode_checkbox)
         
         # Sección de filtros
         control_layout.addWidget(QLabel('Filtros:'))
@@ -70,27 +96,34 @@ class PdfTableExtractor(QDialog):
         self.table_selector.itemClicked.connect(self.show_table)
         control_layout.addWidget(self.table_selector)
         
+        # Los cambios en los filtros se agrupan: la vista previa se actualiza
+        # una sola vez cuando dejan de llegar durante RETARDO_FILTRO_MS
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(RETARDO_FILTRO_MS)
+        self.filter_timer.timeout.connect(self.update_filtered_table)
+
         # Controles de filas
         control_layout.addWidget(QLabel('Fila inicial:'))
         self.spin_start = QSpinBox()
-        self.spin_start.valueChanged.connect(self.update_filtered_table)
+        self.spin_start.valueChanged.connect(self.filter_timer.start)
         control_layout.addWidget(self.spin_start)
         control_layout.addWidget(QLabel('Fila final:'))
         self.spin_end = QSpinBox()
-        self.spin_end.valueChanged.connect(self.update_filtered_table)
+        self.spin_end.valueChanged.connect(self.filter_timer.start)
         control_layout.addWidget(self.spin_end)
         
         # Filas a eliminar
         control_layout.addWidget(QLabel('Filas a eliminar (ej. 7,10,11):'))
         self.exclude_rows_input = QLineEdit()
         self.exclude_rows_input.setPlaceholderText("Ejemplo: 7,10,11")
-        self.exclude_rows_input.textChanged.connect(self.update_filtered_table)
+        self.exclude_rows_input.textChanged.connect(self.filter_timer.start)
         control_layout.addWidget(self.exclude_rows_input)
         
         # Lista de columnas
         control_layout.addWidget(QLabel('Columnas:'))
         self.column_list = QListWidget()
-        self.column_list.itemChanged.connect(self.update_filtered_table)
+        self.column_list.itemChanged.connect(self.filter_timer.start)
         control_layout.addWidget(self.column_list)
         
         # Botón para guardar cambios a la tabla seleccionada
@@ -125,11 +158,18 @@ class PdfTableExtractor(QDialog):
         self.btn_finalize_union.clicked.connect(self.finalize_union)
         self.btn_finalize_union.setEnabled(False)  # Deshabilitado inicialmente
         right_layout.addWidget(self.btn_finalize_union)
+
+        # Botón 5: Importar la tabla final como productos de una concesión
+        self.btn_import_products = QPushButton('5. Importar Productos a una Concesión', self)
+        self.btn_import_products.clicked.connect(self.import_products_to_concesion)
+        self.btn_import_products.setEnabled(False)  # Se habilita al combinar las tablas
+        right_layout.addWidget(self.btn_import_products)
         
         # Tablas
         table_layout = QVBoxLayout()
-        self.original_table = QTableWidget()
-        self.filtered_table = QTableWidget()
+        # Sin orden por columnas: los números de fila se usan para excluir filas
+        self.original_table = TablaDataFrame(ordenable=False)
+        self.filtered_table = TablaDataFrame(ordenable=False)
         table_layout.addWidget(QLabel('Tabla Original:'))
         table_layout.addWidget(self.original_table)
         table_layout.addWidget(QLabel('Tabla Filtrada:'))
@@ -140,26 +180,12 @@ class PdfTableExtractor(QDialog):
         self.setLayout(main_layout)
 
         self.setAttribute(Qt.WA_DeleteOnClose)
-        self.destroyed.connect(self.eliminar_archivos_temporales)
 
     def load_pdf(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Seleccionar PDF", "", "PDF Files (*.pdf)")
         if file_path:
-            try:
-                # Leer todas las tablas de todas las páginas
-                self.tables = camelot.read_pdf(file_path, flavor='stream', pages='all')
-                if self.tables:
-                    self.page_selector.clear()
-                    pages = sorted(set(table.page for table in self.tables))
-                    for page in pages:
-                        self.page_selector.addItem(f"Hoja {page}")
-                    self.current_page = pages[0]
-                    self.update_table_selector()
-                else:
-                    QMessageBox.warning(self, "Error", "No se encontraron tablas en el PDF")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error al procesar PDF: {str(e)}")
+            self.load_pdf_from_path(file_path)
 
     def set_load_pdf_enabled(self, enabled):
         """
@@ -176,26 +202,40 @@ class PdfTableExtractor(QDialog):
         self.btn_load.setEnabled(self.is_load_pdf_enabled)
 
     def update_table_selector(self):
-        selected_page = int(self.page_selector.currentText().split(" ")[1])
+        selected_page = self.page_selector.currentData()
+        if selected_page is None:
+            return
         self.current_page = selected_page
         self.table_selector.clear()
         for i, table in enumerate(self.tables):
             if table.page == selected_page:
-                self.table_selector.addItem(f"Tabla {i + 1}")
+                item = QListWidgetItem(f"Tabla {i + 1}")
+                item.setData(Qt.UserRole, i)  # Posición de la tabla en self.tables
+                self.table_selector.addItem(item)
+
+        if self.lazy_extraction and self.table_selector.count() == 0:
+            if selected_page in self.paginas_extraidas:
+                mensaje = "No se encontraron tablas en esta hoja"
+            else:
+                mensaje = f"Extrayendo hoja {selected_page}..."
+            item = QListWidgetItem(mensaje)
+            item.setFlags(Qt.NoItemFlags)
+            self.table_selector.addItem(item)
+        if self.lazy_extraction:
+            self.extract_pages_around(selected_page)
+
+    def selected_table_index(self):
+        """Posición en self.tables de la tabla seleccionada, o -1"""
+        item = self.table_selector.currentItem()
+        return item.data(Qt.UserRole) if item is not None else -1
 
     def show_table(self, item):
-        table_index = self.table_selector.row(item)
-        table = self.tables[table_index]
-        self.show_table_data(table)
+        self.show_table_data(item.data(Qt.UserRole))
 
-    def show_table_data(self, table):
-        df = table.df
+    def show_table_data(self, table_index):
+        df = self.tables[table_index].df
         # Configurar tabla original
-        self.original_table.setRowCount(df.shape[0])
-        self.original_table.setColumnCount(df.shape[1])
-        for i in range(df.shape[0]):
-            for j in range(df.shape[1]):
-                self.original_table.setItem(i, j, QTableWidgetItem(df.iloc[i, j]))
+        self.original_table.mostrar(df)
         
         # Configurar controles
         self.spin_start.setMaximum(df.shape[0])
@@ -209,9 +249,8 @@ class PdfTableExtractor(QDialog):
             self.column_list.addItem(item)
         
         # Aplicar filtros guardados si existen
-        table_id = id(table)
-        if table_id in self.filters:
-            filters = self.filters[table_id]
+        if table_index in self.filters:
+            filters = self.filters[table_index]
             self.spin_start.setValue(filters['start_row'])
             self.spin_end.setValue(filters['end_row'])
             self.exclude_rows_input.setText(",".join(map(str, filters['exclude_rows'])))
@@ -220,13 +259,9 @@ class PdfTableExtractor(QDialog):
         
         self.update_filtered_table()
 
-    def update_filtered_table(self):
-        table_index = self.table_selector.currentRow()
-        if table_index < 0 or table_index >= len(self.tables):
-            return
-        
-        table = self.tables[table_index]
-        df = table.df
+    def current_filters(self, table_index):
+        """Filtros que indican los controles para la tabla dada (filas desde 0)"""
+        df = self.tables[table_index].df
         max_rows = df.shape[0]
         start_row = min(self.spin_start.value(), max_rows)
         end_row = min(self.spin_end.value(), max_rows)
@@ -240,51 +275,44 @@ class PdfTableExtractor(QDialog):
             exclude_rows = [row for row in exclude_rows if row >= 0 and row < max_rows]
         except ValueError:
             QMessageBox.warning(self, "Advertencia", "Las filas excluidas deben ser números separados por comas.")
-        
-        try:
-            filtered_df = df.iloc[start_row:end_row, selected_columns]
-            rows_to_keep = [i for i in range(filtered_df.shape[0]) if i + start_row not in exclude_rows]
-            filtered_df = filtered_df.iloc[rows_to_keep]
-            
-            # Mostrar la tabla filtrada
-            self.filtered_table.setRowCount(filtered_df.shape[0])
-            self.filtered_table.setColumnCount(filtered_df.shape[1])
-            for i in range(filtered_df.shape[0]):
-                for j in range(filtered_df.shape[1]):
-                    self.filtered_table.setItem(i, j, QTableWidgetItem(filtered_df.iloc[i, j]))
-        except IndexError as e:
-            QMessageBox.critical(self, "Error", f"Error al filtrar la tabla: {str(e)}")
+        return {
+            'start_row': start_row,
+            'end_row': end_row,
+            'exclude_rows': exclude_rows,
+            'selected_columns': selected_columns
+        }
+
+    def update_filtered_table(self):
+        self.filter_timer.stop()  # Ya se aplican los cambios pendientes
+        table_index = self.selected_table_index()
+        if table_index < 0 or table_index >= len(self.tables):
+            return
+
+        df = self.tables[table_index].df
+        filters = self.current_filters(table_index)
+        # El modelo solo se reemplaza si cambian las columnas; las filas se
+        # filtran con una máscara en el proxy, sin copiar el DataFrame. Las
+        # filas conservan su número original, el que se usa para excluirlas.
+        columns = (table_index, tuple(filters['selected_columns']))
+        if columns != self.filtered_columns:
+            self.filtered_table.mostrar(df.iloc[:, filters['selected_columns']])
+            self.filtered_columns = columns
+        self.filtered_table.proxy.establecer_mascara(
+            mascara_filas(len(df), filters['start_row'], filters['end_row'], filters['exclude_rows']))
 
     def save_table_filters(self):
-        table_index = self.table_selector.currentRow()
+        table_index = self.selected_table_index()
         if table_index < 0 or table_index >= len(self.tables):
             QMessageBox.warning(self, "Advertencia", "No hay una tabla seleccionada para guardar cambios.")
             return
-        
-        table = self.tables[table_index]
-        table_id = id(table)
-        df = table.df
-        max_rows = df.shape[0]
-        start_row = min(self.spin_start.value(), max_rows)
-        end_row = min(self.spin_end.value(), max_rows)
-        selected_columns = [i for i in range(self.column_list.count())
-                            if self.column_list.item(i).checkState() == Qt.Checked]
-        max_columns = df.shape[1]
-        selected_columns = [col for col in selected_columns if col < max_columns]
-        exclude_rows = []
-        try:
-            exclude_rows = [int(row.strip()) - 1 for row in self.exclude_rows_input.text().split(",") if row.strip()]
-            exclude_rows = [row for row in exclude_rows if row >= 0 and row < max_rows]
-        except ValueError:
-            QMessageBox.warning(self, "Advertencia", "Las filas excluidas deben ser números separados por comas.")
-        
+
         # Guardar los filtros aplicados
-        self.filters[table_id] = {
-            'start_row': start_row,
-            'end_row': end_row,
-            'exclude_rows': exclude_rows,
-            'selected_columns': selected_columns
-        }
+        self.filters[table_index] = self.current_filters(table_index)
+        # Los filtros sobreviven al cierre del diálogo aunque falten páginas
+        # por extraer; si la entrada no existe (o se desalojó) se guarda completa
+        if self.paginas_en_cache is None or not self.cache.guardar_filtros(self.pdf_sha256, self.filters):
+            self.paginas_en_cache = None
+            self.guardar_en_cache()
         QMessageBox.information(self, "Éxito", "Cambios guardados correctamente.")
 
     def select_tables_to_combine(self):
@@ -311,7 +339,7 @@ class PdfTableExtractor(QDialog):
             self.selected_tables = []
             for i in range(list_widget.count()):
                 if list_widget.item(i).checkState() == Qt.Checked:
-                    self.selected_tables.append(self.tables[i])
+                    self.selected_tables.append(i)
             # Habilitar botones relacionados con la combinación
             self.btn_combine_tables.setEnabled(True)
             self.btn_preview_final.setEnabled(True)
@@ -323,59 +351,35 @@ class PdfTableExtractor(QDialog):
             return
         
         # Verificar que todas las tablas tengan el mismo número de columnas
-        num_columns = self.selected_tables[0].df.shape[1]
-        for table in self.selected_tables:
-            if table.df.shape[1] != num_columns:
+        num_columns = self.tables[self.selected_tables[0]].df.shape[1]
+        for table_index in self.selected_tables:
+            if self.tables[table_index].df.shape[1] != num_columns:
                 QMessageBox.warning(self, "Advertencia", "No todas las tablas tienen el mismo número de columnas.")
                 return
         
         # Aplicar filtros a las tablas seleccionadas
-        combined_dfs = []
-        for table in self.selected_tables:
-            table_id = id(table)
-            df = table.df
-            if table_id in self.filters:
-                filters = self.filters[table_id]
-                start_row = filters['start_row']
-                end_row = filters['end_row']
-                exclude_rows = filters['exclude_rows']
-                selected_columns = filters['selected_columns']
-                
-                filtered_df = df.iloc[start_row:end_row, selected_columns]
-                rows_to_keep = [i for i in range(filtered_df.shape[0]) if i + start_row not in exclude_rows]
-                filtered_df = filtered_df.iloc[rows_to_keep]
-            else:
-                filtered_df = df
-            
-            combined_dfs.append(filtered_df)
+        combined_dfs = [aplicar_filtros(self.tables[table_index].df, self.filters.get(table_index))
+                        for table_index in self.selected_tables]
         
         # Combinar las tablas usando pd.concat()
         combined_df = pd.concat(combined_dfs, ignore_index=True)
         
-        # Guardar la tabla combinada en un archivo CSV temporal
-        combined_df.to_csv(self.temp_csv_path, index=False)
-        QMessageBox.information(self, "Éxito", "Tablas combinadas y guardadas en un archivo temporal.")
+        self.combined_df = combined_df
+        self.btn_import_products.setEnabled(True)
+        QMessageBox.information(self, "Éxito", "Tablas combinadas correctamente.")
 
     def preview_final_table(self):
-        if not os.path.exists(self.temp_csv_path):
+        if self.combined_df is None:
             QMessageBox.warning(self, "Advertencia", "No hay una tabla final para previsualizar.")
             return
-        
-        # Cargar el archivo CSV temporal
-        combined_df = pd.read_csv(self.temp_csv_path)
+        combined_df = self.combined_df
         
         # Mostrar la tabla en una nueva ventana
         preview_dialog = QDialog(self)
         preview_dialog.setWindowTitle("Previsualización de la Tabla Final")
         layout = QVBoxLayout()
         
-        table_widget = QTableWidget()
-        table_widget.setRowCount(combined_df.shape[0])
-        table_widget.setColumnCount(combined_df.shape[1])
-        for i in range(combined_df.shape[0]):
-            for j in range(combined_df.shape[1]):
-                table_widget.setItem(i, j, QTableWidgetItem(str(combined_df.iloc[i, j])))
-        
+        table_widget = TablaDataFrame(combined_df)
         layout.addWidget(table_widget)
         
         btn_close = QPushButton("Listo")
@@ -386,7 +390,7 @@ class PdfTableExtractor(QDialog):
         preview_dialog.exec_()
 
     def finalize_union(self):
-        if not os.path.exists(self.temp_csv_path):
+        if self.combined_df is None:
             QMessageBox.warning(self, "Advertencia", "No hay una tabla final para finalizar.")
             return
 
@@ -412,57 +416,132 @@ class PdfTableExtractor(QDialog):
             # Guardar en el sistema de archivos
             save_path, _ = QFileDialog.getSaveFileName(self, "Guardar Tabla Final", "", "CSV Files (*.csv)")
             if save_path:
-                os.rename(self.temp_csv_path, save_path)
+                self.combined_df.to_csv(save_path, index=False)
                 QMessageBox.information(self, "Éxito", "Tabla final guardada correctamente en el sistema de archivos.")
             else:
-                QMessageBox.warning(self, "Advertencia", "Guardado cancelado. El archivo temporal permanece intacto.")
+                QMessageBox.warning(self, "Advertencia", "Guardado cancelado. La tabla combinada se conserva.")
         else:
             # Guardar en una concesión
             if choice.startswith("Guardar en la concesión actual"):
                 concesion_id = self.selected_concesion_id
             else:
                 # Permitir al usuario seleccionar una concesión
-                concesiones = self.db.obtener_concesiones_no_finalizadas_con_emisor()
-                if not concesiones:
-                    QMessageBox.warning(self, "Advertencia", "No hay concesiones disponibles para guardar.")
-                    return
-
-                dialog = QDialog(self)
-                dialog.setWindowTitle("Seleccionar Concesión")
-                layout = QVBoxLayout()
-
-                list_widget = QListWidget()
-                for concesion in concesiones:
-                    item = QListWidgetItem(f"{concesion['nombre_emisor']} - Folio: {concesion['folio']}")
-                    item.setData(Qt.UserRole, concesion['id'])  # Almacenar el ID de la concesión
-                    list_widget.addItem(item)
-
-                layout.addWidget(list_widget)
-                btn_ok = QPushButton("Aceptar")
-                btn_ok.clicked.connect(dialog.accept)
-                layout.addWidget(btn_ok)
-                dialog.setLayout(layout)
-
-                if dialog.exec_():
-                    selected_item = list_widget.currentItem()
-                    if selected_item:
-                        concesion_id = selected_item.data(Qt.UserRole)
-                    else:
-                        QMessageBox.warning(self, "Advertencia", "No se seleccionó ninguna concesión.")
-                        return
-                else:
-                    QMessageBox.warning(self, "Advertencia", "Selección de concesión cancelada.")
+                concesion_id = self.select_target_concesion()
+                if concesion_id is None:
                     return
 
-            # Guardar el archivo CSV en la base de datos
+            # Guardar la tabla como CSV en la base de datos, desde memoria
             try:
-                self.db.crear_documento(concesion_id, "tabla_final.csv", "CSV", self.temp_csv_path)
+                contenido = io.BytesIO(self.combined_df.to_csv(index=False).encode('utf-8'))
+                self.db.crear_documento_desde_flujo(concesion_id, "tabla_final.csv", "CSV", contenido)
                 QMessageBox.information(self, "Éxito", "Tabla final guardada correctamente en la concesión.")
-                self.eliminar_archivos_temporales()
                 self.close()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error al guardar el documento en la base de datos: {str(e)}")
 
+    def select_target_concesion(self):
+        """Pide al usuario una concesión no finalizada. Devuelve su ID o None si se cancela."""
+        concesiones = self.db.obtener_concesiones_no_finalizadas_con_emisor()
+        if not concesiones:
+            QMessageBox.warning(self, "Advertencia", "No hay concesiones disponibles para guardar.")
+            return None
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Seleccionar Concesión")
+        layout = QVBoxLayout()
+
+        list_widget = QListWidget()
+        for concesion in concesiones:
+            item = QListWidgetItem(f"{concesion['nombre_emisor']} - Folio: {concesion['folio']}")
+            item.setData(Qt.UserRole, concesion['id'])  # Almacenar el ID de la concesión
+            list_widget.addItem(item)
+
+        layout.addWidget(list_widget)
+        btn_ok = QPushButton("Aceptar")
+        btn_ok.clicked.connect(dialog.accept)
+        layout.addWidget(btn_ok)
+        dialog.setLayout(layout)
+
+        if not dialog.exec_():
+            QMessageBox.warning(self, "Advertencia", "Selección de concesión cancelada.")
+            return None
+        selected_item = list_widget.currentItem()
+        if not selected_item:
+            QMessageBox.warning(self, "Advertencia", "No se seleccionó ninguna concesión.")
+            return None
+        return selected_item.data(Qt.UserRole)
+
+    def select_product_columns(self, df):
+        """
+        Pide al usuario qué columna de df corresponde a cada campo de Productos.
+        Devuelve un diccionario {campo: columna} o None si se cancela.
+        """
+        campos = [
+            ('cantidad', "Columna Cantidad:", True),
+            ('descripcion', "Columna Descripción:", True),
+            ('isbn', "Columna ISBN:", False),
+            ('pvp_unitario', "Columna PVP unitario:", False),
+            ('precio_neto', "Columna Precio neto:", True),
+        ]
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Columnas de los productos")
+        layout = QVBoxLayout()
+
+        combos = {}
+        for campo, etiqueta, requerido in campos:
+            combo = QComboBox()
+            if not requerido:
+                combo.addItem("(ninguna)", None)
+            for col in df.columns:
+                combo.addItem(str(col), col)
+            pair_layout = QHBoxLayout()
+            pair_layout.addWidget(QLabel(etiqueta))
+            pair_layout.addWidget(combo)
+            layout.addLayout(pair_layout)
+            combos[campo] = combo
+
+        btn_ok = QPushButton("Aceptar")
+        btn_ok.clicked.connect(dialog.accept)
+        layout.addWidget(btn_ok)
+        dialog.setLayout(layout)
+
+        if not dialog.exec_():
+            return None
+        return {campo: combo.currentData() for campo, combo in combos.items()
+                if combo.currentData() is not None}
+
+    def import_products_to_concesion(self):
+        """Importa la tabla combinada como productos de una concesión en una sola transacción"""
+        if self.combined_df is None:
+            QMessageBox.warning(self, "Advertencia", "Primero combine las tablas seleccionadas.")
+            return
+
+        if hasattr(self, 'selected_concesion_id'):
+            concesion_id = self.selected_concesion_id
+        else:
+            concesion_id = self.select_target_concesion()
+            if concesion_id is None:
+                return
+
+        columnas = self.select_product_columns(self.combined_df)
+        if columnas is None:
+            return
+        filas = pd.DataFrame({campo: self.combined_df[col] for campo, col in columnas.items()})
+
+        try:
+            insertados, descartadas = self.db.importar_productos(concesion_id, filas)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error al importar los productos: {str(e)}")
+            return
+
+        mensaje = f"Se importaron {insertados} productos a la concesión."
+        if len(descartadas):
+            filas_descartadas = ", ".join(str(i + 1) for i in descartadas.index[:20])
+            if len(descartadas) > 20:
+                filas_descartadas += ", ..."
+            mensaje += f"\nSe descartaron {len(descartadas)} filas no válidas (filas {filas_descartadas})."
+        QMessageBox.information(self, "Importación de productos", mensaje)
+
     def load_pdf_options(self):
         """Muestra un cuadro de diálogo para elegir entre cargar PDF de una concesión o desde archivos del usuario"""
         options = ["Cargar PDF de una concesión", "Cargar PDF desde archivos del usuario"]
@@ -525,14 +604,35 @@ class PdfTableExtractor(QDialog):
                 if doc_dialog.exec_():
                     selected_doc = doc_list_widget.currentItem()
                     if selected_doc:
-                        doc_id = selected_doc.data(Qt.UserRole)
-                        documento = self.db.obtener_documento_por_id(doc_id)
-                        if documento:
-                            # Guardar el contenido del documento en un archivo temporal
-                            temp_pdf_path = f"temp_{documento['nombre']}.pdf"
-                            with open(temp_pdf_path, 'wb') as f:
-                                f.write(documento['contenido'])
-                            self.load_pdf_from_path(temp_pdf_path)
+                        self.load_pdf_from_document(selected_doc.data(Qt.UserRole))
+
+    def load_pdf_from_document(self, doc_id):
+        """
+        Carga un PDF guardado en la base. Su huella ya está en Documentos, así
+        que si se extrajo antes las tablas salen de la caché.
+        """
+        documento = self.db.obtener_metadatos_documento(doc_id)
+        if not documento:
+            QMessageBox.warning(self, "Error", "No se pudo encontrar el documento seleccionado.")
+            return
+        try:
+            file_path = self.export_document_to_temp(doc_id)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"No se pudo exportar el documento: {str(e)}")
+            return
+        self.load_pdf_from_path(file_path, documento['sha256'])
+
+    def export_document_to_temp(self, doc_id):
+        """
+        Escribe el documento en el directorio temporal del extractor, que se
+        borra al cerrar el diálogo. Devuelve la ruta.
+        """
+        if self.temp_dir is None:
+            self.temp_dir = tempfile.TemporaryDirectory(prefix='extractor_pdf_', ignore_cleanup_errors=True)
+        file_path = os.path.join(self.temp_dir.name, f"documento_{doc_id}.pdf")
+        if not os.path.exists(file_path):
+            self.db.exportar_documento(doc_id, file_path)
+        return file_path
 
     def load_pdf_from_file(self):
         """Carga un PDF desde archivos del usuario"""
@@ -541,38 +641,196 @@ class PdfTableExtractor(QDialog):
         if file_path:
             self.load_pdf_from_path(file_path)
 
-    def load_pdf_from_path(self, file_path):
-        """Carga un PDF desde una ruta específica"""
+    def load_pdf_from_path(self, file_path, sha256=None):
+        """
+        Carga un PDF desde una ruta específica. Si el mismo contenido ya se
+        extrajo antes, las tablas, filtros y páginas analizadas salen de la
+        caché y solo se extraen las páginas que falten. En el modo por hoja se
+        listan todas las hojas y solo se extrae la que se consulta (y sus
+        vecinas); en el modo completo las páginas se analizan en varios
+        procesos y las hojas aparecen conforme terminan.
+        :param sha256: Huella del contenido si ya se conoce (documentos guardados).
+        """
+        self.cancelar_extraccion()
+        self.tables = []
+        self.filters = {}
+        self.selected_tables = []
+        self.current_page = None
+        self.paginas_extraidas = set()
+        self.lazy_extraction = False
+        self.paginas_en_cache = None
+        self.filtered_columns = None
+        self.page_selector.clear()
+        self.table_selector.clear()
         try:
-            # Leer todas las tablas de todas las páginas
-            self.tables = camelot.read_pdf(file_path, flavor='stream', pages='all')
-            if self.tables:
-                self.page_selector.clear()
-                pages = sorted(set(table.page for table in self.tables))
-                for page in pages:
-                    self.page_selector.addItem(f"Hoja {page}")
-                self.current_page = pages[0]
-                self.update_table_selector()
-            else:
-                QMessageBox.warning(self, "Error", "No se encontraron tablas en el PDF")
+            self.pdf_sha256 = sha256 or huella_pdf(file_path)
+            self.num_pages = contar_paginas(file_path)
+            guardado = self.cache.obtener(self.pdf_sha256)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error al procesar PDF: {str(e)}")
-            
+            return
+        self.pdf_path = file_path
+
+        self.page_selector.blockSignals(True)
+        if guardado is not None:
+            # Las tablas de la caché ya están en orden de página y los filtros
+            # se guardaron por su posición
+            self.tables, self.filters, paginas = guardado
+            self.paginas_extraidas = paginas if paginas is not None else set(range(1, self.num_pages + 1))
+            self.paginas_en_cache = set(self.paginas_extraidas)
+            for page in sorted(set(table.page for table in self.tables)):
+                self.add_page_item(page)
+        missing_pages = [page for page in range(1, self.num_pages + 1) if page not in self.paginas_extraidas]
+
+        if missing_pages and self.lazy_mode_checkbox.isChecked():
+            # Todas las hojas aparecen de inmediato; update_table_selector
+            # extrae la seleccionada y sus vecinas
+            self.lazy_extraction = True
+            for page in range(1, self.num_pages + 1):
+                self.add_page_item(page)
+        self.page_selector.blockSignals(False)
+        self.update_table_selector()
+        if not missing_pages or self.lazy_extraction:
+            return
+
+        self.progreso_extraccion = QProgressDialog("Extrayendo tablas del PDF...", "Cancelar", 0, len(missing_pages), self)
+        self.progreso_extraccion.setWindowTitle("Procesando...")
+        self.progreso_extraccion.setMinimumDuration(0)
+        self.progreso_extraccion.canceled.connect(self.cancelar_extraccion)
+        extraccion = self.start_extraction(missing_pages)
+        extraccion.progreso.connect(self.progreso_extraccion.setValue)
+
+    def extract_pages_around(self, page):
+        """Extrae en segundo plano la hoja dada y sus vecinas que aún no se han analizado"""
+        pages = [p for p in paginas_con_vecinas(page, self.num_pages)
+                 if p not in self.paginas_extraidas and p not in self.paginas_pendientes]
+        if pages:
+            # Lotes de una página: la seleccionada se entrega sin esperar a las vecinas
+            self.start_extraction(pages, batch_size=1)
+
+    def start_extraction(self, pages, batch_size=TAM_LOTE):
+        extraccion = ExtraccionPaginas(self.pdf_path, pages, tam_lote=batch_size, parent=self)
+        self.paginas_pendientes.update(extraccion.paginas)
+        extraccion.tablas.connect(self.add_extracted_tables)
+        extraccion.analizadas.connect(self.pages_extracted)
+        extraccion.terminado.connect(lambda: self.extraction_finished(extraccion))
+        extraccion.fallido.connect(lambda error: self.extraction_failed(extraccion, error))
+        self.extracciones.append(extraccion)
+        extraccion.iniciar()
+        return extraccion
+
+    def is_stale_signal(self):
+        """True si la señal viene de una extracción cancelada (p. ej. de un PDF anterior)"""
+        sender = self.sender()
+        return sender is not None and sender not in self.extracciones
+
+    def add_extracted_tables(self, tables):
+        """Agrega las tablas de las páginas que ya terminaron, en orden de página"""
+        if self.is_stale_signal():
+            return
+        self.tables, positions = insertar_por_pagina(self.tables, tables)
+        if positions != list(range(len(positions))):
+            self.renumber_tables(positions)
+        for page in sorted(set(table.page for table in tables)):
+            self.add_page_item(page)
+
+    def renumber_tables(self, positions):
+        """
+        Actualiza lo que se guarda por posición en self.tables después de
+        insertar tablas antes de otras; positions[i] es la nueva posición de
+        la tabla que estaba en i.
+        """
+        self.filters = {positions[i]: filters for i, filters in self.filters.items()}
+        self.selected_tables = [positions[i] for i in self.selected_tables]
+        if self.filtered_columns is not None:
+            self.filtered_columns = (positions[self.filtered_columns[0]], self.filtered_columns[1])
+        # Las tablas que se ven conservan la selección con su nuevo número
+        for row in range(self.table_selector.count()):
+            item = self.table_selector.item(row)
+            table_index = item.data(Qt.UserRole)
+            if table_index is not None:
+                item.setData(Qt.UserRole, positions[table_index])
+                item.setText(f"Tabla {positions[table_index] + 1}")
+
+    def add_page_item(self, page):
+        """Agrega la hoja al selector, en orden, si aún no está"""
+        if self.page_selector.findData(page) >= 0:
+            return
+        row = next((i for i in range(self.page_selector.count()) if self.page_selector.itemData(i) > page),
+                   self.page_selector.count())
+        self.page_selector.insertItem(row, f"Hoja {page}", page)
+
+    def pages_extracted(self, pages):
+        if self.is_stale_signal():
+            return
+        self.paginas_extraidas.update(pages)
+        self.paginas_pendientes.difference_update(pages)
+        if self.current_page in pages:
+            self.update_table_selector()
+        # En el modo por hoja cada página se guarda en cuanto se analiza; en
+        # el completo al terminar, o al cancelar (cancelar_extraccion)
+        if self.lazy_extraction or len(self.paginas_extraidas) == self.num_pages:
+            self.guardar_en_cache()
+
+    def guardar_en_cache(self):
+        """
+        Guarda en la caché las tablas, los filtros y las páginas analizadas
+        del PDF cargado, si hay páginas nuevas desde la última vez.
+        """
+        if (self.pdf_sha256 is None or not self.paginas_extraidas
+                or self.paginas_extraidas == self.paginas_en_cache):
+            return
+        completas = len(self.paginas_extraidas) >= self.num_pages
+        self.cache.guardar(self.pdf_sha256, self.tables, self.filters,
+                           None if completas else self.paginas_extraidas)
+        self.paginas_en_cache = set(self.paginas_extraidas)
+
+    def extraction_finished(self, extraccion):
+        if extraccion not in self.extracciones:
+            return  # Cancelada antes de que llegara la señal
+        self.extracciones.remove(extraccion)
+        if not self.extracciones:
+            self.cerrar_progreso_extraccion()
+        if not self.lazy_extraction and not self.tables:
+            QMessageBox.warning(self, "Error", "No se encontraron tablas en el PDF")
+
+    def extraction_failed(self, extraccion, error):
+        if extraccion not in self.extracciones:
+            return  # Cancelada antes de que llegara la señal
+        self.extracciones.remove(extraccion)
+        self.paginas_pendientes.difference_update(extraccion.paginas)
+        self.cerrar_progreso_extraccion()
+        QMessageBox.critical(self, "Error", f"Error al procesar PDF: {error}")
+
+    def cancelar_extraccion(self):
+        """
+        Detiene las extracciones en curso; las tablas ya recibidas se
+        conservan y se guardan en la caché para no volver a extraerlas.
+        """
+        for extraccion in self.extracciones:
+            extraccion.cancelar()
+        self.extracciones = []
+        self.paginas_pendientes = set()
+        self.cerrar_progreso_extraccion()
+        self.guardar_en_cache()
+
+    def cerrar_progreso_extraccion(self):
+        if self.progreso_extraccion is not None:
+            progreso, self.progreso_extraccion = self.progreso_extraccion, None
+            progreso.canceled.disconnect(self.cancelar_extraccion)
+            progreso.close()
+
+    def done(self, resultado):
+        self.cancelar_extraccion()
+        self.eliminar_archivos_temporales()
+        super().done(resultado)
+
     def eliminar_archivos_temporales(self):
-        """Elimina los archivos temporales generados durante la ejecución"""
-        temp_files = [self.temp_csv_path,
-                      *[f for f in os.listdir('.') if re.match(r'tem_.*\.pdf\.pdf$', f)]
-                      ] 
-         # Agregar aquí otros archivos temporales si los hay
-        for file in temp_files:
-            if os.path.exists(file):
-                try:
-                    os.remove(file)
-                    print(f"Archivo temporal eliminado: {file}")
-                except Exception as e:
-                    print(f"No se pudo eliminar el archivo temporal {file}: {str(e)}")
-
-    # Implementacion de prueba, analisis mediante LLM
+        """Borra el directorio temporal con los PDF exportados de la base"""
+        if self.temp_dir is not None:
+            self.temp_dir.cleanup()
+            self.temp_dir = None
+
     def load_pdf_for_llm(self):
         """Muestra un cuadro de diálogo para elegir entre cargar PDF de una concesión o desde archivos del usuario."""
         options = ["Cargar PDF de una concesión", "Cargar PDF desde archivos del usuario"]
@@ -819,12 +1077,8 @@ class PdfTableExtractor(QDialog):
                     selected_doc = doc_list_widget.currentItem()
                     if selected_doc:
                         doc_id = selected_doc.data(Qt.UserRole)
-                        documento = self.db.obtener_documento_por_id(doc_id)
-                        if documento:
-                            temp_pdf_path = f"temp_{documento['nombre']}.pdf"
-                            with open(temp_pdf_path, 'wb') as f:
-                                f.write(documento['contenido'])
-                            self.process_pdf_with_llm(temp_pdf_path)
+                        if self.db.obtener_metadatos_documento(doc_id):
+                            self.process_pdf_with_llm(self.export_document_to_temp(doc_id))
 
 
     def preview_llm_data(self, extracted_data, raw_response, file_path):
@@ -0,0 +1,47 @@
+"""
+Mide conciliar() con un corte de GESLib y una factura sinteticos, con los
+valores como texto (como llegan de Excel/CSV) y ya numericos.
+
+Uso: python -m benchmarks.bench_conciliacion [num_titulos]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from app.models.conciliacion import conciliar
+
+REPETICIONES = 5
+
+
+def generar(num_titulos):
+    """Reporte y factura que comparten casi todos los ISBN, con algunas diferencias"""
+    rng = np.random.default_rng(0)
+    reporte = pd.DataFrame({
+        'f_articulo': [f"978{i:010d}" for i in range(num_titulos)],
+        'cnt': rng.integers(1, 20, num_titulos),
+        'total': rng.integers(100, 50000, num_titulos) / 100,
+    })
+    factura = reporte.sample(frac=0.98, random_state=0).rename(
+        columns={'f_articulo': 'ISBN', 'cnt': 'Cantidad', 'total': 'PNT'})
+    cambios = factura.sample(frac=0.05, random_state=1).index
+    factura.loc[cambios, 'Cantidad'] += 1
+    return reporte, factura.reset_index(drop=True)
+
+
+def medir(reporte, factura):
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        conciliar(reporte, factura, 'cnt', 'ISBN', 'Cantidad', 'PNT')
+    return (time.perf_counter() - inicio) * 1000 / REPETICIONES
+
+
+def main():
+    num_titulos = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    reporte, factura = generar(num_titulos)
+    print(f"{num_titulos} titulos")
+    print(f"{'valores numericos (ms)':<28}{medir(reporte, factura):>10.1f}")
+    print(f"{'valores como texto (ms)':<28}{medir(reporte.astype(str), factura.astype(str)):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
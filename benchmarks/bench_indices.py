@@ -0,0 +1,109 @@
+"""
+Mide las consultas mas frecuentes de ConcesionesDB sobre una base sintetica
+con 100k productos, primero sin los indices secundarios y despues con ellos.
+
+Uso: python -m benchmarks.bench_indices [num_productos]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from app.models.database import ConcesionesDB, GestorConexiones, _migracion_3_indices
+
+NUM_CONCESIONES = 2000
+REPETICIONES = 200
+
+INDICES = [
+    'idx_documentos_concesion',
+    'idx_documentos_sha256',
+    'idx_productos_concesion',
+    'idx_reportes_concesion',
+    'idx_contacto_emisor',
+    'idx_concesiones_emisor',
+    'idx_concesiones_finalizada_vencimiento',
+    'idx_documento_producto_documento',
+    'idx_documento_producto_producto',
+]
+
+
+def poblar(db, num_productos):
+    """Llena la base con emisores, concesiones, contactos, documentos y productos"""
+    random.seed(0)
+    conn = db.conn
+    conn.executemany(
+        'INSERT INTO grantingEmisor (nombre_emisor, nombre_vendedor) VALUES (?, ?)',
+        [(f"Editorial {i}", f"Vendedor {i}") for i in range(NUM_CONCESIONES // 10)]
+    )
+    conn.executemany(
+        'INSERT INTO Contacto (emisor_id, numero, correo_electronico) VALUES (?, ?, ?)',
+        [(random.randint(1, NUM_CONCESIONES // 10), 5550000 + i, f"c{i}@ejemplo.mx")
+         for i in range(NUM_CONCESIONES)]
+    )
+    conn.executemany(
+        '''INSERT INTO Concesiones (emisor_id, tipo, folio, fecha_recepcion, fecha_vencimiento, finalizada)
+           VALUES (?, 'Factura', ?, '2024-01-01', ?, ?)''',
+        [(random.randint(1, NUM_CONCESIONES // 10), f"F-{i}",
+          f"2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}", int(random.random() < 0.8))
+         for i in range(NUM_CONCESIONES)]
+    )
+    conn.executemany(
+        '''INSERT INTO Documentos (concesion_id, nombre, tipo, tamano, sha256)
+           VALUES (?, ?, 'PDF', 0, NULL)''',
+        [(random.randint(1, NUM_CONCESIONES), f"doc_{i}.pdf") for i in range(NUM_CONCESIONES * 3)]
+    )
+    conn.executemany(
+        '''INSERT INTO Productos (concesion_id, cantidad, descripcion, isbn, pvp_unitario, precio_neto, precio_total)
+           VALUES (?, 1, ?, ?, 100.0, 70.0, 70.0)''',
+        [(random.randint(1, NUM_CONCESIONES), f"Libro {i}", f"978{i:010d}") for i in range(num_productos)]
+    )
+    conn.commit()
+
+
+def medir(db):
+    """Devuelve el tiempo medio en milisegundos de cada consulta"""
+    consultas = {
+        'obtener_productos_por_concesion': lambda i: db.obtener_productos_por_concesion(i),
+        'obtener_documentos': lambda i: db.obtener_documentos(i),
+        'obtener_contactos': lambda i: db.obtener_contactos(i % (NUM_CONCESIONES // 10) + 1),
+        'obtener_reportes_por_concesion': lambda i: db.obtener_reportes_por_concesion(i),
+        'no_finalizadas_con_emisor': lambda i: db.obtener_concesiones_no_finalizadas_con_emisor(),
+    }
+    resultados = {}
+    for nombre, consulta in consultas.items():
+        repeticiones = 20 if nombre == 'no_finalizadas_con_emisor' else REPETICIONES
+        inicio = time.perf_counter()
+        for i in range(repeticiones):
+            consulta(i % NUM_CONCESIONES + 1)
+        resultados[nombre] = (time.perf_counter() - inicio) * 1000 / repeticiones
+    return resultados
+
+
+def main():
+    num_productos = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db = ConcesionesDB(os.path.join(tmp_dir, "bench.db"))
+        poblar(db, num_productos)
+
+        for indice in INDICES:
+            db.conn.execute(f'DROP INDEX IF EXISTS {indice}')
+        db.conn.commit()
+        antes = medir(db)
+
+        _migracion_3_indices(db.conn)
+        db.conn.commit()
+        despues = medir(db)
+
+        print(f"{num_productos} productos, {NUM_CONCESIONES} concesiones")
+        print(f"{'consulta':<34}{'sin indices (ms)':>18}{'con indices (ms)':>18}")
+        for nombre in antes:
+            print(f"{nombre:<34}{antes[nombre]:>18.3f}{despues[nombre]:>18.3f}")
+    finally:
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Mide la normalizacion de ISBN sobre columnas sinteticas (con guiones,
+ya limpias y leidas como float) contra la limpieza valor por valor con
+expresiones regulares que hacian las herramientas de analisis.
+
+Uso: python -m benchmarks.bench_isbn [num_valores]
+"""
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+from app.models import isbn
+
+
+def por_valor(serie):
+    """La limpieza y validacion anteriores, un valor a la vez"""
+    resultado = []
+    for valor in serie:
+        limpio = re.sub(r'[^0-9X]', '', str(valor).upper())
+        resultado.append(limpio if len(limpio) in (10, 13) else None)
+    return resultado
+
+
+def medir(funcion, serie):
+    inicio = time.perf_counter()
+    funcion(serie)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    num_valores = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    numeros = 9780000000000 + np.arange(num_valores)
+    columnas = {
+        'con guiones': pd.Series([f"{n // 10**10}-{n % 10**10:010d}" for n in numeros]),
+        'limpios': pd.Series(numeros.astype(str)),
+        'float': pd.Series(numeros.astype(float)),
+    }
+    print(f"{num_valores} valores")
+    print(f"{'':<14}{'por valor (ms)':>16}{'limpiar (ms)':>14}{'normalizar (ms)':>17}")
+    for nombre, serie in columnas.items():
+        print(f"{nombre:<14}{medir(por_valor, serie):>16.1f}"
+              f"{medir(isbn.limpiar, serie):>14.1f}{medir(isbn.normalizar, serie):>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
+import os
 import unittest
+from unittest import mock
 import pandas as pd
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QDialog
 from app.views.tools.gslibCut_analisis import AnalizadorCorteGeslib
 
 # Crear una aplicación Qt para evitar errores al inicializar QDialog
@@ -109,5 +111,62 @@ class TestGenerarReportes(unittest.TestCase):
         self.analizador.generar_reporte(df_50)
 
 
+class TestCompararTablas(unittest.TestCase):
+    """Carga un reporte GESLib y una factura CSV de prueba y los compara"""
+    DATOS = os.path.join(os.path.dirname(__file__), "mock_data")
+
+    def setUp(self):
+        self.analizador = AnalizadorCorteGeslib()
+
+    def cargar_geslib(self):
+        ruta = os.path.join(self.DATOS, "mock_geslib.xlsx")
+        with mock.patch('app.views.tools.gslibCut_analisis.QFileDialog.getOpenFileName',
+                        return_value=(ruta, "")):
+            self.analizador.cargar_excel()
+
+    def cargar_factura(self):
+        df = pd.read_csv(os.path.join(self.DATOS, "mock_factura.csv"))
+        # Una fila sin ISBN válido, que el filtro debe descartar
+        df.loc[len(df)] = ["sin isbn", 1, 10.0]
+        # procesar_csv solo arma el diálogo de columnas; no se muestra
+        with mock.patch('app.views.tools.gslibCut_analisis.QDialog.exec_', return_value=QDialog.Accepted):
+            self.analizador.procesar_csv(df)
+        self.analizador.combo_isbn.setCurrentText("ISBN")
+        self.analizador.combo_cantidad.setCurrentText("Cantidad")
+        self.analizador.combo_precio.setCurrentText("PNT")
+        self.analizador.filtrar_csv(df, mock.Mock())
+
+    def test_dataframes_conservan_sus_tipos(self):
+        self.cargar_geslib()
+        self.cargar_factura()
+        df_geslib = self.analizador.df_geslib
+        df_csv = self.analizador.df_csv
+        self.assertEqual(list(df_geslib['f_articulo']), ["9783161484100", "9781402894626"])
+        self.assertTrue(pd.api.types.is_numeric_dtype(df_geslib['total']))
+        self.assertTrue(pd.api.types.is_numeric_dtype(df_geslib['cnt_column']))
+        self.assertEqual(len(df_csv), 2)
+        self.assertTrue(pd.api.types.is_integer_dtype(df_csv['Cantidad']))
+        self.assertTrue(pd.api.types.is_float_dtype(df_csv['PNT']))
+
+    def test_comparacion_de_geslib_y_factura(self):
+        self.cargar_geslib()
+        self.cargar_factura()
+        analisis = self.analizador.generar_analisis_congruencia(
+            self.analizador.df_geslib, self.analizador.df_csv).set_index('ISBN')
+        self.assertEqual(sorted(analisis.index), ["9781402894626", "9783161484100"])
+
+        congruente = analisis.loc["9783161484100"]
+        self.assertEqual(congruente['Congruencia del ISBN'], 1)
+        self.assertEqual(congruente['Congruencia de cantidad'], 1)
+        self.assertEqual(congruente['Congruencia de PNT'], 1)
+
+        diferente = analisis.loc["9781402894626"]
+        self.assertEqual(diferente['Congruencia del ISBN'], 1)
+        self.assertEqual(diferente['Congruencia de cantidad'], 0)
+        self.assertEqual(diferente['Congruencia de PNT'], 0)
+        self.assertIn("CR = 10", diferente['Notas'])
+        self.assertIn("CF = 15", diferente['Notas'])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
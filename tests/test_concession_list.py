@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer, Qt
+from app.models.database import ConcesionesDB, GestorConexiones
+from app.views.components.concession_list import ConcesionesListModel
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+class TestConcesionesListModel(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = ConcesionesDB(os.path.join(self.tmp_dir, "concesiones.db"))
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        with self.db.transaccion():
+            for i in range(450):
+                self.db.crear_concesion(emisor_id, "Factura", f"F-{i:03d}", "2025-01-01", dias_validez=30)
+
+    def tearDown(self):
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def leer_lote(self, modelo):
+        """Pide el siguiente lote y espera a que llegue al modelo."""
+        modelo.fetchMore()
+        modelo.db_async.esperar()
+        loop = QEventLoop()
+        QTimer.singleShot(0, loop.quit)
+        loop.exec_()
+
+    def test_filas_se_leen_por_lotes(self):
+        modelo = ConcesionesListModel(self.db, tam_lote=200)
+        self.assertEqual(modelo.rowCount(), 0)
+        modelo.recargar()
+        self.assertEqual(modelo.rowCount(), 200)
+
+        lotes = []
+        while modelo.canFetchMore():
+            self.leer_lote(modelo)
+            lotes.append(modelo.rowCount())
+        self.assertEqual(lotes, [400, 450])
+
+        # Las filas siguen el orden de obtener_lista_concesiones
+        esperado = [c['id'] for c in self.db.obtener_lista_concesiones()]
+        obtenido = [modelo.index(fila).data(Qt.UserRole) for fila in range(modelo.rowCount())]
+        self.assertEqual(obtenido, esperado)
+
+        indice = modelo.index(0)
+        self.assertEqual(indice.data(Qt.DisplayRole), "Editorial A")
+        self.assertEqual(indice.data(ConcesionesListModel.ConcesionRole)['status'], "Vencida")
+        self.assertEqual(modelo.fila_de(esperado[300]), 300)
+        self.assertEqual(modelo.fila_de(-1), -1)
+
+    def test_total_se_ajusta_si_se_borran_concesiones(self):
+        modelo = ConcesionesListModel(self.db, tam_lote=200)
+        modelo.recargar()
+        for concesion in self.db.obtener_lista_concesiones(limite=300, desplazamiento=150):
+            self.db.eliminar_concesion(concesion['id'])
+        self.leer_lote(modelo)
+        self.assertFalse(modelo.canFetchMore())
+        self.assertEqual(modelo.rowCount(), 200)
+
+    def test_un_solo_lote_en_curso(self):
+        modelo = ConcesionesListModel(self.db, tam_lote=200)
+        modelo.recargar()
+        # La vista puede llamar a fetchMore varias veces antes de que llegue el lote
+        modelo.fetchMore()
+        modelo.fetchMore()
+        self.assertEqual(modelo.rowCount(), 200)
+        modelo.db_async.esperar()
+        loop = QEventLoop()
+        QTimer.singleShot(0, loop.quit)
+        loop.exec_()
+        self.assertEqual(modelo.rowCount(), 400)
+
+        # Un lote pedido antes de recargar se descarta
+        modelo.fetchMore()
+        modelo.recargar()
+        self.leer_lote(modelo)
+        self.assertEqual(modelo.rowCount(), 400)
+        ids = [modelo.index(fila).data(Qt.UserRole) for fila in range(modelo.rowCount())]
+        self.assertEqual(len(set(ids)), 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
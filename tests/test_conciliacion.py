@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+import pandas as pd
+from app.models.conciliacion import conciliar, a_numeros, COLUMNAS_ANALISIS
+
+
+class TestConciliacion(unittest.TestCase):
+    def conciliar(self, reporte, factura):
+        return conciliar(reporte, factura, 'cnt', 'ISBN', 'Cantidad', 'PNT').set_index('ISBN')
+
+    def test_banderas_y_notas(self):
+        reporte = pd.DataFrame({
+            'f_articulo': ['978-0-13-468599-1', '9788420412146', '9786070000001', '9788420412146'],
+            'cnt': ['5', '2', '1', '9'],
+            'total': ['$500.00', '20', '7.5', '99'],
+        })
+        factura = pd.DataFrame({
+            'ISBN': ['9788420412146', '9780134685991', '9781234567897'],
+            'Cantidad': [3, 5, 1],
+            'PNT': [20.0, 500.0, 3.0],
+        })
+        analisis = self.conciliar(reporte, factura)
+        self.assertEqual(list(analisis.reset_index().columns), COLUMNAS_ANALISIS)
+        self.assertEqual(len(analisis), 4)
+
+        correcto = analisis.loc['9780134685991']
+        self.assertEqual(correcto['Congruencia de cantidad'], 1)
+        self.assertEqual(correcto['Congruencia de PNT'], 1)
+        self.assertEqual(correcto['Notas'], "La congruencia es correcta")
+
+        # Un ISBN repetido en el reporte se compara con su primera aparición
+        diferencia = analisis.loc['9788420412146']
+        self.assertEqual(diferencia['Congruencia del ISBN'], 1)
+        self.assertEqual(diferencia['Congruencia de cantidad'], 0)
+        self.assertEqual(diferencia['Congruencia de PNT'], 1)
+        self.assertEqual(diferencia['Notas'], "Existe una diferencia en cantidad: CR = 2.0000 ; CF = 3.0000")
+
+        solo_reporte = analisis.loc['9786070000001']
+        self.assertEqual(solo_reporte['Aparición en Factura'], 0)
+        self.assertEqual(solo_reporte['Notas'],
+                         "El ISBN no aparece en la factura; "
+                         "Existe una diferencia en cantidad: CR = 1.0000 ; CF = None; "
+                         "Existe una diferencia de PNT: PNR = 7.5000 ; PNF = None")
+        self.assertEqual(analisis.loc['9781234567897', 'Aparición en Reporte'], 0)
+
+    def test_numeros_como_los_limpiaba_el_analisis(self):
+        valores = pd.Series(['$1,250.50', '-3', 'sin dato', None, 7])
+        self.assertEqual(a_numeros(valores).tolist(), [1250.5, 3.0, 0.0, 0.0, 7.0])
+
+    def test_corte_grande(self):
+        n = 30000
+        reporte = pd.DataFrame({
+            'f_articulo': [f"978{i:010d}" for i in range(n)],
+            'cnt': np.arange(n) % 7,
+            'total': np.arange(n) * 1.5,
+        })
+        factura = pd.DataFrame({
+            'ISBN': [f"978{i:010d}" for i in range(100, n + 100)],
+            'Cantidad': np.arange(100, n + 100) % 7,
+            'PNT': np.arange(100, n + 100) * 1.5,
+        })
+        analisis = self.conciliar(reporte, factura)
+        self.assertEqual(len(analisis), n + 100)
+        self.assertEqual(analisis['Congruencia del ISBN'].sum(), n - 100)
+        self.assertEqual(analisis['Congruencia de PNT'].sum(), n - 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
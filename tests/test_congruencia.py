@@ -0,0 +1,52 @@
+import unittest
+import pandas as pd
+from app.models.congruencia import contar_isbn, resumir, CONGRUENTE, NO_CONGRUENTE, ISBN_INVALIDO
+
+
+class TestCongruencia(unittest.TestCase):
+    def setUp(self):
+        self.documentos = {
+            'Tabla 1': pd.Series(['978-0-13-468599-1', '9788420412146', 'sin isbn']),
+            # ISBN-10 del mismo libro que el primero de Tabla 1
+            'Tabla 2': pd.Series(['0-13-468599-7', 9788420412146.0]),
+            'Tabla 3': pd.Series(['9788420412146', '9788420412146', '9788420412146', None]),
+        }
+
+    def test_matriz_de_conteos(self):
+        conteos = contar_isbn(self.documentos)
+        self.assertEqual(list(conteos.columns), ['Tabla 1', 'Tabla 2', 'Tabla 3'])
+        self.assertEqual(list(conteos.index), ['9780134685991', '9788420412146'])
+        self.assertEqual(conteos.loc['9780134685991'].tolist(), [1, 1, 0])
+        self.assertEqual(conteos.loc['9788420412146'].tolist(), [1, 1, 3])
+
+    def test_resumen(self):
+        resumen = resumir(contar_isbn(self.documentos)).set_index('ISBN')
+        self.assertEqual(list(resumen.columns), ['Tabla 1', 'Tabla 2', 'Tabla 3', 'Duplicados', 'Estado'])
+        self.assertEqual(resumen.loc['9780134685991', 'Tabla 3'], "No")
+        self.assertEqual(resumen.loc['9780134685991', 'Estado'], NO_CONGRUENTE)
+        self.assertEqual(resumen.loc['9788420412146', 'Estado'], CONGRUENTE)
+        self.assertEqual(resumen.loc['9788420412146', 'Duplicados'], "Tabla 3: 3")
+        self.assertEqual(resumen.loc['9780134685991', 'Duplicados'], "")
+
+    def test_isbn_con_digito_de_control_incorrecto(self):
+        # Mismo libro que 9780134685991 con una errata en el último dígito
+        conteos = contar_isbn({'Tabla 1': pd.Series(['978-0-13-468599-1']),
+                               'Tabla 2': pd.Series(['978-0-13-468599-2'])})
+        self.assertEqual(list(conteos.index), ['9780134685991', '9780134685992'])
+        self.assertEqual(conteos.loc['9780134685992'].tolist(), [0, 1])
+
+        resumen = resumir(conteos).set_index('ISBN')
+        self.assertEqual(resumen.loc['9780134685991', 'Estado'], NO_CONGRUENTE)
+        self.assertEqual(resumen.loc['9780134685992', 'Estado'], ISBN_INVALIDO)
+        self.assertEqual(resumen.loc['9780134685992', 'Tabla 2'], "Sí")
+
+    def test_documentos_vacios_o_sin_isbn_validos(self):
+        conteos = contar_isbn({'a': pd.Series([], dtype=object), 'b': pd.Series(['123', None])})
+        self.assertEqual(list(conteos.columns), ['a', 'b'])
+        self.assertEqual(len(conteos), 0)
+        self.assertEqual(len(resumir(conteos)), 0)
+        self.assertEqual(len(contar_isbn({})), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,553 @@
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import date, timedelta
+import pandas as pd
+from app.models.database import (ConcesionesDB, GestorConexiones, MIGRACIONES, TAMANO_BLOQUE,
+                                 EspacioInsuficiente, migraciones_pendientes)
+
+
+class TestConcesionesDB(unittest.TestCase):
+    def setUp(self):
+        """Crea una base de datos temporal para cada prueba."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "concesiones.db")
+        self.db = ConcesionesDB(self.db_path)
+
+    def tearDown(self):
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def crear_concesion(self, folio="F-001", dias=30):
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        return self.db.crear_concesion(emisor_id, "Factura", folio, "2025-01-01", dias_validez=dias)
+
+    def test_instancias_comparten_conexion(self):
+        """Todas las instancias usan la misma conexion de escritura."""
+        otra = ConcesionesDB(self.db_path)
+        self.assertIs(self.db.conn, otra.conn)
+        self.assertIs(self.db.gestor, GestorConexiones.obtener(self.db_path))
+
+    def test_lectores_ven_escrituras(self):
+        """Las consultas del pool de lectura ven los datos confirmados."""
+        concesion_id = self.crear_concesion()
+        self.db.crear_producto(concesion_id, 2, "Libro A", "9780134685991", 100.0, 70.0)
+        productos = ConcesionesDB(self.db_path).obtener_productos_por_concesion(concesion_id)
+        self.assertEqual(len(productos), 1)
+        self.assertEqual(productos[0]['precio_total'], 140.0)
+
+    def test_documentos_separan_metadatos_y_contenido(self):
+        """Listar documentos no devuelve el BLOB; el contenido se lee aparte."""
+        concesion_id = self.crear_concesion()
+        archivo = os.path.join(self.tmp_dir, "factura.pdf")
+        with open(archivo, 'wb') as f:
+            f.write(b"%PDF-1.4 contenido")
+        doc_id = self.db.crear_documento(concesion_id, "factura.pdf", "PDF", archivo)
+
+        documentos = self.db.obtener_documentos(concesion_id)
+        self.assertEqual(len(documentos), 1)
+        self.assertEqual(documentos[0][2], "factura.pdf")
+        self.assertEqual(documentos[0][4], len(b"%PDF-1.4 contenido"))
+        self.assertNotIn(b"%PDF-1.4 contenido", documentos[0])
+        self.assertEqual(self.db.obtener_documento_por_id(doc_id)['contenido'], b"%PDF-1.4 contenido")
+
+        self.db.eliminar_documento(doc_id)
+        self.assertEqual(self.db.obtener_documentos(concesion_id), [])
+
+    def test_documentos_se_copian_por_bloques(self):
+        """Un documento mayor que TAMANO_BLOQUE se guarda y exporta sin cambios."""
+        concesion_id = self.crear_concesion()
+        contenido = os.urandom(TAMANO_BLOQUE * 2 + 123)
+        archivo = os.path.join(self.tmp_dir, "catalogo.pdf")
+        with open(archivo, 'wb') as f:
+            f.write(contenido)
+        doc_id = self.db.crear_documento(concesion_id, "catalogo.pdf", "PDF", archivo)
+        self.assertEqual(self.db.obtener_metadatos_documento(doc_id)['sha256'],
+                         hashlib.sha256(contenido).hexdigest())
+
+        destino = os.path.join(self.tmp_dir, "exportado.pdf")
+        self.assertTrue(self.db.exportar_documento(doc_id, destino))
+        with open(destino, 'rb') as f:
+            self.assertEqual(f.read(), contenido)
+        with self.db.leer_documento(doc_id) as flujo:
+            self.assertEqual(flujo.read(10), contenido[:10])
+        self.assertFalse(self.db.exportar_documento(9999, destino))
+
+    def test_reportes_desde_archivo(self):
+        concesion_id = self.crear_concesion()
+        archivo = os.path.join(self.tmp_dir, "reporte.pdf")
+        with open(archivo, 'wb') as f:
+            f.write(b"%PDF reporte")
+        reporte_id = self.db.crear_reporte_pdf_desde_archivo(concesion_id, "reporte.pdf", archivo)
+        self.assertEqual(self.db.obtener_contenido_reporte(reporte_id), b"%PDF reporte")
+        destino = os.path.join(self.tmp_dir, "copia.pdf")
+        self.db.exportar_reporte(reporte_id, destino)
+        with open(destino, 'rb') as f:
+            self.assertEqual(f.read(), b"%PDF reporte")
+
+    def test_lecturas_de_la_interfaz_no_usan_la_conexion_de_escritura(self):
+        """Las lecturas que hace la interfaz van al pool, sin competir con los escritores."""
+        concesion_id = self.crear_concesion()
+        archivo = os.path.join(self.tmp_dir, "reporte.pdf")
+        with open(archivo, 'wb') as f:
+            f.write(b"%PDF reporte")
+        reporte_id = self.db.crear_reporte_pdf_desde_archivo(concesion_id, "reporte.pdf", archivo)
+
+        sentencias = []
+        self.db.conn.set_trace_callback(sentencias.append)
+        try:
+            self.assertEqual(self.db.obtener_concesion_por_id(concesion_id)['folio'], "F-001")
+            self.assertEqual(self.db.obtener_contenido_reporte(reporte_id), b"%PDF reporte")
+            self.assertIsNone(self.db.obtener_contenido_reporte(9999))
+        finally:
+            self.db.conn.set_trace_callback(None)
+        self.assertEqual(sentencias, [])
+
+    def test_documentos_duplicados_comparten_contenido(self):
+        """El mismo archivo en dos concesiones se guarda una sola vez."""
+        archivo = os.path.join(self.tmp_dir, "tabla.csv")
+        with open(archivo, 'w') as f:
+            f.write("ISBN,Cantidad,PNT\n" + "9780134685991,5,500.0\n" * 2000)
+        primera = self.crear_concesion("F-001")
+        segunda = self.crear_concesion("F-002")
+        doc_1 = self.db.crear_documento(primera, "tabla.csv", "CSV", archivo)
+        doc_2 = self.db.crear_documento(segunda, "tabla_final.csv", "CSV", archivo)
+
+        estadisticas = self.db.obtener_estadisticas_almacenamiento()
+        self.assertEqual(estadisticas['documentos'], 2)
+        self.assertEqual(estadisticas['blobs'], 1)
+        # El CSV se comprime
+        self.assertLess(estadisticas['bytes_almacenados'], os.path.getsize(archivo))
+        with open(archivo, 'rb') as f:
+            self.assertEqual(self.db.obtener_documento_por_id(doc_2)['contenido'], f.read())
+        tabla = self.db.leer_documento_csv(doc_2)
+        self.assertEqual(list(tabla.columns), ["ISBN", "Cantidad", "PNT"])
+        self.assertEqual(len(tabla), 2000)
+
+        # El contenido se conserva mientras quede una referencia
+        self.db.eliminar_documento(doc_1)
+        self.assertEqual(self.db.obtener_estadisticas_almacenamiento()['blobs'], 1)
+        self.db.eliminar_documento(doc_2)
+        self.assertEqual(self.db.obtener_estadisticas_almacenamiento()['blobs'], 0)
+
+    def test_documento_desde_memoria(self):
+        """Un CSV generado en memoria se guarda sin archivo y comparte contenido con el mismo archivo."""
+        contenido = pd.DataFrame({'ISBN': ['9780134685991'] * 500, 'Cantidad': [5] * 500}).to_csv(index=False).encode('utf-8')
+        concesion_id = self.crear_concesion()
+        doc_id = self.db.crear_documento_desde_flujo(concesion_id, "tabla_final.csv", "CSV", io.BytesIO(contenido))
+        self.assertEqual(self.db.obtener_documento_por_id(doc_id)['contenido'], contenido)
+        self.assertEqual(len(self.db.leer_documento_csv(doc_id)), 500)
+
+        archivo = os.path.join(self.tmp_dir, "tabla.csv")
+        with open(archivo, 'wb') as f:
+            f.write(contenido)
+        self.db.crear_documento(concesion_id, "tabla.csv", "CSV", archivo)
+        self.assertEqual(self.db.obtener_estadisticas_almacenamiento()['blobs'], 1)
+        with self.assertRaises(ValueError):
+            self.db.crear_documento_desde_flujo(concesion_id, "x.txt", "TXT", io.BytesIO(b""))
+
+    def test_estado_y_orden_calculados_en_sql(self):
+        """El estado, los días restantes, el orden y el filtro salen de la consulta."""
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        hoy = date.today()
+        for folio, dias in (("VALIDA", 40), ("VENCIDA", -5), ("PRONTO", 5), ("HOY", 0)):
+            self.db.crear_concesion(emisor_id, "Factura", folio, (hoy - timedelta(days=60)).isoformat(),
+                                    fecha_vencimiento=(hoy + timedelta(days=dias)).isoformat())
+
+        concesiones = self.db.obtener_concesiones()
+        self.assertEqual([c['folio'] for c in concesiones], ["HOY", "PRONTO", "VALIDA", "VENCIDA"])
+        self.assertEqual([c['status'] for c in concesiones], ["Vence pronto", "Vence pronto", "Valido", "Vencida"])
+        self.assertEqual([c['dias_restantes'] for c in concesiones], [0, 5, 40, -5])
+
+        proximas = self.db.obtener_concesiones(estado='Vence pronto')
+        self.assertEqual([c['folio'] for c in proximas], ["HOY", "PRONTO"])
+        self.assertEqual(self.db.contar_concesiones(estado=('Vence pronto', 'Valido')), 3)
+        pagina = self.db.obtener_concesiones(limite=2, desplazamiento=2)
+        self.assertEqual([c['folio'] for c in pagina], ["VALIDA", "VENCIDA"])
+        self.assertEqual(self.db.obtener_concesion_por_id(concesiones[3]['id'])['status'], "Vencida")
+        with self.assertRaises(ValueError):
+            self.db.obtener_concesiones(estado='Vencido')
+
+    def test_paginas_sin_repetir_ni_saltar_empates(self):
+        """Las concesiones con el mismo vencimiento se reparten entre páginas por id."""
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        vencimiento = (date.today() + timedelta(days=40)).isoformat()
+        ids = [self.db.crear_concesion(emisor_id, "Factura", f"F-{i:03d}", date.today().isoformat(),
+                                       fecha_vencimiento=vencimiento)
+               for i in range(25)]
+        for obtener in (self.db.obtener_concesiones, self.db.obtener_lista_concesiones):
+            paginado = [c['id'] for inicio in range(0, 25, 7) for c in obtener(limite=7, desplazamiento=inicio)]
+            self.assertEqual(paginado, sorted(ids))
+
+    def test_lista_concesiones_incluye_emisor_y_conteos(self):
+        """La lista trae emisor, vendedor y conteos sin consultas por concesión."""
+        concesion_id = self.crear_concesion("F-001")
+        self.crear_concesion("F-002")
+        self.db.crear_producto(concesion_id, 2, "Libro A", "9780134685991", 100.0, 70.0)
+        self.db.crear_producto(concesion_id, 1, "Libro B", "9780262033848", 50.0, 35.0)
+
+        sentencias = []
+        conexiones = self.db.gestor._conexiones_lectura + [self.db.conn]
+        for conn in conexiones:
+            conn.set_trace_callback(sentencias.append)
+        try:
+            lista = self.db.obtener_lista_concesiones()
+        finally:
+            for conn in conexiones:
+                conn.set_trace_callback(None)
+        self.assertEqual(len(sentencias), 1)
+
+        por_folio = {c['folio']: c for c in lista}
+        self.assertEqual(por_folio["F-001"]['nombre_emisor'], "Editorial A")
+        self.assertEqual(por_folio["F-001"]['nombre_vendedor'], "Vendedor A")
+        self.assertEqual(por_folio["F-001"]['num_productos'], 2)
+        self.assertEqual(por_folio["F-002"]['num_productos'], 0)
+        self.assertEqual(por_folio["F-002"]['num_documentos'], 0)
+
+    def test_cache_de_emisores_se_invalida(self):
+        """Editar un emisor descarta la copia en memoria para todas las instancias."""
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        self.assertEqual(self.db.obtener_emisor(emisor_id)['nombre_emisor'], "Editorial A")
+        ConcesionesDB(self.db_path).actualizar_emisor(emisor_id, "Editorial B", "Vendedor B")
+        self.assertEqual(self.db.obtener_emisor(emisor_id)['nombre_emisor'], "Editorial B")
+        self.assertIsNone(self.db.obtener_emisor(9999))
+
+    def test_importar_productos(self):
+        """La importación normaliza, calcula precio_total y descarta filas inválidas."""
+        concesion_id = self.crear_concesion()
+        filas = pd.DataFrame({
+            'cantidad': ['3', 2, 'abc', 1, 0],
+            'descripcion': ['Libro A ', 'Libro B', 'Libro C', '', 'Libro E'],
+            'isbn': ['978-0-13-468599-1', 9780262033848.0, '9780262033848', '123', None],
+            'pvp_unitario': ['$1,200.00', None, 10, 10, 10],
+            'precio_neto': ['$840.50', 35, 7, 7, 7],
+        })
+        insertados, descartadas = self.db.importar_productos(concesion_id, filas)
+        self.assertEqual(insertados, 2)
+        self.assertEqual(list(descartadas.index), [2, 3, 4])
+
+        productos = self.db.obtener_productos_por_concesion(concesion_id)
+        self.assertEqual([p['descripcion'] for p in productos], ['Libro A', 'Libro B'])
+        self.assertEqual(productos[0]['isbn'], '9780134685991')
+        self.assertEqual(productos[1]['isbn'], '9780262033848')
+        self.assertEqual(productos[0]['pvp_unitario'], 1200.0)
+        self.assertEqual(productos[0]['precio_total'], 3 * 840.5)
+        self.assertEqual(productos[1]['pvp_unitario'], 0.0)
+
+        with self.assertRaises(ValueError):
+            self.db.importar_productos(concesion_id, [{'cantidad': 1, 'descripcion': 'Libro'}])
+
+    def test_importar_productos_conserva_isbn_invalidos(self):
+        """Un ISBN con digito de control erroneo se guarda limpio en lugar de perderse."""
+        concesion_id = self.crear_concesion()
+        self.db.importar_productos(concesion_id, pd.DataFrame({
+            'cantidad': [1, 1, 1], 'descripcion': ['Libro A', 'Libro B', 'Libro C'],
+            'isbn': ['978-607-00-0000-1', 'S/N', None], 'precio_neto': [10, 10, 10]}))
+        productos = self.db.obtener_productos_por_concesion(concesion_id)
+        self.assertEqual([p['isbn'] for p in productos], ['9786070000001', None, None])
+
+    def test_catalogo_se_mantiene_con_los_productos(self):
+        """El catalogo toma el producto mas reciente de cada ISBN y se busca con FTS5."""
+        concesion_id = self.crear_concesion()
+        self.db.crear_producto(concesion_id, 1, "Cien años de soledad", "9780307474728", 300.0, 200.0)
+        self.db.importar_productos(concesion_id, pd.DataFrame({
+            'cantidad': [1, 2], 'descripcion': ["Cien años de soledad (bolsillo)", "Pedro Páramo"],
+            'isbn': ['978-0-307-47472-8', '9786070000003'], 'pvp_unitario': [None, 150.0],
+            'precio_neto': [200.0, 100.0]}))
+
+        entrada = self.db.obtener_de_catalogo(['9780307474728'])['9780307474728']
+        self.assertEqual(entrada, {'titulo': "Cien años de soledad (bolsillo)",
+                                   'proveedor': "Editorial A", 'ultimo_pvp': 300.0})
+        # Sin acentos, por prefijo y por proveedor; la puntuacion no rompe la consulta
+        self.assertEqual([e['isbn'] for e in self.db.buscar_en_catalogo("paramo")], ['9786070000003'])
+        self.assertEqual(len(self.db.buscar_en_catalogo("editorial sol*")), 1)
+        self.assertEqual(self.db.buscar_en_catalogo('"(-'), [])
+
+        # Los cambios se reflejan en el indice sin reconstruirlo
+        self.db.conn.execute("UPDATE Productos SET descripcion = 'El llano en llamas' WHERE isbn = '9786070000003'")
+        self.db.conn.commit()
+        self.assertEqual(self.db.buscar_en_catalogo("paramo"), [])
+        self.assertEqual(len(self.db.buscar_en_catalogo("llano")), 1)
+        # Borrar la concesion no borra lo que ya se sabe del libro
+        self.db.eliminar_concesion(concesion_id)
+        self.assertEqual(len(self.db.obtener_de_catalogo(['9786070000003'])), 1)
+
+    def test_eliminar_concesion_borra_sus_datos_y_libera_espacio(self):
+        """Eliminar una concesión borra sus dependientes y el vacuum reduce el archivo."""
+        concesion_id = self.crear_concesion("F-001")
+        otra_id = self.crear_concesion("F-002")
+        archivo = os.path.join(self.tmp_dir, "escaneo.pdf")
+        with open(archivo, 'wb') as f:
+            f.write(os.urandom(TAMANO_BLOQUE * 4))
+        doc_id = self.db.crear_documento(concesion_id, "escaneo.pdf", "PDF", archivo)
+        producto_id = self.db.crear_producto(concesion_id, 1, "Libro A", None, 100.0, 70.0)
+        self.db.crear_producto(otra_id, 1, "Libro B", None, 100.0, 70.0)
+        self.db.crear_reporte_pdf(concesion_id, "reporte.pdf", b"%PDF")
+        self.db.conn.execute("INSERT INTO DocumentoProducto VALUES (?, ?, 'ingreso')", (doc_id, producto_id))
+        self.db.conn.commit()
+
+        self.assertTrue(self.db.eliminar_concesion(concesion_id))
+        self.assertIsNone(self.db.obtener_concesion_por_id(concesion_id))
+        self.assertEqual(self.db.obtener_documentos(concesion_id), [])
+        self.assertEqual(self.db.obtener_productos_por_concesion(concesion_id), [])
+        self.assertEqual(self.db.obtener_reportes_por_concesion(concesion_id), [])
+        self.assertEqual(self.db.obtener_estadisticas_almacenamiento()['blobs'], 0)
+        self.assertEqual(len(self.db.obtener_productos_por_concesion(otra_id)), 1)
+        self.assertEqual(set(self.db.buscar_huerfanos().values()), {0})
+
+        self.assertEqual(self.db.conn.execute('PRAGMA auto_vacuum').fetchone()[0], 2)
+        # El tamaño del archivo principal solo cambia al pasarle el contenido del -wal
+        self.db.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        tamano_antes = os.path.getsize(self.db_path)
+        self.assertGreater(self.db.gestor.vacuum_incremental(paginas_por_paso=64), 0)
+        self.assertEqual(self.db.conn.execute('PRAGMA freelist_count').fetchone()[0], 0)
+        self.db.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.assertLess(os.path.getsize(self.db_path), tamano_antes - TAMANO_BLOQUE * 3)
+
+    def test_huerfanos_se_detectan_y_purgan(self):
+        """Filas que apuntan a concesiones inexistentes se cuentan y se borran."""
+        concesion_id = self.crear_concesion()
+        self.db.crear_producto(concesion_id, 1, "Libro vivo", None, 100.0, 70.0)
+        # Simula una base antigua, borrada sin cascada y sin claves foraneas
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO Productos (concesion_id, cantidad, descripcion, precio_neto, precio_total) "
+                     "VALUES (999, 1, 'Libro huerfano', 1.0, 1.0)")
+        conn.execute("INSERT INTO Documentos (concesion_id, nombre, tipo) VALUES (999, 'a.pdf', 'PDF')")
+        conn.commit()
+        conn.close()
+
+        huerfanos = self.db.buscar_huerfanos()
+        self.assertEqual(huerfanos['Productos'], 1)
+        self.assertEqual(huerfanos['Documentos'], 1)
+        self.assertEqual(self.db.purgar_huerfanos()['Productos'], 1)
+        self.assertEqual(set(self.db.buscar_huerfanos().values()), {0})
+        self.assertEqual(len(self.db.obtener_productos_por_concesion(concesion_id)), 1)
+
+        # Con las claves foraneas activas ya no se pueden crear huerfanos
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.crear_producto(999, 1, "Libro", None, 1.0, 1.0)
+
+    def test_perfil_de_durabilidad(self):
+        """El perfil por omisión activa WAL y synchronous=NORMAL."""
+        self.assertEqual(self.db.conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(self.db.conn.execute('PRAGMA synchronous').fetchone()[0], 1)
+        with self.assertRaises(ValueError):
+            GestorConexiones(os.path.join(self.tmp_dir, "otra.db"), perfil='inexistente')
+
+    def test_transaccion_confirma_una_vez(self):
+        """Las escrituras dentro de transaccion() se confirman juntas o no se confirman."""
+        concesion_id = self.crear_concesion()
+        confirmaciones = []
+        self.db.conn.set_trace_callback(confirmaciones.append)
+        try:
+            with self.db.transaccion():
+                for i in range(300):
+                    self.db.crear_producto(concesion_id, 1, f"Libro {i}", None, 100.0, 70.0)
+                # Dentro de la transacción las lecturas ven los cambios pendientes
+                self.assertEqual(len(self.db.obtener_productos_por_concesion(concesion_id)), 300)
+        finally:
+            self.db.conn.set_trace_callback(None)
+        self.assertEqual(sum(1 for s in confirmaciones if s.strip().upper() == 'COMMIT'), 1)
+
+        with self.assertRaises(RuntimeError):
+            with self.db.transaccion():
+                self.db.crear_producto(concesion_id, 1, "Libro extra", None, 100.0, 70.0)
+                raise RuntimeError("falla a mitad")
+        self.assertEqual(len(self.db.obtener_productos_por_concesion(concesion_id)), 300)
+
+        # Un error en un bloque anidado solo deshace su parte
+        with self.db.transaccion():
+            self.db.crear_producto(concesion_id, 1, "Libro A", None, 100.0, 70.0)
+            try:
+                with self.db.transaccion():
+                    self.db.crear_producto(concesion_id, 1, "Libro B", None, 100.0, 70.0)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        descripciones = [p['descripcion'] for p in self.db.obtener_productos_por_concesion(concesion_id)]
+        self.assertIn("Libro A", descripciones)
+        self.assertNotIn("Libro B", descripciones)
+
+    def test_cache_de_extracciones_desaloja_la_menos_usada(self):
+        """Al pasar del limite se descarta la extraccion usada hace mas tiempo."""
+        self.db.guardar_extraccion_en_cache('a' * 64, 'p', b'x' * 40, '{}', limite_bytes=100)
+        self.db.guardar_extraccion_en_cache('b' * 64, 'p', b'x' * 40, '{}', limite_bytes=100)
+        # Usar 'a' la vuelve la mas reciente; al llegar 'c' sale 'b'
+        self.assertEqual(self.db.obtener_extraccion_en_cache('a' * 64, 'p'), (b'x' * 40, '{}', None))
+        self.db.guardar_extraccion_en_cache('c' * 64, 'p', b'x' * 40, None, limite_bytes=100)
+        self.assertIsNone(self.db.obtener_extraccion_en_cache('b' * 64, 'p'))
+        self.assertIsNotNone(self.db.obtener_extraccion_en_cache('c' * 64, 'p'))
+        # Otros parametros son otra entrada
+        self.assertIsNone(self.db.obtener_extraccion_en_cache('a' * 64, 'q'))
+
+        self.assertTrue(self.db.guardar_filtros_en_cache('a' * 64, 'p', '{"0": {}}'))
+        self.assertEqual(self.db.obtener_extraccion_en_cache('a' * 64, 'p')[1], '{"0": {}}')
+        self.assertFalse(self.db.guardar_filtros_en_cache('b' * 64, 'p', '{}'))
+
+        # Una extraccion a medias guarda sus paginas; los filtros no las tocan
+        self.db.guardar_extraccion_en_cache('d' * 64, 'p', b'x', '{}', '[1, 3]', limite_bytes=100)
+        self.db.guardar_filtros_en_cache('d' * 64, 'p', '{"1": {}}')
+        self.assertEqual(self.db.obtener_extraccion_en_cache('d' * 64, 'p'), (b'x', '{"1": {}}', '[1, 3]'))
+
+
+class TestMigraciones(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "concesiones.db")
+
+    def tearDown(self):
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def crear_base_antigua(self):
+        """Base con el esquema anterior a las migraciones: el BLOB en la fila de Documentos"""
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript('''
+            CREATE TABLE Documentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                concesion_id INTEGER NOT NULL,
+                nombre TEXT NOT NULL,
+                tipo TEXT CHECK(tipo IN ('PDF', 'Excel', 'CSV')),
+                contenido BLOB NOT NULL
+            );
+        ''')
+        conn.execute("INSERT INTO Documentos (concesion_id, nombre, tipo, contenido) VALUES (1, 'a.csv', 'CSV', ?)",
+                     (b"ISBN,Cantidad\n1,2\n",))
+        conn.commit()
+        conn.close()
+
+    def test_migra_documentos_con_contenido_en_la_fila(self):
+        """Una base con el esquema antiguo de Documentos se convierte al abrirla."""
+        self.crear_base_antigua()
+        self.assertEqual(migraciones_pendientes(self.db_path), len(MIGRACIONES))
+        avance = []
+        GestorConexiones.obtener(self.db_path, progreso_migracion=lambda *a: avance.append(a))
+        self.assertEqual(avance, [(i, len(MIGRACIONES)) for i in range(len(MIGRACIONES) + 1)])
+        self.assertEqual(migraciones_pendientes(self.db_path), 0)
+
+        db = ConcesionesDB(self.db_path)
+        columnas = [fila[1] for fila in db.conn.execute('PRAGMA table_info(Documentos)')]
+        self.assertNotIn('contenido', columnas)
+        metadatos = db.obtener_metadatos_documento(1)
+        self.assertEqual(metadatos['tamano'], len(b"ISBN,Cantidad\n1,2\n"))
+        self.assertEqual(len(metadatos['sha256']), 64)
+        self.assertEqual(db.obtener_documento_por_id(1)['contenido'], b"ISBN,Cantidad\n1,2\n")
+        self.assertEqual(db.obtener_estadisticas_almacenamiento()['blobs'], 1)
+        # La conversion a vacuum incremental (un VACUUM completo) no se hace al
+        # abrir la base sino despues, en el hilo del vacuum periodico
+        self.assertEqual(db.conn.execute('PRAGMA auto_vacuum').fetchone()[0], 0)
+        self.assertTrue(db.gestor.activar_vacuum_incremental())
+        self.assertEqual(db.conn.execute('PRAGMA auto_vacuum').fetchone()[0], 2)
+        self.assertEqual(db.obtener_documento_por_id(1)['contenido'], b"ISBN,Cantidad\n1,2\n")
+
+    def test_migracion_sin_espacio_no_empieza(self):
+        """Sin espacio para copiar los BLOBs la migracion falla antes de tocar la base."""
+        self.crear_base_antigua()
+        with mock.patch('app.models.database.shutil.disk_usage', return_value=mock.Mock(free=10)):
+            with self.assertRaises(EspacioInsuficiente):
+                ConcesionesDB(self.db_path)
+        self.assertEqual(migraciones_pendientes(self.db_path), len(MIGRACIONES))
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.assertEqual(conn.execute('SELECT contenido FROM Documentos').fetchone()[0],
+                             b"ISBN,Cantidad\n1,2\n")
+        finally:
+            conn.close()
+        # Con espacio, la siguiente apertura migra normalmente
+        db = ConcesionesDB(self.db_path)
+        self.assertEqual(db.obtener_documento_por_id(1)['contenido'], b"ISBN,Cantidad\n1,2\n")
+
+    def test_version_de_esquema_e_indices(self):
+        """Una base nueva queda en la ultima version y las consultas usan indices."""
+        db = ConcesionesDB(self.db_path)
+        version = db.conn.execute('PRAGMA user_version').fetchone()[0]
+        self.assertEqual(version, MIGRACIONES[-1][0])
+
+        plan = db.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM Productos WHERE concesion_id = ?', (1,)
+        ).fetchall()
+        self.assertIn('idx_productos_concesion', " ".join(str(fila[-1]) for fila in plan))
+
+        # Reabrir la base no vuelve a aplicar migraciones
+        GestorConexiones.cerrar_todos()
+        db = ConcesionesDB(self.db_path)
+        self.assertEqual(db.conn.execute('PRAGMA user_version').fetchone()[0], version)
+
+    def base_sin_vacuum_incremental(self):
+        """Una base creada antes de auto_vacuum=INCREMENTAL, con algunos datos"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE Relleno (datos BLOB)')
+        conn.executemany('INSERT INTO Relleno VALUES (?)', [(os.urandom(4096),) for _ in range(500)])
+        conn.commit()
+        conn.close()
+        db = ConcesionesDB(self.db_path)
+        self.assertEqual(db.conn.execute('PRAGMA auto_vacuum').fetchone()[0], 0)
+        return db
+
+    def test_escritura_interrumpe_el_vacuum_completo(self):
+        """Una escritura durante la conversion la interrumpe en lugar de esperarla."""
+        db = self.base_sin_vacuum_incremental()
+        escribiendo = threading.Event()
+        primera = []
+
+        def progreso():
+            # Detiene el VACUUM hasta que otro hilo intenta escribir
+            if not primera:
+                primera.append(True)
+                escribiendo.wait(5)
+                time.sleep(0.3)
+            return 0
+
+        resultado = []
+        db.conn.set_progress_handler(progreso, 1000)
+        hilo = threading.Thread(target=lambda: resultado.append(db.gestor.activar_vacuum_incremental()))
+        hilo.start()
+        while not primera:
+            time.sleep(0.01)
+        escribiendo.set()
+        inicio = time.monotonic()
+        db.crear_emisor("Editorial A", "Vendedor A")
+        self.assertLess(time.monotonic() - inicio, 2)
+        hilo.join()
+        db.conn.set_progress_handler(None, 0)
+
+        self.assertEqual(resultado, [False])
+        self.assertEqual(db.conn.execute('PRAGMA auto_vacuum').fetchone()[0], 0)
+        self.assertEqual(db.conn.execute('SELECT COUNT(*) FROM Relleno').fetchone()[0], 500)
+        self.assertTrue(db.gestor.activar_vacuum_incremental())
+        self.assertEqual(db.conn.execute('PRAGMA auto_vacuum').fetchone()[0], 2)
+
+    def test_conversion_espera_inactividad(self):
+        """El hilo de vacuum no convierte la base mientras sigue habiendo escrituras."""
+        db = self.base_sin_vacuum_incremental()
+        db.gestor.iniciar_vacuum_periodico(intervalo=0.05, inactividad=0.5)
+
+        def auto_vacuum():
+            # Conexion nueva: la de escritura la usa el hilo de vacuum y las
+            # del pool guardan el modo que leyeron al abrir la base
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            finally:
+                conn.close()
+
+        limite = time.monotonic() + 0.4
+        while time.monotonic() < limite:
+            db.crear_emisor("Editorial A", "Vendedor A")
+            time.sleep(0.05)
+        self.assertEqual(auto_vacuum(), 0)
+        limite = time.monotonic() + 5
+        while auto_vacuum() != 2 and time.monotonic() < limite:
+            time.sleep(0.05)
+        self.assertEqual(auto_vacuum(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
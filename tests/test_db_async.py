@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from app.models.database import ConcesionesDB, GestorConexiones
+from app.models.db_async import ConcesionesDBAsync
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+class TestConcesionesDBAsync(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = ConcesionesDB(os.path.join(self.tmp_dir, "concesiones.db"))
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        self.concesion_id = self.db.crear_concesion(emisor_id, "Factura", "F-001", "2025-01-01", dias_validez=30)
+        self.db.crear_producto(self.concesion_id, 2, "Libro A", None, 100.0, 70.0)
+        self.db_async = ConcesionesDBAsync(self.db)
+
+    def tearDown(self):
+        self.db_async.esperar()
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def procesar_eventos(self):
+        """Espera a que el pool termine y entrega las señales pendientes."""
+        self.db_async.esperar()
+        loop = QEventLoop()
+        QTimer.singleShot(0, loop.quit)
+        loop.exec_()
+
+    def test_resultado_llega_en_el_hilo_de_la_interfaz(self):
+        resultados = []
+        hilo_principal = threading.get_ident()
+        self.db_async.ejecutar('obtener_productos_por_concesion', self.concesion_id,
+                               al_terminar=lambda r: resultados.append((threading.get_ident(), r)))
+        self.procesar_eventos()
+        self.assertEqual(len(resultados), 1)
+        hilo, productos = resultados[0]
+        self.assertEqual(hilo, hilo_principal)
+        self.assertEqual(productos[0]['descripcion'], "Libro A")
+
+    def test_funcion_con_varias_consultas_y_errores(self):
+        resultados, errores = [], []
+        self.db_async.ejecutar(lambda db, i: (db.obtener_concesion_por_id(i), db.obtener_documentos(i)),
+                               self.concesion_id, al_terminar=resultados.append)
+        self.db_async.ejecutar('obtener_concesiones', estado='Inexistente',
+                               al_terminar=resultados.append, al_fallar=errores.append)
+        self.procesar_eventos()
+        self.assertEqual(resultados[0][0]['folio'], "F-001")
+        self.assertEqual(resultados[0][1], [])
+        self.assertIsInstance(errores[0], ValueError)
+
+    def test_error_sin_al_fallar_se_registra(self):
+        with self.assertLogs('app.models.db_async', level='ERROR') as registro:
+            self.db_async.ejecutar('obtener_concesiones', estado='Inexistente')
+            self.procesar_eventos()
+        self.assertIn('obtener_concesiones', registro.output[0])
+        self.assertIn('ValueError', registro.output[0])
+
+    def test_tarea_reemplazada_o_cancelada_se_descarta(self):
+        resultados = []
+        self.db_async.ejecutar('obtener_concesion_por_id', self.concesion_id, clave='detalle',
+                               al_terminar=lambda r: resultados.append('vieja'))
+        self.db_async.ejecutar('obtener_concesion_por_id', self.concesion_id, clave='detalle',
+                               al_terminar=lambda r: resultados.append('nueva'))
+        cancelada = self.db_async.ejecutar('obtener_emisores', al_terminar=lambda r: resultados.append('cancelada'))
+        cancelada.cancelar()
+        self.db_async.ejecutar('obtener_documentos', self.concesion_id, clave='documentos',
+                               al_terminar=lambda r: resultados.append('por clave'))
+        self.db_async.cancelar('documentos')
+        self.procesar_eventos()
+        self.assertEqual(resultados, ['nueva'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from app.models.database import ConcesionesDB, GestorConexiones
+from app.models.extraccion_pdf import (CacheExtracciones, ExtraccionPaginas, TablaExtraida, aplicar_filtros,
+                                       insertar_por_pagina, mascara_filas, paginas_con_vecinas)
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def extraer_falso(ruta, paginas):
+    """Sustituye a camelot: una tabla por página; las primeras páginas tardan más"""
+    time.sleep(0.05 * (5 - min(paginas)) if min(paginas) < 5 else 0)
+    if ruta == 'roto.pdf' and 3 in paginas:
+        raise ValueError("PDF dañado")
+    return [TablaExtraida(p, pd.DataFrame({'pagina': [p]})) for p in paginas]
+
+
+class TestExtraccionPaginas(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPoolExecutor(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def extraer(self, ruta, paginas):
+        eventos = {'tablas': [], 'analizadas': [], 'progreso': [], 'terminado': 0, 'fallido': []}
+        extraccion = ExtraccionPaginas(ruta, paginas, tam_lote=1, funcion=extraer_falso, pool=self.pool)
+
+        extraccion.tablas.connect(eventos['tablas'].append)
+        extraccion.analizadas.connect(eventos['analizadas'].extend)
+        extraccion.progreso.connect(lambda hechas, total: eventos['progreso'].append((hechas, total)))
+        extraccion.terminado.connect(lambda: eventos.__setitem__('terminado', eventos['terminado'] + 1))
+        extraccion.fallido.connect(eventos['fallido'].append)
+        extraccion.iniciar()
+        self.assertTrue(extraccion.esperar(10))
+        loop = QEventLoop()
+        QTimer.singleShot(0, loop.quit)
+        loop.exec_()
+        return eventos
+
+    def test_tablas_llegan_en_orden_de_pagina(self):
+        eventos = self.extraer('doc.pdf', range(1, 7))
+        paginas = [tabla.page for lote in eventos['tablas'] for tabla in lote]
+        self.assertEqual(paginas, [1, 2, 3, 4, 5, 6])
+        self.assertEqual(eventos['analizadas'], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(eventos['progreso'][-1], (6, 6))
+        self.assertEqual(eventos['terminado'], 1)
+        self.assertEqual(eventos['fallido'], [])
+
+    def test_pagina_pedida_primero_se_entrega_primero(self):
+        paginas = paginas_con_vecinas(5, 6)
+        self.assertEqual(paginas, [5, 6, 4, 3])
+        eventos = self.extraer('doc.pdf', paginas)
+        self.assertEqual(eventos['tablas'][0][0].page, 5)
+        self.assertEqual(eventos['analizadas'], [5, 6, 4, 3])
+        self.assertEqual(paginas_con_vecinas(1, 1), [1])
+
+    def test_fallo_de_una_pagina(self):
+        eventos = self.extraer('roto.pdf', range(1, 7))
+        self.assertEqual(eventos['fallido'], ["PDF dañado"])
+        self.assertEqual(eventos['terminado'], 0)
+        paginas = [tabla.page for lote in eventos['tablas'] for tabla in lote]
+        self.assertNotIn(3, paginas)
+
+    def test_cancelar_antes_de_iniciar(self):
+        extraccion = ExtraccionPaginas('doc.pdf', range(1, 7), tam_lote=1, funcion=extraer_falso, pool=self.pool)
+        recibidas = []
+        extraccion.tablas.connect(recibidas.append)
+        extraccion.cancelar()
+        extraccion.iniciar()
+        self.assertTrue(extraccion.esperar(10))
+        QCoreApplication.processEvents()
+        self.assertTrue(extraccion.cancelada())
+        self.assertEqual(recibidas, [])
+
+
+class TestFiltros(unittest.TestCase):
+    def test_mascara_de_filas(self):
+        mascara = mascara_filas(8, 2, 6, [3, 5, 7, -1, 40])
+        self.assertEqual(mascara.tolist(), [False, False, True, False, True, False, False, False])
+        self.assertFalse(mascara_filas(0, 0, 5, [1]).any())
+
+    def test_insertar_por_pagina(self):
+        tablas = [TablaExtraida(p, None) for p in (2, 5, 5, 9)]
+        nuevas = [TablaExtraida(p, None) for p in (7, 1, 5)]
+        lista, posiciones = insertar_por_pagina(tablas, nuevas)
+        self.assertEqual([t.page for t in lista], [1, 2, 5, 5, 5, 7, 9])
+        self.assertEqual(posiciones, [1, 2, 3, 6])
+        # Las existentes de la misma página van antes que las nuevas
+        self.assertIs(lista[4], nuevas[2])
+        self.assertEqual(insertar_por_pagina([], []), ([], []))
+
+    def test_aplicar_filtros(self):
+        df = pd.DataFrame([[str(i), str(i * 2), 'x'] for i in range(10)])
+        filtros = {'start_row': 1, 'end_row': 5, 'exclude_rows': [2], 'selected_columns': [0, 2]}
+        filtrada = aplicar_filtros(df, filtros)
+        self.assertEqual(filtrada[0].tolist(), ['1', '3', '4'])
+        self.assertEqual(list(filtrada.columns), [0, 2])
+        self.assertIs(aplicar_filtros(df, None), df)
+
+
+class TestCacheExtracciones(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = ConcesionesDB(os.path.join(self.tmp_dir, "concesiones.db"))
+
+    def tearDown(self):
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_tablas_y_filtros_se_recuperan(self):
+        cache = CacheExtracciones(self.db)
+        tablas = [TablaExtraida(1, pd.DataFrame([['ISBN', 'Título'], ['978', 'Libro']])),
+                  TablaExtraida(3, pd.DataFrame([['a', '', 'c']]))]
+        filtros = {1: {'start_row': 1, 'end_row': 2, 'exclude_rows': [], 'selected_columns': [0]}}
+        self.assertIsNone(cache.obtener('f' * 64))
+        cache.guardar('f' * 64, tablas, filtros)
+
+        recuperadas, recuperados, paginas = cache.obtener('f' * 64)
+        self.assertIsNone(paginas)
+        self.assertEqual([t.page for t in recuperadas], [1, 3])
+        for original, recuperada in zip(tablas, recuperadas):
+            pd.testing.assert_frame_equal(original.df, recuperada.df)
+        self.assertEqual(recuperados, filtros)
+
+        filtros[0] = {'start_row': 0, 'end_row': 1, 'exclude_rows': [0], 'selected_columns': [1]}
+        cache.guardar_filtros('f' * 64, filtros)
+        self.assertEqual(cache.obtener('f' * 64)[1], filtros)
+        # Otros parametros de extraccion no comparten la entrada
+        self.assertIsNone(CacheExtracciones(self.db, {'flavor': 'lattice'}).obtener('f' * 64))
+
+    def test_extraccion_a_medias(self):
+        cache = CacheExtracciones(self.db)
+        tablas = [TablaExtraida(4, pd.DataFrame([['a']]))]
+        cache.guardar('e' * 64, tablas, {}, paginas={5, 4, 3})
+        self.assertEqual(cache.obtener('e' * 64)[2], {3, 4, 5})
+
+
+if __name__ == '__main__':
+    unittest.main()
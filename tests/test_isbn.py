@@ -0,0 +1,36 @@
+import unittest
+import numpy as np
+import pandas as pd
+from app.models import isbn
+
+
+class TestIsbn(unittest.TestCase):
+    def test_limpiar(self):
+        serie = pd.Series(['978-0-13-468599-1', ' 0-8044-2957-x ', None, 'sin isbn', 'ñ84-204-1214-0'])
+        self.assertEqual(isbn.limpiar(serie).tolist(),
+                         ['9780134685991', '080442957X', '', '', '8420412140'])
+        # Leídos como número desde un CSV
+        self.assertEqual(isbn.limpiar(pd.Series([9780262033848.0, np.nan])).tolist(), ['9780262033848', ''])
+
+    def test_digito_de_control(self):
+        serie = pd.Series(['9780134685991', '9780134685992', '0306406152', '030640615X',
+                           '080442957X', '978013468599', 'X780134685991'])
+        self.assertEqual(isbn.es_valido(serie).tolist(), [True, False, True, False, True, False, False])
+
+    def test_normalizar_a_isbn13(self):
+        serie = pd.Series(['0-13-468599-7', '9780134685991', '080442957X', '1234567890', None],
+                          index=[10, 11, 12, 13, 14])
+        normalizados = isbn.normalizar(serie)
+        self.assertEqual(list(normalizados.index), [10, 11, 12, 13, 14])
+        self.assertEqual(normalizados.tolist(),
+                         ['9780134685991', '9780134685991', '9780804429573', None, None])
+        self.assertEqual(isbn.normalizar(serie, conservar_invalidos=True).tolist(),
+                         ['9780134685991', '9780134685991', '9780804429573', '1234567890', ''])
+
+    def test_series_vacias_y_cortas(self):
+        self.assertEqual(isbn.normalizar(pd.Series([], dtype=object)).tolist(), [])
+        self.assertEqual(isbn.normalizar(pd.Series(['12', ''])).tolist(), [None, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
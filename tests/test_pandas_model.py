@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QCoreApplication, Qt
+from app.views.components.pandas_model import PandasTableModel, DataFrameProxyModel
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+class TestPandasTableModel(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'isbn': ['9780134685991', '9788420412146', None],
+            'cantidad': [5, 12, 1],
+            'precio': ['100.5', '20', '3'],
+        })
+        self.modelo = PandasTableModel(self.df, formatos={'cantidad': lambda v: f"{v} pzs"})
+
+    def test_muestra_el_dataframe_sin_copiarlo(self):
+        self.assertIs(self.modelo.dataframe(), self.df)
+        self.assertEqual((self.modelo.rowCount(), self.modelo.columnCount()), (3, 3))
+        self.assertEqual(self.modelo.headerData(1, Qt.Horizontal), 'cantidad')
+        self.assertEqual(self.modelo.index(0, 1).data(), "5 pzs")
+        self.assertEqual(self.modelo.index(2, 0).data(), "")
+        # El valor original llega como tipo de Python
+        self.assertEqual(self.modelo.index(1, 1).data(Qt.UserRole), 12)
+        self.assertEqual(self.modelo.index(0, 1).data(Qt.TextAlignmentRole), int(Qt.AlignRight | Qt.AlignVCenter))
+
+    def test_tablas_sin_encabezado_se_numeran_desde_uno(self):
+        modelo = PandasTableModel(pd.DataFrame([['a', 'b', 'c']]).iloc[:, [0, 2]])
+        self.assertEqual([modelo.headerData(j, Qt.Horizontal) for j in range(2)], ['1', '3'])
+
+    def test_misma_estructura_reemplaza_solo_las_filas(self):
+        reinicios = []
+        self.modelo.modelReset.connect(lambda: reinicios.append(True))
+        self.modelo.establecer_dataframe(self.df.head(1))
+        self.assertEqual(self.modelo.rowCount(), 1)
+        self.assertEqual(reinicios, [])
+        self.modelo.establecer_dataframe(pd.DataFrame({'otra': [1, 2]}))
+        self.assertEqual(reinicios, [True])
+        self.assertEqual(self.modelo.columnCount(), 1)
+
+    def test_proxy_ordena_numeros_y_filtra_con_mascara(self):
+        proxy = DataFrameProxyModel()
+        proxy.setSourceModel(self.modelo)
+
+        # La columna de precio es texto, pero se ordena como número
+        proxy.sort(2, Qt.AscendingOrder)
+        self.assertEqual([proxy.index(i, 2).data() for i in range(3)], ['3', '20', '100.5'])
+        proxy.sort(2, Qt.DescendingOrder)
+        self.assertEqual([proxy.index(i, 2).data() for i in range(3)], ['100.5', '20', '3'])
+
+        proxy.filtrar_texto('9788')
+        self.assertEqual(proxy.rowCount(), 1)
+        self.assertEqual(proxy.index(0, 1).data(Qt.UserRole), 12)
+        proxy.establecer_mascara(np.array([True, False, True]))
+        self.assertEqual(proxy.rowCount(), 2)
+        proxy.filtrar_texto('')
+        self.assertEqual(proxy.rowCount(), 3)
+
+    def test_gran_dataframe(self):
+        df = pd.DataFrame({'isbn': [f"978{i:010d}" for i in range(20000)], 'cantidad': np.arange(20000)})
+        modelo = PandasTableModel(df)
+        proxy = DataFrameProxyModel()
+        proxy.setSourceModel(modelo)
+        proxy.sort(1, Qt.DescendingOrder)
+        self.assertEqual(proxy.index(0, 1).data(Qt.UserRole), 19999)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from datetime import datetime
+from app.models.database import ConcesionesDB, GestorConexiones
+from app.models.respaldo import (respaldar, rotar_respaldos, listar_respaldos, nombre_respaldo,
+                                 ProgramadorRespaldos, RespaldoCancelado)
+
+
+class TestRespaldo(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "concesiones.db")
+        self.db = ConcesionesDB(self.db_path)
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        self.concesion_id = self.db.crear_concesion(emisor_id, "Factura", "F-001", "2025-01-01", dias_validez=30)
+        with self.db.transaccion():
+            for i in range(2000):
+                self.db.crear_producto(self.concesion_id, 1, f"Libro {i} " + "x" * 200, None, 100.0, 70.0)
+
+    def tearDown(self):
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def contar_productos(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM Productos').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_respaldo_consistente_mientras_se_escribe(self):
+        """La copia refleja el momento en que empezó aunque se escriba durante ella."""
+        destino = os.path.join(self.tmp_dir, "copia.db")
+        avances = []
+
+        def progreso(fase, hechos, total):
+            avances.append((fase, hechos, total))
+            if len(avances) == 2:
+                # Escritura concurrente desde otro hilo a mitad del respaldo
+                hilo = threading.Thread(target=self.db.crear_producto,
+                                        args=(self.concesion_id, 1, "Nuevo", None, 1.0, 1.0))
+                hilo.start()
+                hilo.join()
+
+        respaldar(self.db_path, destino, progreso=progreso, paginas_por_paso=16)
+        self.assertGreater(len(avances), 2)
+        self.assertEqual(avances[-1][1], avances[-1][2])
+        self.assertEqual(self.contar_productos(destino), 2000)
+        self.assertEqual(len(self.db.obtener_productos_por_concesion(self.concesion_id)), 2001)
+        self.assertFalse(os.path.exists(destino + "-wal"))
+
+    def test_respaldo_sin_wal_no_bloquea_escrituras(self):
+        """Con el perfil 'clasico' (diario rollback) se puede escribir entre pasos del respaldo."""
+        GestorConexiones.cerrar_todos()
+        self.db = ConcesionesDB(self.db_path, perfil='clasico')
+        self.assertEqual(self.db.conn.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+        destino = os.path.join(self.tmp_dir, "copia.db")
+        avances = []
+        errores = []
+
+        def escribir():
+            try:
+                self.db.crear_producto(self.concesion_id, 1, "Nuevo", None, 1.0, 1.0)
+            except sqlite3.Error as e:
+                errores.append(e)
+
+        def progreso(fase, hechos, total):
+            avances.append((fase, hechos, total))
+            if len(avances) == 2:
+                hilo = threading.Thread(target=escribir)
+                hilo.start()
+                hilo.join()
+
+        respaldar(self.db_path, destino, progreso=progreso, paginas_por_paso=16)
+        self.assertEqual(errores, [])
+        self.assertEqual(len(self.db.obtener_productos_por_concesion(self.concesion_id)), 2001)
+        # La copia se reinicio tras la escritura y termina con el estado final
+        self.assertEqual(self.contar_productos(destino), 2001)
+        conn = sqlite3.connect(destino)
+        try:
+            self.assertEqual(conn.execute('PRAGMA integrity_check').fetchone()[0], 'ok')
+        finally:
+            conn.close()
+
+    def test_respaldo_comprimido(self):
+        destino = os.path.join(self.tmp_dir, "copia.db.zip")
+        respaldar(self.db_path, destino, comprimir=True)
+        with zipfile.ZipFile(destino) as archivo_zip:
+            self.assertEqual(archivo_zip.namelist(), ["concesiones.db"])
+            archivo_zip.extractall(os.path.join(self.tmp_dir, "extraido"))
+        extraido = os.path.join(self.tmp_dir, "extraido", "concesiones.db")
+        self.assertEqual(self.contar_productos(extraido), 2000)
+        self.assertLess(os.path.getsize(destino), os.path.getsize(extraido))
+
+    def test_respaldo_cancelado_no_deja_archivos(self):
+        destino = os.path.join(self.tmp_dir, "copia.db")
+        with self.assertRaises(RespaldoCancelado):
+            respaldar(self.db_path, destino, cancelado=lambda: True, paginas_por_paso=16)
+        self.assertEqual([n for n in os.listdir(self.tmp_dir) if n.startswith("copia")], [])
+
+    def test_rotacion_conserva_los_mas_recientes(self):
+        directorio = os.path.join(self.tmp_dir, "respaldos")
+        os.makedirs(directorio)
+        for dia in range(1, 6):
+            nombre = nombre_respaldo(self.db_path, comprimir=dia % 2 == 0, fecha=datetime(2025, 1, dia))
+            open(os.path.join(directorio, nombre), "wb").close()
+        open(os.path.join(directorio, "otro_archivo.txt"), "wb").close()
+
+        eliminados = rotar_respaldos(directorio, self.db_path, conservar=2)
+        self.assertEqual(len(eliminados), 3)
+        restantes = [os.path.basename(p) for p in listar_respaldos(directorio, self.db_path)]
+        self.assertEqual(restantes, ["concesiones_20250104_000000.db.zip", "concesiones_20250105_000000.db"])
+        self.assertIn("otro_archivo.txt", os.listdir(directorio))
+
+    def test_programador_hace_el_primer_respaldo_al_iniciar(self):
+        directorio = os.path.join(self.tmp_dir, "respaldos")
+        programador = ProgramadorRespaldos(self.db_path, directorio, intervalo=3600, conservar=1)
+        self.assertEqual(programador.segundos_para_el_siguiente(), 0)
+        programador.respaldar_ahora()
+        programador.respaldar_ahora()
+        self.assertEqual(len(listar_respaldos(directorio, self.db_path)), 1)
+        self.assertGreater(programador.segundos_para_el_siguiente(), 3500)
+
+    def test_programador_registra_los_errores(self):
+        # Un archivo donde va el directorio hace fallar os.makedirs
+        directorio = os.path.join(self.tmp_dir, "respaldos")
+        open(directorio, 'w').close()
+        programador = ProgramadorRespaldos(self.db_path, directorio, intervalo=3600, conservar=1)
+        with self.assertLogs('app.models.respaldo', level='ERROR') as registro:
+            programador.iniciar()
+            limite = time.monotonic() + 5
+            while not registro.records and time.monotonic() < limite:
+                time.sleep(0.01)
+            programador.detener()
+        self.assertIn("respaldo programado", registro.output[0])
+        self.assertIsNotNone(registro.records[0].exc_info)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+import pandas as pd
+from PyQt5.QtWidgets import QApplication
+from app.models.database import GestorConexiones
+from app.models.extraccion_pdf import ExtraccionPaginas, TablaExtraida
+from app.views.tools import table_extractor
+from app.views.tools.table_extractor import PdfTableExtractor
+
+app = QApplication.instance() or QApplication([])
+
+PAGINAS = 10
+
+
+def extraer_falso(ruta, paginas):
+    """Sustituye a camelot: una tabla por página, salvo en las múltiplos de 3"""
+    return [TablaExtraida(p, pd.DataFrame([[f"p{p}", "x"], ["a", "b"], ["c", "d"]]))
+            for p in paginas if p % 3 != 0]
+
+
+class TestExtraccionPorHoja(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPoolExecutor(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def setUp(self):
+        self.directorio_previo = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)  # La base por defecto del extractor queda aquí
+        self.pdf = os.path.join(self.tmp_dir, "doc.pdf")
+        with open(self.pdf, 'wb') as f:
+            f.write(b"%PDF contenido de prueba")
+        self.extracciones = []  # Páginas pedidas en cada extracción
+
+        def crear_extraccion(*args, **kwargs):
+            extraccion = ExtraccionPaginas(*args, funcion=extraer_falso, pool=self.pool, **kwargs)
+            self.extracciones.append(list(extraccion.paginas))
+            return extraccion
+
+        for parche in (
+            mock.patch.object(table_extractor, 'ExtraccionPaginas', crear_extraccion),
+            mock.patch.object(table_extractor, 'contar_paginas', lambda ruta: PAGINAS),
+            mock.patch.object(table_extractor.QMessageBox, 'information'),
+            mock.patch.object(PdfTableExtractor, 'check_ollama_and_mistral_installed', return_value=True),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def tearDown(self):
+        GestorConexiones.cerrar_todos()
+        os.chdir(self.directorio_previo)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def esperar(self, extractor):
+        limite = time.monotonic() + 10
+        while extractor.extracciones and time.monotonic() < limite:
+            app.processEvents()
+            time.sleep(0.01)
+        self.assertEqual(extractor.extracciones, [])
+
+    def ver_hoja(self, extractor, pagina):
+        extractor.page_selector.setCurrentIndex(extractor.page_selector.findData(pagina))
+        self.esperar(extractor)
+
+    def test_extraccion_parcial_se_recupera_de_la_cache(self):
+        extractor = PdfTableExtractor()
+        self.assertTrue(extractor.lazy_mode_checkbox.isChecked())
+        extractor.load_pdf_from_path(self.pdf)
+        self.esperar(extractor)
+        self.assertEqual(extractor.paginas_extraidas, {1, 2, 3})
+
+        # Filtros en la tabla de la hoja 7
+        self.ver_hoja(extractor, 7)
+        self.assertEqual(self.extracciones[-1], [7, 8, 6, 9, 5])
+        self.assertEqual([t.page for t in extractor.tables], [1, 2, 5, 7, 8])
+        extractor.table_selector.setCurrentRow(0)
+        extractor.spin_start.setValue(1)
+        extractor.save_table_filters()
+        filtros = extractor.filters[3]
+        self.assertEqual(filtros['start_row'], 1)
+
+        # La tabla de la hoja 4 entra antes: los filtros y la tabla que se ve se renumeran
+        extractor.extract_pages_around(4)
+        self.esperar(extractor)
+        self.assertEqual([t.page for t in extractor.tables], [1, 2, 4, 5, 7, 8])
+        self.assertEqual(extractor.filters, {4: filtros})
+        self.assertEqual(extractor.selected_table_index(), 4)
+        self.assertEqual(extractor.table_selector.currentItem().text(), "Tabla 5")
+        extractor.done(0)
+
+        self.extracciones.clear()
+        reabierto = PdfTableExtractor()
+        reabierto.load_pdf_from_path(self.pdf)
+        self.esperar(reabierto)
+        # Las hojas ya analizadas salen de la caché sin volver a extraerse
+        self.assertEqual(self.extracciones, [])
+        self.assertEqual(reabierto.paginas_extraidas, set(range(1, PAGINAS)))
+        self.assertEqual([t.page for t in reabierto.tables], [1, 2, 4, 5, 7, 8])
+        self.assertEqual(reabierto.filters, {4: filtros})
+        self.assertEqual(reabierto.page_selector.count(), PAGINAS)
+
+        # Solo se extrae la hoja que faltaba, y la entrada queda completa
+        self.ver_hoja(reabierto, 10)
+        self.assertEqual(self.extracciones, [[10]])
+        self.assertEqual([t.page for t in reabierto.tables], [1, 2, 4, 5, 7, 8, 10])
+        self.assertIsNone(reabierto.cache.obtener(reabierto.pdf_sha256)[2])
+        reabierto.done(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from app.models.database import ConcesionesDB, GestorConexiones
+from app.models.titulos import ResolvedorTitulos, titulo_google_books, titulo_open_library
+
+# ISBN -> título que conoce cada servicio simulado
+GOOGLE = {'9780134685991': 'Effective Java'}
+OPEN_LIBRARY = {'9780262033848': 'Introduction to Algorithms'}
+ISBN_CON_ERROR = '9788420412146'
+
+
+class _ServidorSimulado(BaseHTTPRequestHandler):
+    """Responde como Google Books y Open Library y cuenta las peticiones"""
+    peticiones = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == '/books/v1/volumes':
+            isbn = params['q'][0].split(':', 1)[1]
+            self.peticiones.append(('google', isbn))
+            if isbn == ISBN_CON_ERROR:
+                self.send_error(503)
+                return
+            cuerpo = {'items': [{'volumeInfo': {'title': GOOGLE[isbn]}}]} if isbn in GOOGLE else {'totalItems': 0}
+        else:
+            isbn = params['bibkeys'][0].split(':', 1)[1]
+            self.peticiones.append(('open_library', isbn))
+            if isbn == 'lento':
+                time.sleep(1)
+            cuerpo = {f'ISBN:{isbn}': {'title': OPEN_LIBRARY[isbn]}} if isbn in OPEN_LIBRARY else {}
+        datos = json.dumps(cuerpo).encode('utf-8')
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente ya se rindió por timeout
+
+    def log_message(self, *args):
+        pass
+
+
+class TestResolvedorTitulos(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _ServidorSimulado)
+        cls.base = f"http://127.0.0.1:{cls.servidor.server_address[1]}"
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = ConcesionesDB(os.path.join(self.tmp_dir, "concesiones.db"))
+        _ServidorSimulado.peticiones = []
+
+    def tearDown(self):
+        GestorConexiones.cerrar_todos()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def resolvedor(self, **kwargs):
+        fuentes = [
+            ('google_books', partial(titulo_google_books, url=self.base + '/books/v1/volumes')),
+            ('open_library', partial(titulo_open_library, url=self.base + '/api/books')),
+        ]
+        kwargs.setdefault('por_segundo', 0)
+        return ResolvedorTitulos(self.db, fuentes=fuentes, **kwargs)
+
+    def test_fuentes_en_orden_y_cache(self):
+        resolvedor = self.resolvedor()
+        isbns = ['9780134685991', '9780262033848', '9786070000001', '9780134685991']
+        titulos = resolvedor.resolver(isbns)
+        self.assertEqual(titulos, {'9780134685991': 'Effective Java',
+                                   '9780262033848': 'Introduction to Algorithms',
+                                   '9786070000001': None})
+        # Open Library solo se consulta si Google Books no conoce el ISBN
+        self.assertNotIn(('open_library', '9780134685991'), _ServidorSimulado.peticiones)
+        self.assertEqual(len(_ServidorSimulado.peticiones), 5)
+
+        # La segunda vez todo sale de la caché, incluido el resultado negativo
+        _ServidorSimulado.peticiones = []
+        self.assertEqual(self.resolvedor().resolver(isbns), titulos)
+        self.assertEqual(_ServidorSimulado.peticiones, [])
+
+    def test_catalogo_propio_antes_que_la_red(self):
+        emisor_id = self.db.crear_emisor("Editorial A", "Vendedor A")
+        concesion_id = self.db.crear_concesion(emisor_id, "Factura", "F-001", "2025-01-01", dias_validez=30)
+        self.db.crear_producto(concesion_id, 1, "Java efectivo", "9780134685991", 500.0, 350.0)
+        titulos = self.resolvedor().resolver(['9780134685991'])
+        self.assertEqual(titulos, {'9780134685991': 'Java efectivo'})
+        self.assertEqual(_ServidorSimulado.peticiones, [])
+
+    def test_negativos_caducan_y_errores_no_se_guardan(self):
+        self.resolvedor().resolver(['9786070000001', ISBN_CON_ERROR])
+        _ServidorSimulado.peticiones = []
+        # Con TTL 0 el negativo se vuelve a consultar; el error nunca se guardó
+        self.resolvedor(ttl_negativo=0).resolver(['9786070000001', ISBN_CON_ERROR])
+        consultados = {isbn for _, isbn in _ServidorSimulado.peticiones}
+        self.assertEqual(consultados, {'9786070000001', ISBN_CON_ERROR})
+        _ServidorSimulado.peticiones = []
+        self.resolvedor().resolver(['9786070000001'])
+        self.assertEqual(_ServidorSimulado.peticiones, [])
+
+    def test_timeout_concurrencia_y_progreso(self):
+        avances = []
+        resolvedor = self.resolvedor(timeout=0.2, max_concurrentes=4)
+        inicio = time.monotonic()
+        titulos = resolvedor.resolver(['lento'] * 2 + [f'97800000000{i:02d}' for i in range(8)],
+                                      progreso=lambda hechos, total: avances.append((hechos, total)))
+        self.assertLess(time.monotonic() - inicio, 1.0)
+        self.assertIsNone(titulos['lento'])
+        self.assertEqual(avances[-1], (9, 9))
+
+    def test_limite_de_peticiones_por_segundo(self):
+        inicio = time.monotonic()
+        self.resolvedor(por_segundo=20).resolver([f'97800000000{i:02d}' for i in range(5)])
+        # 10 peticiones (dos fuentes por ISBN) a 20 por segundo
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.4)
+
+
+if __name__ == "__main__":
+    unittest.main()